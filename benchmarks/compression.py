@@ -0,0 +1,73 @@
+'''
+Disk I/O vs CPU trade-off of compressed JFL archives.
+
+    python -m benchmarks.compression --points 100000 1000000
+
+For each size, writes and parses a synthetic JFL as raw, .gz and .xz and
+reports file size, CPU time, and the estimated end-to-end time at several
+disk/network bandwidths (CPU time + size / bandwidth).
+'''
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from parse_jfl import parse_jfl_file, save_jfl_file
+from benchmarks.synthetic import synthetic_segments
+
+SUFFIXES = ['.JFL', '.JFL.gz', '.JFL.xz']
+BANDWIDTHS_MB_S = [20, 100, 500]
+
+
+def _timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_compression(points, repeat=3, workdir=None):
+    '''Returns a list of dicts with size, write and parse time per (points, suffix).'''
+    rows = []
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        for n in points:
+            segments = synthetic_segments(n, n_segments=3)
+            for suffix in SUFFIXES:
+                path = os.path.join(directory, f'bench_{n}{suffix}')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    write_time = _timed(lambda: save_jfl_file(segments, path), repeat)
+                parse_time = _timed(lambda: parse_jfl_file(path), repeat)
+                rows.append({'points': n, 'suffix': suffix, 'bytes': os.path.getsize(path),
+                             'write': write_time, 'parse': parse_time})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, nargs='+', default=[100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rows = benchmark_compression(args.points, args.repeat)
+    header = f"{'points':>9} {'format':8} {'MB':>8} {'ratio':>6} {'write s':>8} {'parse s':>8}"
+    header += ''.join(f" {'read@' + str(b) + 'MB/s':>13}" for b in BANDWIDTHS_MB_S)
+    print(header)
+    raw_size = {}
+    for row in rows:
+        if row['suffix'] == '.JFL':
+            raw_size[row['points']] = row['bytes']
+        size_mb = row['bytes'] / 1e6
+        line = (f"{row['points']:9d} {row['suffix']:8} {size_mb:8.2f} {raw_size[row['points']] / row['bytes']:6.1f}"
+                f" {row['write']:8.3f} {row['parse']:8.3f}")
+        line += ''.join(f" {row['parse'] + size_mb / b:13.3f}" for b in BANDWIDTHS_MB_S)
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+'''
+Export throughput for JFL, NPY, NPZ, CSV and DXF at million-point scale.
+
+    python -m benchmarks.export_formats --points 100000 1000000
+
+For each point count, writes the same synthetic segments in every format to
+a temporary directory and reports the best time, points per second and the
+output size. JFL is the reference: CSV and DXF share its format_coords
+path, NPY/NPZ skip text formatting altogether.
+'''
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from parse_jfl import save_jfl_file
+from jfl_export import save_npy, save_npz, save_csv, save_dxf
+from benchmarks.synthetic import synthetic_segments
+
+
+def _timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _save_jfl(segments, file_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        save_jfl_file(segments, file_path)
+    return file_path
+
+
+def _size(paths):
+    paths = paths if isinstance(paths, list) else [paths]
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def benchmark_export(points, repeat=3, n_segments=3):
+    '''Returns a list of dicts with points, format, seconds and bytes.'''
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in points:
+            segments = synthetic_segments(n, n_segments=n_segments)
+            jfl_path = os.path.join(workdir, 'lens.JFL')
+            writers = {
+                'jfl': lambda: _save_jfl(segments, jfl_path),
+                'npy': lambda: save_npy(segments, workdir),
+                'npz': lambda: save_npz(segments, os.path.join(workdir, 'lens.npz')),
+                'npz-compressed': lambda: save_npz(segments, os.path.join(workdir, 'lens_c.npz'), compressed=True),
+                'csv': lambda: save_csv(segments, os.path.join(workdir, 'lens.csv')),
+                'dxf': lambda: save_dxf(segments, os.path.join(workdir, 'lens.dxf')),
+            }
+            for name, writer in writers.items():
+                seconds = _timed(writer, repeat)
+                rows.append({'points': n, 'format': name, 'seconds': seconds, 'bytes': _size(writer())})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'points':>10} {'format':>15} {'seconds':>8} {'Mpts/s':>7} {'MiB':>8}")
+    for row in benchmark_export(args.points, args.repeat):
+        print(f"{row['points']:10d} {row['format']:>15} {row['seconds']:8.3f} "
+              f"{row['points'] / row['seconds'] / 1e6:7.2f} {row['bytes'] / 2**20:8.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+'''
+Load test for jfl_service.py.
+
+    python jfl_service.py --port 8765 &
+    python -m benchmarks.load_test_service --port 8765 --requests 2000 --concurrency 32 --designs 20
+
+Each client keeps one HTTP/1.1 connection open and posts lens designs drawn
+from a fixed pool of synthetic designs, so the run mixes cache hits,
+coalesced requests and fresh generations.
+'''
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.synthetic import synthetic_design
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, bodies, queue, latencies, errors, step):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            body = bodies[index]
+            request = (f'POST /jfl?step={step} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                       f'Content-Length: {len(body)}\r\n\r\n').encode('latin-1') + body
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def _stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET /stats HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return json.loads(data.split(b'\r\n\r\n', 1)[1])
+
+
+async def load_test(host, port, n_requests, concurrency, n_designs, step, seed=0):
+    bodies = [json.dumps(synthetic_design(n_segments=1 + i % 10, seed=seed + i)).encode('utf-8')
+              for i in range(n_designs)]
+    rng = random.Random(seed)
+    queue = asyncio.Queue()
+    for _ in range(n_requests):
+        queue.put_nowait(rng.randrange(n_designs))
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[_client(host, port, bodies, queue, latencies, errors, step)
+                           for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'latency_p50_ms': 1e3 * statistics.median(latencies),
+        'latency_p95_ms': 1e3 * latencies[int(0.95 * (len(latencies) - 1))],
+        'latency_p99_ms': 1e3 * latencies[int(0.99 * (len(latencies) - 1))],
+        'server': await _stats(host, port),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--designs', type=int, default=20)
+    parser.add_argument('--step', type=float, default=0.0025)
+    args = parser.parse_args(argv)
+    result = asyncio.run(load_test(args.host, args.port, args.requests, args.concurrency, args.designs, args.step))
+    print(json.dumps(result, indent=2))
+    return 1 if result['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+'''
+Working memory of sag evaluation with and without out= buffers.
+
+    python -m benchmarks.memory_sag --step 1e-5 --designs 5
+
+Three measurements, all with tracemalloc, reporting the peak traced memory
+of a call minus the bytes of the arrays it returns (the "overhead"):
+
+- every sag_calculator function on the same radii, once allocating its
+  result and temporaries and once writing into out= with scratch buffers;
+- generate_segments over several synthetic designs in a row: the first
+  call grows the thread's ScratchArena, later calls should neither grow it
+  nor allocate more than the segment arrays they return;
+- generate_surface_sag_batch (as used by tolerance_analysis) for a number
+  of variants of one surface.
+'''
+import argparse
+import sys
+import tracemalloc
+
+import numpy as np
+
+from sag_calculator import TYPE_TO_FUNCTION, SCRATCH_ARRAYS
+from lens_generator import generate_segments, generate_surface_sag_batch, scratch_arena
+from benchmarks.synthetic import synthetic_design
+
+
+def traced(func):
+    '''Returns (result, peak traced bytes) of func().'''
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _nbytes(result):
+    if isinstance(result, dict):
+        return sum(value.nbytes for value in result.values())
+    if isinstance(result, tuple):
+        return sum(value.nbytes for value in result)
+    return result.nbytes
+
+
+def benchmark_functions(n_points):
+    '''Overhead of each segment type, allocating vs out= and scratch.'''
+    design = synthetic_design()
+    r = np.linspace(0.01, 1.0, n_points)
+    out = np.empty(n_points)
+    scratch = [np.empty(n_points) for _ in range(SCRATCH_ARRAYS)]
+    examples = {}
+    for surface_id in ('前表面', '后表面', '边缘'):
+        for segment in design[surface_id]['segments']:
+            examples.setdefault(segment['type'], segment['params'])
+    rows = []
+    for type_name, params in examples.items():
+        func = TYPE_TO_FUNCTION[type_name]
+        for mode, call in (('alloc', lambda: func(r, params, 0.0)),
+                           ('out=', lambda: func(r, params, 0.0, out=out, scratch=scratch))):
+            result, peak = traced(call)
+            returned = result.nbytes if mode == 'alloc' else 0
+            rows.append({'type': type_name, 'mode': mode, 'points': n_points, 'overhead': peak - returned})
+    return rows
+
+
+def benchmark_designs(step, n_designs):
+    '''generate_segments on n_designs designs in a row; overhead and arena growth per call.'''
+    arena = scratch_arena()
+    rows = []
+    for seed in range(n_designs):
+        design = synthetic_design(seed=seed)
+        allocations = arena.allocations
+        segments, peak = traced(lambda: generate_segments(design, step))
+        rows.append({'design': seed, 'points': sum(len(value) for value in segments.values()),
+                     'output': _nbytes(segments), 'overhead': peak - _nbytes(segments),
+                     'arena_allocations': arena.allocations - allocations, 'arena_bytes': arena.nbytes})
+    return rows
+
+
+def benchmark_batch(step, n_variants, repeat=3):
+    '''generate_surface_sag_batch with n_variants radii of one surface, called repeatedly.'''
+    design = synthetic_design()
+    surface = design['前表面']
+    nominal = surface['segments'][0]['params']['Radius']
+    batch = dict(surface, segments=[dict(segment, params=dict(segment['params'])) for segment in surface['segments']])
+    batch['segments'][0]['params']['Radius'] = nominal * (1 + np.linspace(-1e-3, 1e-3, n_variants)).reshape(-1, 1)
+    arena = scratch_arena()
+    rows = []
+    for i in range(repeat):
+        allocations = arena.allocations
+        result, peak = traced(lambda: generate_surface_sag_batch(batch, design['lens']['lens_semidiameter'], step))
+        rows.append({'call': i, 'shape': result[1].shape, 'output': _nbytes(result),
+                     'overhead': peak - _nbytes(result), 'arena_allocations': arena.allocations - allocations})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--step', type=float, default=1e-5)
+    parser.add_argument('--points', type=int, default=1_000_000)
+    parser.add_argument('--designs', type=int, default=5)
+    parser.add_argument('--variants', type=int, default=64)
+    parser.add_argument('--batch-step', type=float, default=1e-3)
+    args = parser.parse_args(argv)
+
+    mib = 2**20
+    print(f"sag functions, {args.points} points")
+    print(f"{'type':>14} {'mode':>6} {'overhead MiB':>13}")
+    for row in benchmark_functions(args.points):
+        print(f"{row['type']:>14} {row['mode']:>6} {row['overhead'] / mib:13.2f}")
+
+    print(f"\ngenerate_segments, step {args.step:.0e}")
+    print(f"{'design':>6} {'points':>10} {'output MiB':>11} {'overhead MiB':>13} {'arena grew':>10} {'arena MiB':>10}")
+    for row in benchmark_designs(args.step, args.designs):
+        print(f"{row['design']:6d} {row['points']:10d} {row['output'] / mib:11.2f} {row['overhead'] / mib:13.2f} "
+              f"{row['arena_allocations']:10d} {row['arena_bytes'] / mib:10.2f}")
+
+    print(f"\ngenerate_surface_sag_batch, {args.variants} variants, step {args.batch_step:.0e}")
+    print(f"{'call':>4} {'shape':>14} {'output MiB':>11} {'overhead MiB':>13} {'arena grew':>10}")
+    for row in benchmark_batch(args.batch_step, args.variants):
+        print(f"{row['call']:4d} {str(row['shape']):>14} {row['output'] / mib:11.2f} {row['overhead'] / mib:13.2f} "
+              f"{row['arena_allocations']:10d}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+'''
+Benchmark suite for the JFL parse/build/sag/generation stages.
+
+    python -m benchmarks.run_benchmarks run --output benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks run --preset full --output current.json
+    python -m benchmarks.run_benchmarks compare benchmarks/baseline.json current.json
+
+Run from the repository root. Each stage records the best and median wall
+time over several repeats and the peak traced memory of one extra run.
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from parse_jfl import parse_jfl_file, build_jfl_string, save_jfl_file
+from sag_calculator import TYPE_TO_FUNCTION
+from lens_generator import generate_segments
+from tool_compensation import compensate_profile
+from benchmarks.synthetic import synthetic_segments, write_synthetic_jfl, synthetic_design, synthetic_pocket_profile
+from benchmarks.startup import benchmark_startup
+
+PRESETS = {
+    'quick': {'points': [10_000, 100_000], 'steps': [0.0025, 0.00025], 'compensation_points': [100_000],
+              'repeat': 3},
+    'full': {'points': [10_000, 100_000, 1_000_000, 10_000_000], 'steps': [0.0025, 0.00025, 0.00001],
+             'compensation_points': [100_000, 1_000_000], 'repeat': 3},
+}
+
+
+def measure(func, repeat=3):
+    '''Time func() `repeat` times, then measure its peak traced memory in one extra call.'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'best': min(times), 'median': statistics.median(times), 'peak_bytes': peak}
+
+
+def _quiet(func):
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return wrapper
+
+
+def benchmark_jfl_io(points, repeat, workdir):
+    results = {}
+    for three_coord in (False, True):
+        kind = 'xzw' if three_coord else 'xz'
+        for n in points:
+            segments = synthetic_segments(n, n_segments=6, three_coord=three_coord)
+            path = os.path.join(workdir, f'synthetic_{kind}_{n}.JFL')
+            write_synthetic_jfl(path, n, n_segments=6, three_coord=three_coord)
+            results[f'build_jfl_string[{kind}-{n}]'] = measure(lambda: build_jfl_string(segments), repeat)
+            results[f'save_jfl_file[{kind}-{n}]'] = measure(_quiet(lambda: save_jfl_file(segments, path)), repeat)
+            results[f'parse_jfl_file[{kind}-{n}]'] = measure(lambda: parse_jfl_file(path), repeat)
+            os.remove(path)
+    return results
+
+
+def benchmark_sag(points, repeat):
+    results = {}
+    design = synthetic_design(n_segments=4)
+    examples = {segment['type']: segment['params'] for segment in design['前表面']['segments']}
+    examples.update({segment['type']: segment['params'] for segment in design['后表面']['segments']})
+    for n in points:
+        r = np.linspace(0.0, 6.0, n)
+        for surface_type, func in TYPE_TO_FUNCTION.items():
+            params = examples[surface_type]
+            results[f'sag.{surface_type}[{n}]'] = measure(lambda: func(r, params, 0.0), repeat)
+    return results
+
+
+def benchmark_generation(steps, repeat):
+    results = {}
+    for n_segments in (1, 3, 10):
+        design = synthetic_design(n_segments=n_segments, seed=n_segments)
+        for step in steps:
+            label = f'{n_segments}seg-step{step:g}'
+            results[f'generate_segments[{label}]'] = measure(lambda: generate_segments(design, step), repeat)
+            results[f'pipeline[{label}]'] = measure(
+                lambda: build_jfl_string(generate_segments(design, step)), repeat)
+    return results
+
+
+def benchmark_compensation(points, repeat, tool_radius=0.8):
+    '''A smooth profile without loops and a pocket tighter than the tool, which forms a swallowtail.'''
+    results = {}
+    for n in points:
+        x = np.linspace(0.0, 8.0, n)
+        smooth = np.column_stack([x, 1.0 + 0.05 * np.sin(x)])
+        pocket = synthetic_pocket_profile(n)
+        results[f'compensate_profile[smooth-{n}]'] = measure(lambda: compensate_profile(smooth, tool_radius), repeat)
+        results[f'compensate_profile[pocket-{n}]'] = measure(lambda: compensate_profile(pocket, tool_radius), repeat)
+    return results
+
+
+def run(preset='quick', stages=('startup', 'io', 'sag', 'generation', 'compensation')):
+    config = PRESETS[preset]
+    results = {}
+    if 'startup' in stages:
+        results.update(benchmark_startup(config['repeat']))
+    with tempfile.TemporaryDirectory() as workdir:
+        if 'io' in stages:
+            results.update(benchmark_jfl_io(config['points'], config['repeat'], workdir))
+    if 'sag' in stages:
+        results.update(benchmark_sag(config['points'], config['repeat']))
+    if 'generation' in stages:
+        results.update(benchmark_generation(config['steps'], config['repeat']))
+    if 'compensation' in stages:
+        results.update(benchmark_compensation(config['compensation_points'], config['repeat']))
+    return {
+        'meta': {
+            'preset': preset,
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, time_threshold=0.2, memory_threshold=0.2):
+    '''
+    Compare two benchmark result dicts.
+
+    Returns a list of (stage, metric, baseline, current, ratio, regressed).
+    Stages missing from either side are skipped.
+    '''
+    rows = []
+    for stage, old in baseline['results'].items():
+        new = current['results'].get(stage)
+        if new is None:
+            continue
+        for metric, threshold in (('best', time_threshold), ('peak_bytes', memory_threshold)):
+            ratio = new[metric] / old[metric] if old[metric] else 1.0
+            rows.append((stage, metric, old[metric], new[metric], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help='run the benchmarks and save the results as JSON')
+    run_parser.add_argument('--preset', choices=PRESETS, default='quick')
+    run_parser.add_argument('--stages', nargs='+', default=['startup', 'io', 'sag', 'generation', 'compensation'])
+    run_parser.add_argument('--output', default=None)
+    compare_parser = sub.add_parser('compare', help='compare a result file against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--time-threshold', type=float, default=0.2)
+    compare_parser.add_argument('--memory-threshold', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        result = run(args.preset, args.stages)
+        for stage, values in result['results'].items():
+            print(f"{stage:45s} {values['best'] * 1e3:10.2f} ms {values['peak_bytes'] / 2**20:10.2f} MiB")
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(result, file, indent=2)
+            print(f"Results saved to {args.output}")
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    regressions = 0
+    for stage, metric, old, new, ratio, regressed in compare(
+            baseline, current, args.time_threshold, args.memory_threshold):
+        flag = 'REGRESSION' if regressed else ''
+        print(f"{stage:45s} {metric:10s} {old:14.6g} {new:14.6g} {ratio:7.2f}x {flag}")
+        regressions += regressed
+    print(f"{regressions} regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
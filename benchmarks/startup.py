@@ -0,0 +1,72 @@
+'''
+Startup benchmark and guard for headless parse/build/sag imports.
+
+    python -m benchmarks.startup
+
+Each import statement is timed in fresh interpreters. The command fails if
+importing the parse/build/sag API pulls in matplotlib, or if it takes more
+than --max-ratio of the time of the full plotting import.
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADLESS_IMPORT = 'import parse_jfl, sag_calculator, lens_generator'
+PLOTTING_IMPORT = 'import parse_jfl, sag_calculator, lens_generator, jfl_plot'
+
+_PROBE = '''
+import resource, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, 'matplotlib' in sys.modules)
+'''
+
+
+def measure_import(statement, repeat=5):
+    '''Best/median import time, peak RSS and whether matplotlib got loaded, over fresh interpreters.'''
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', _PROBE.format(statement=statement)], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(output[0]))
+        peak = int(output[1])
+        matplotlib_loaded = output[2] == 'True'
+    return {'best': min(times), 'median': statistics.median(times), 'peak_bytes': peak,
+            'matplotlib_loaded': matplotlib_loaded}
+
+
+def benchmark_startup(repeat=5):
+    return {
+        'import[headless]': measure_import(HEADLESS_IMPORT, repeat),
+        'import[plotting]': measure_import(PLOTTING_IMPORT, repeat),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ratio', type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    results = benchmark_startup(args.repeat)
+    for stage, values in results.items():
+        print(f"{stage:20s} {values['median'] * 1e3:8.1f} ms  matplotlib loaded: {values['matplotlib_loaded']}")
+    headless = results['import[headless]']
+    ratio = headless['median'] / results['import[plotting]']['median']
+    print(f"headless / plotting import time: {ratio:.2f}")
+    if headless['matplotlib_loaded']:
+        print("FAIL: importing the parse/build/sag API loads matplotlib")
+        return 1
+    if ratio > args.max_ratio:
+        print(f"FAIL: headless import takes more than {args.max_ratio:.0%} of the plotting import")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import numpy as np
+from parse_jfl import build_jfl_string
+from lens_generator import make_design
+
+SURFACE_TYPES = ['Standard', 'EvenAsphere', 'OffsetCircle', 'Line']
+
+
+def synthetic_segments(n_points, n_segments=3, three_coord=False, seed=0):
+    '''
+    Deterministic segment dict with n_points coordinates spread over n_segments.
+
+    Segment names are single capital letters starting with F, B, E. All
+    coordinates are positive so they round-trip through parse_jfl_file.
+    With three_coord, every segment also gets an _XZW block.
+    '''
+    rng = np.random.default_rng(seed)
+    names = ['F', 'B', 'E'] + [chr(c) for c in range(ord('A'), ord('Z') + 1) if chr(c) not in 'FBEXZWQ']
+    counts = np.full(n_segments, n_points // n_segments)
+    counts[:n_points % n_segments] += 1
+    segments = {}
+    for name, count in zip(names, counts):
+        x = np.linspace(6.0, 0.0, count)
+        radius = rng.uniform(8.0, 40.0)
+        z = rng.uniform(0.0, 1.0) + x**2 / (radius + np.sqrt(radius**2 - x**2))
+        if three_coord:
+            half = count // 2
+            segments[name + '_XZ'] = np.column_stack([x[:half], z[:half]])
+            w = rng.uniform(0.0, 0.5) * np.ones(count - half)
+            segments[name + '_XZW'] = np.column_stack([x[half:], z[half:], w])
+        else:
+            segments[name + '_XZ'] = np.column_stack([x, z])
+    return segments
+
+
+def synthetic_jfl_string(n_points, n_segments=3, three_coord=False, seed=0):
+    return build_jfl_string(synthetic_segments(n_points, n_segments, three_coord, seed))
+
+
+def write_synthetic_jfl(file_path, n_points, n_segments=3, three_coord=False, seed=0):
+    with open(file_path, 'w') as file:
+        file.write(synthetic_jfl_string(n_points, n_segments, three_coord, seed))
+    return file_path
+
+
+def _random_segment(rng, surface_type, semidiameter, previous_semidiameter):
+    if surface_type == 'Standard':
+        params = {'Radius': rng.uniform(8.0, 60.0), 'Conic': rng.uniform(-0.5, 0.5)}
+    elif surface_type == 'EvenAsphere':
+        terms = int(rng.integers(1, 4))
+        params = {'Radius': rng.uniform(10.0, 60.0), 'Conic': rng.uniform(-0.5, 0.5),
+                  'AsphereTerm': terms, 'AsphereParams': list(rng.uniform(-1e-6, 1e-6, terms))}
+    elif surface_type == 'OffsetCircle':
+        params = {'Radius': rng.choice([-1, 1]) * rng.uniform(0.5, 2.0), 'Conic': 0.0,
+                  'Center': previous_semidiameter}
+    else:
+        params = {'EndZ': rng.uniform(0.0, 1.5)}
+    params['SemiDiameter'] = semidiameter
+    return {'type': surface_type, 'params': params}
+
+
+def synthetic_design(n_segments=3, lens_diameter=12.0, lens_thickness=0.2, seed=0):
+    '''
+    Deterministic lens JSON with n_segments segments per surface.
+
+    Surface types cycle through all four sag_calculator types so every
+    generator path is exercised.
+    '''
+    rng = np.random.default_rng(seed)
+    lens_semidiameter = lens_diameter / 2
+    surfaces = {}
+    starts = {'前表面': (0.0, 0.0), '后表面': (0.0, lens_thickness), '边缘': (lens_semidiameter - 1.0, 3.0)}
+    for k, (surface_id, (start_x, start_z)) in enumerate(starts.items()):
+        edges = np.linspace(start_x, lens_semidiameter, n_segments + 1)
+        segments = []
+        for i in range(n_segments):
+            surface_type = SURFACE_TYPES[(i + k) % len(SURFACE_TYPES)]
+            segments.append(_random_segment(rng, surface_type, float(edges[i + 1]), float(edges[i])))
+        surfaces[surface_id] = (start_x, start_z, segments)
+    return make_design(lens_thickness, lens_diameter, surfaces)
+
+
+def synthetic_pocket_profile(n_points, pocket_radius=0.5, width=8.0):
+    '''
+    (n_points, 2) flat profile with a semicircular pocket in the middle.
+
+    With a tool radius above pocket_radius the offset path forms a
+    swallowtail loop over the pocket, the hard case for tool compensation.
+    '''
+    x = np.linspace(0.0, width, n_points)
+    u = x - width / 2
+    z = np.where(np.abs(u) < pocket_radius, -np.sqrt(np.maximum(pocket_radius**2 - u**2, 0.0)), 0.0)
+    return np.column_stack([x, z + 1.0])
@@ -0,0 +1,80 @@
+'''
+Thread scaling of chunked sag evaluation.
+
+    python -m benchmarks.threaded_sag --step 1e-5 1e-6 --threads 1 2 4 8
+
+For each step, times generate_surface_sag (single call on the whole grid) and
+generate_surface_sag_threaded for every thread count, on the front surface of
+a synthetic design, and reports speedup and parallel efficiency. With
+--chunks, also sweeps chunk sizes at the largest thread count to check the
+automatic choice.
+'''
+import argparse
+import os
+import sys
+import time
+
+from lens_generator import generate_surface_sag, generate_surface_sag_threaded, auto_chunk_points
+from benchmarks.synthetic import synthetic_design
+
+
+def _timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_threads(steps, threads, repeat=3, n_segments=8):
+    '''Returns a list of dicts with points, threads, chunk size, time and speedup per step.'''
+    design = synthetic_design(n_segments=n_segments)
+    surface = design['前表面']
+    semidiameter = design['lens']['lens_semidiameter']
+    rows = []
+    for step in steps:
+        serial = _timed(lambda: generate_surface_sag(surface, semidiameter, step), repeat)
+        n = len(generate_surface_sag(surface, semidiameter, step)[0])
+        rows.append({'step': step, 'points': n, 'threads': 'serial', 'chunk': n, 'seconds': serial, 'speedup': 1.0})
+        for t in threads:
+            seconds = _timed(lambda: generate_surface_sag_threaded(surface, semidiameter, step, max_workers=t),
+                             repeat)
+            rows.append({'step': step, 'points': n, 'threads': t, 'chunk': auto_chunk_points(n, t),
+                         'seconds': seconds, 'speedup': serial / seconds})
+    return rows
+
+
+def benchmark_chunks(step, threads, chunks, repeat=3, n_segments=8):
+    design = synthetic_design(n_segments=n_segments)
+    surface = design['前表面']
+    semidiameter = design['lens']['lens_semidiameter']
+    return [{'chunk': c, 'seconds': _timed(lambda: generate_surface_sag_threaded(
+                surface, semidiameter, step, max_workers=threads, chunk_points=c), repeat)} for c in chunks]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--step', type=float, nargs='+', default=[1e-5])
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--chunks', action='store_true', help="also sweep chunk sizes")
+    args = parser.parse_args(argv)
+
+    print(f"cpu_count {os.cpu_count()}")
+    print(f"{'step':>8} {'points':>10} {'threads':>7} {'chunk':>8} {'seconds':>8} {'speedup':>7} {'eff':>5}")
+    for row in benchmark_threads(args.step, args.threads, args.repeat):
+        efficiency = row['speedup'] / row['threads'] if row['threads'] != 'serial' else 1.0
+        print(f"{row['step']:8.0e} {row['points']:10d} {row['threads']:>7} {row['chunk']:8d} "
+              f"{row['seconds']:8.3f} {row['speedup']:7.2f} {efficiency:5.2f}")
+    if args.chunks:
+        threads = max(args.threads)
+        print(f"\nchunk sweep at step {args.step[-1]:.0e}, {threads} threads")
+        for row in benchmark_chunks(args.step[-1], threads, [1 << k for k in range(12, 22, 2)], args.repeat):
+            print(f"{row['chunk']:8d} {row['seconds']:8.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
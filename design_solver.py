@@ -0,0 +1,192 @@
+'''
+Constraint-driven search of free lens JSON parameters.
+
+    variables = [
+        {'path': ('后表面', 'segments', 0, 'params', 'Radius'), 'bounds': (4.0, 7.0)},
+        # one value written to several places, each with its own offset
+        {'paths': [('lens', 'lens_thickness'), ('后表面', 'start_point_z'),
+                   (('后表面', 'segments', 1, 'params', 'EndZ'), 1.363)], 'bounds': (0.15, 0.4)},
+    ]
+    constraints = {
+        'center_thickness': {'target': 0.25, 'tol': 1e-3},
+        'back_sag': {'max': 1.5},
+        'min_thickness': {'min': 0.15},
+    }
+    design, info = solve_design(design, variables, constraints)
+
+Candidates are evaluated in batches with generate_surface_sag_batch, which
+runs the sag_calculator functions on (candidates, grid) arrays, so a batch
+costs about as much as a few single generations. The search is a
+cross-entropy method: sample a population around the current mean, keep the
+best fraction, refit mean and spread. It stops at the first batch that
+contains a feasible candidate and returns the feasible candidate closest to
+the starting design.
+'''
+import copy
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from lens_generator import STEP, SURFACE_ID_LIST, SURFACE_TO_SEGMENT, generate_segments, generate_surface_sag_batch
+
+FIXED_KEYS = {'start_point_x', 'lens_diameter', 'lens_semidiameter'}
+
+
+# 内置指标：输入各面 (r, z[N, M])，输出每个候选的指标值
+METRICS = {
+    'center_thickness': lambda s: s['B'][1][:, 0] - s['F'][1][:, 0],
+    'edge_thickness': lambda s: s['B'][1][:, -1] - s['F'][1][:, -1],
+    'min_thickness': lambda s: (s['B'][1] - s['F'][1]).min(axis=1),
+    'front_sag': lambda s: s['F'][1][:, -1] - s['F'][1][:, 0],
+    'back_sag': lambda s: s['B'][1][:, -1] - s['B'][1][:, 0],
+    'edge_height': lambda s: s['E'][1][:, -1] - s['E'][1][:, 0],
+}
+
+
+def get_path(design, path):
+    for key in path:
+        design = design[key]
+    return design
+
+
+def set_path(design, path, value):
+    for key in path[:-1]:
+        design = design[key]
+    design[path[-1]] = value
+
+
+def _targets(variable):
+    '''[(path, offset)] written by a variable.'''
+    paths = variable['paths'] if 'paths' in variable else [variable['path']]
+    targets = []
+    for item in paths:
+        path, offset = (item[0], item[1]) if isinstance(item[0], tuple) else (item, 0.0)
+        if FIXED_KEYS & set(path):
+            raise ValueError(f"{path} defines the sampling grid and cannot be a free variable")
+        targets.append((tuple(path), offset))
+    return targets
+
+
+def apply_variables(design, variables, x):
+    '''Copy of design with the variable values x written in; x of shape (N,) gives (N, 1) arrays.'''
+    design = copy.deepcopy(design)
+    for variable, value in zip(variables, np.asarray(x, dtype=float).T):
+        for path, offset in _targets(variable):
+            set_path(design, path, value.reshape(-1, 1) + offset if np.ndim(value) else float(value + offset))
+    return design
+
+
+def evaluate_candidates(design, variables, X, metric_names, step=STEP):
+    '''Metrics of every candidate row of X as a dict of (N,) arrays.'''
+    batch = apply_variables(design, variables, X)
+    lens_semidiameter = design["lens"]["lens_semidiameter"]
+    surfaces = {}
+    for surface_id in SURFACE_ID_LIST:
+        r, z = generate_surface_sag_batch(batch[surface_id], lens_semidiameter, step)
+        surfaces[SURFACE_TO_SEGMENT[surface_id]] = (r, np.broadcast_to(z, (len(X), z.shape[1])))
+    return {name: METRICS[name](surfaces) for name in metric_names}
+
+
+def _evaluate_task(args):
+    return evaluate_candidates(*args)
+
+
+def constraint_loss(metrics, constraints):
+    '''Sum of squared normalized violations; 0 for a feasible candidate, inf for NaN metrics.'''
+    loss = 0.0
+    for name, spec in constraints.items():
+        m = metrics[name]
+        scale = spec.get('tol', 1e-3)
+        violation = np.zeros_like(m)
+        if 'target' in spec:
+            violation = np.maximum(np.abs(m - spec['target']) - spec.get('tol', 0.0), 0) / scale
+        if 'min' in spec:
+            violation = violation + np.maximum(spec['min'] - m, 0) / scale
+        if 'max' in spec:
+            violation = violation + np.maximum(m - spec['max'], 0) / scale
+        loss = loss + violation**2
+    return np.where(np.isnan(loss), np.inf, loss)
+
+
+def design_metrics(design, metric_names, step=STEP):
+    '''Metrics of one design from generate_segments, for checking the solver result.'''
+    segments = generate_segments(design, step)
+    surfaces = {name[0]: (coords[:, 0], coords[:, 1][None, :]) for name, coords in segments.items()}
+    for name in ('F', 'B'):
+        r, z = surfaces[name]
+        surfaces[name] = (r[::-1], z[:, ::-1])
+    return {name: float(METRICS[name](surfaces)[0]) for name in metric_names}
+
+
+def solve_design(design, variables, constraints, step=STEP, population=256, elite_fraction=0.1,
+                 max_iter=40, max_workers=1, seed=0):
+    '''
+    Search the free variables of a lens JSON until all constraints hold.
+
+    Args:
+    design (dict): Starting lens JSON; its values are the initial guess.
+    variables (list): Dicts with 'path' (or 'paths', entries optionally (path, offset))
+        into the JSON and 'bounds' (lo, hi).
+    constraints (dict): Metric name (see METRICS) -> {'target', 'tol'} and/or {'min'}, {'max'}.
+    population (int): Candidates evaluated per iteration.
+    max_workers (int): Worker processes sharing each population; 1 evaluates in-process.
+
+    Returns (design, info); info holds feasible, metrics (from generate_segments),
+    iterations, evaluations and seconds. If nothing feasible is found the
+    design with the smallest violation is returned.
+    '''
+    start_time = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    bounds = np.array([variable['bounds'] for variable in variables], dtype=float)
+    lo, hi = bounds[:, 0], bounds[:, 1]
+    x0 = np.array([get_path(design, path) - offset for path, offset in (_targets(v)[0] for v in variables)])
+    x0 = np.clip(x0, lo, hi)
+    mean = x0.copy()
+    sigma = (hi - lo) / 4
+    n_elite = max(2, int(population * elite_fraction))
+    names = list(constraints)
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers and max_workers > 1 else None
+
+    best_x, best_loss = x0, np.inf
+    evaluations = 0
+    feasible = False
+    try:
+        for iteration in range(1, max_iter + 1):
+            X = np.clip(rng.normal(mean, sigma, size=(population, len(variables))), lo, hi)
+            if iteration == 1:
+                X[0] = x0
+            if executor is None:
+                metrics = evaluate_candidates(design, variables, X, names, step)
+            else:
+                chunks = np.array_split(X, max_workers)
+                parts = list(executor.map(_evaluate_task, [(design, variables, c, names, step) for c in chunks]))
+                metrics = {name: np.concatenate([p[name] for p in parts]) for name in names}
+            evaluations += len(X)
+            loss = constraint_loss(metrics, constraints)
+
+            ok = np.flatnonzero(loss == 0)
+            if len(ok):
+                # 可行解中取离初始设计最近的一个
+                distance = (((X[ok] - x0) / np.where(hi > lo, hi - lo, 1))**2).sum(axis=1)
+                best_x, best_loss, feasible = X[ok[np.argmin(distance)]], 0.0, True
+                break
+            order = np.argsort(loss)
+            if loss[order[0]] < best_loss:
+                best_x, best_loss = X[order[0]], loss[order[0]]
+            elite = X[order[:n_elite]]
+            mean = elite.mean(axis=0)
+            sigma = np.maximum(elite.std(axis=0), (hi - lo) * 1e-9)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    result = apply_variables(design, variables, best_x)
+    info = {
+        'feasible': feasible,
+        'loss': float(best_loss),
+        'variables': best_x.tolist(),
+        'metrics': design_metrics(result, names, step),
+        'iterations': iteration,
+        'evaluations': evaluations,
+        'seconds': time.perf_counter() - start_time,
+    }
+    return result, info
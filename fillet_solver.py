@@ -0,0 +1,213 @@
+'''
+Tangent fillets between neighbouring segments of a lens JSON.
+
+A surface is first described with sharp corners, e.g. Standard -> Line ->
+Line, and each corner to be rounded gets a fillet radius. For every corner
+the solver finds the two tangent points on the neighbouring segments so that
+an OffsetCircle of that radius touches both, then trims the neighbours and
+inserts the OffsetCircle between them. All corners of all designs are solved
+together with a vectorized Newton iteration on the two tangent points.
+
+The geometry is solved for the continuous profile; generate_surface_sag
+evaluates each segment from the first grid point after its start, so on the
+grid the junctions stay within one sampling step of tangency.
+'''
+import copy
+import numpy as np
+from sag_calculator import TYPE_TO_CORE, TYPE_TO_SLOPE
+
+
+def segment_end_z(segment, r_start, z_start):
+    '''Sag at the SemiDiameter of a segment starting at (r_start, z_start) in the continuous profile.'''
+    params = segment["params"]
+    if segment["type"] == 'Line':
+        return params["EndZ"]
+    core = TYPE_TO_CORE[segment["type"]]
+    return z_start + core(params["SemiDiameter"], params) - core(r_start, params)
+
+
+def segment_starts(surface):
+    '''(r, z) start point of every segment of a surface, chaining the segments end to end.'''
+    r = surface["start_point_x"]
+    z = surface["start_point_z"]
+    starts = []
+    for segment in surface["segments"][:surface.get("num_of_segments", len(surface["segments"]))]:
+        starts.append((r, z))
+        z = segment_end_z(segment, r, z)
+        r = segment["params"]["SemiDiameter"]
+    return starts
+
+
+def _stack_params(params_list):
+    '''Per-segment parameter dicts of one type -> one dict of arrays, for broadcasting in sag_calculator.'''
+    stacked = {}
+    for key in params_list[0]:
+        if key == 'AsphereParams':
+            n_terms = max(len(p[key]) for p in params_list)
+            padded = np.array([list(p[key]) + [0.0] * (n_terms - len(p[key])) for p in params_list], dtype=float)
+            stacked[key] = list(padded.T)
+        elif key == 'AsphereTerm':
+            stacked[key] = max(p[key] for p in params_list)
+        else:
+            stacked[key] = np.array([p[key] for p in params_list], dtype=float)
+    return stacked
+
+
+class PlacedSegments:
+    '''
+    A batch of segments placed at their start points, evaluated together.
+
+    Args:
+    segments (list): Segment dicts {"type": ..., "params": {...}}.
+    starts (list): (r, z) start point of each segment.
+    '''
+    def __init__(self, segments, starts):
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        self.r_start, self.z_start = starts[:, 0], starts[:, 1]
+        self.semidiameter = np.array([s["params"]["SemiDiameter"] for s in segments], dtype=float)
+        types = np.array([s["type"] for s in segments])
+        self.groups = []
+        for kind in np.unique(types):
+            index = np.flatnonzero(types == kind)
+            self.groups.append((kind, index, _stack_params([segments[i]["params"] for i in index])))
+
+    def __call__(self, r):
+        '''Sag and slope of every segment at its own radius r.'''
+        z = np.empty_like(r)
+        slope = np.empty_like(r)
+        for kind, index, params in self.groups:
+            r_i, r0, z0 = r[index], self.r_start[index], self.z_start[index]
+            if kind == 'Line':
+                slope[index] = (params["EndZ"] - z0) / (params["SemiDiameter"] - r0)
+                z[index] = z0 + slope[index] * (r_i - r0)
+            else:
+                core = TYPE_TO_CORE[kind]
+                z[index] = z0 + core(r_i, params) - core(r0, params)
+                slope[index] = TYPE_TO_SLOPE[kind](r_i, params, z0)
+        return z, slope
+
+
+def _offset_point(curve, t, offset):
+    z, slope = curve(t)
+    norm = np.sqrt(1 + slope**2)
+    return t - offset * slope / norm, z + offset / norm
+
+
+def solve_tangent_fillets(curve_a, curve_b, corner_r, radius, n_iter=30, tol=1e-12):
+    '''
+    Tangent points of fillets between pairs of placed segments, vectorized over the pairs.
+
+    Args:
+    curve_a, curve_b (PlacedSegments): Segments before and after each corner.
+    corner_r (np.ndarray): Radius of each sharp corner (the SemiDiameter of curve_a).
+    radius (np.ndarray): Fillet radii (positive).
+
+    Returns a dict of arrays: t1, t2 (tangent radii on a and b), Center, Radius
+    (signed as in OffsetCircle), residual and ok (converged and inside both segments).
+    '''
+    corner_r = np.asarray(corner_r, dtype=float)
+    rho = np.abs(np.asarray(radius, dtype=float)) * np.ones_like(corner_r)
+    _, slope_a = curve_a(corner_r)
+    _, slope_b = curve_b(corner_r)
+    # 斜率增大为凹角，圆心在轮廓上方
+    sigma = np.where(slope_b >= slope_a, 1.0, -1.0)
+    offset = sigma * rho
+
+    # 初值：按两条切线求直线倒角的切点
+    alpha_a, alpha_b = np.arctan(slope_a), np.arctan(slope_b)
+    d = rho * np.tan(np.abs(alpha_b - alpha_a) / 2)
+    t1 = corner_r - d * np.cos(alpha_a)
+    t2 = corner_r + d * np.cos(alpha_b)
+
+    def residual(t1, t2):
+        ax, az = _offset_point(curve_a, t1, offset)
+        bx, bz = _offset_point(curve_b, t2, offset)
+        return ax - bx, az - bz
+
+    h = 1e-7
+    for _ in range(n_iter):
+        fx, fz = residual(t1, t2)
+        if np.all(np.hypot(fx, fz) < tol):
+            break
+        ax_p, az_p = residual(t1 + h, t2)
+        ax_m, az_m = residual(t1 - h, t2)
+        bx_p, bz_p = residual(t1, t2 + h)
+        bx_m, bz_m = residual(t1, t2 - h)
+        j11, j21 = (ax_p - ax_m) / (2 * h), (az_p - az_m) / (2 * h)
+        j12, j22 = (bx_p - bx_m) / (2 * h), (bz_p - bz_m) / (2 * h)
+        det = j11 * j22 - j12 * j21
+        det = np.where(np.abs(det) < 1e-300, 1e-300, det)
+        t1 = t1 - (j22 * fx - j12 * fz) / det
+        t2 = t2 - (j11 * fz - j21 * fx) / det
+
+    fx, fz = residual(t1, t2)
+    center, _ = _offset_point(curve_a, t1, offset)
+    error = np.hypot(fx, fz)
+    ok = (error < 1e-9) & (t1 > curve_a.r_start) & (t1 <= corner_r) & (t2 >= corner_r) & (t2 < curve_b.semidiameter)
+    return {'t1': t1, 't2': t2, 'Center': center, 'Radius': offset, 'residual': error, 'ok': ok}
+
+
+def fillet_designs(designs, fillets, n_iter=30):
+    '''
+    Round the requested corners of many lens JSON designs at once.
+
+    Args:
+    designs (list): Lens JSON dicts with sharp corners.
+    fillets (list): One dict per design, {surface_id: {j: radius}}, where j is the
+        index of the segment whose end corner (towards segment j + 1) is rounded.
+
+    Returns (new_designs, report). Corners that cannot be filleted (no
+    convergence, or the fillet does not fit inside its neighbours) are left
+    sharp; report lists every corner as a dict with its design index, surface,
+    j, tangent points, residual and ok.
+    '''
+    segments_a, segments_b, starts_a, starts_b, corners, radii, keys = [], [], [], [], [], [], []
+    for d, (design, requested) in enumerate(zip(designs, fillets)):
+        for surface_id, corners_of_surface in requested.items():
+            surface = design[surface_id]
+            starts = segment_starts(surface)
+            for j, radius in corners_of_surface.items():
+                segments_a.append(surface["segments"][j])
+                segments_b.append(surface["segments"][j + 1])
+                starts_a.append(starts[j])
+                starts_b.append(starts[j + 1])
+                corners.append(surface["segments"][j]["params"]["SemiDiameter"])
+                radii.append(radius)
+                keys.append((d, surface_id, j))
+
+    new_designs = [copy.deepcopy(design) for design in designs]
+    if not keys:
+        return new_designs, []
+    curve_a = PlacedSegments(segments_a, starts_a)
+    curve_b = PlacedSegments(segments_b, starts_b)
+    result = solve_tangent_fillets(curve_a, curve_b, np.array(corners), np.array(radii), n_iter)
+    end_z_a, _ = curve_a(result['t1'])
+
+    report = []
+    # 同一面内从后往前插入，前面的下标不受影响
+    for i in sorted(range(len(keys)), key=lambda i: (keys[i][0], keys[i][1], -keys[i][2])):
+        d, surface_id, j = keys[i]
+        ok = bool(result['ok'][i])
+        report.append({'design': d, 'surface': surface_id, 'j': j, 't1': float(result['t1'][i]),
+                       't2': float(result['t2'][i]), 'residual': float(result['residual'][i]), 'ok': ok})
+        if not ok:
+            continue
+        surface = new_designs[d][surface_id]
+        segment = surface["segments"][j]
+        segment["params"]["SemiDiameter"] = float(result['t1'][i])
+        if segment["type"] == 'Line':
+            segment["params"]["EndZ"] = float(end_z_a[i])
+        surface["segments"].insert(j + 1, {
+            "type": "OffsetCircle",
+            "params": {"SemiDiameter": float(result['t2'][i]), "Radius": float(result['Radius'][i]),
+                       "Conic": 0.0, "Center": float(result['Center'][i])},
+        })
+        surface["num_of_segments"] = len(surface["segments"])
+    report.sort(key=lambda item: (item['design'], item['surface'], item['j']))
+    return new_designs, report
+
+
+def fillet_design(design, fillets, n_iter=30):
+    '''Single-design form of fillet_designs. Returns (new_design, report).'''
+    new_designs, report = fillet_designs([design], [fillets], n_iter)
+    return new_designs[0], report
@@ -0,0 +1,248 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from parse_jfl import parse_jfl_file
+
+PROFILE_NAMES = ['F_XZ', 'B_XZ', 'E_XZ']
+PAIR_CHUNK = 1 << 18  # 每块测试的候选线段对数
+
+
+def _orient(ax, az, bx, bz, cx, cz):
+    return (bx - ax) * (cz - az) - (bz - az) * (cx - ax)
+
+
+def _cell_pairs(key, item):
+    '''All unordered pairs (i, j) of items that share a grid cell key.'''
+    order = np.argsort(key, kind='stable')
+    key, item = key[order], item[order]
+    n = len(key)
+    starts = np.flatnonzero(np.concatenate([[True], key[1:] != key[:-1]]))
+    counts = np.diff(np.append(starts, n))
+    position = np.arange(n)
+    n_partners = np.repeat(starts + counts, counts) - position - 1
+    first = np.repeat(position, n_partners)
+    second = first + 1 + np.arange(n_partners.sum()) - np.repeat(np.cumsum(n_partners) - n_partners, n_partners)
+    return item[first], item[second]
+
+
+def segment_intersections(polylines, cell=None):
+    '''
+    Proper crossings between all segments of several polylines.
+
+    Segments are bucketed into a uniform grid (cell size a few times the
+    median segment length) and only segments sharing a cell are tested, so
+    the cost is close to linear in the number of points. Segments longer
+    than a cell are registered piece by piece along the line, not over
+    their whole bounding box, so memory stays linear too. Segments that
+    only touch at an end point, and neighbouring segments of the same
+    polyline, are not reported.
+
+    Args:
+    polylines (list): List of (N, 2) arrays.
+
+    Returns an (K, 6) array of (polyline a, segment a, polyline b, segment b, x, z).
+    '''
+    polylines = [np.asarray(p, dtype=float) for p in polylines]
+    p0 = np.vstack([p[:-1] for p in polylines if len(p) > 1] or [np.empty((0, 2))])
+    p1 = np.vstack([p[1:] for p in polylines if len(p) > 1] or [np.empty((0, 2))])
+    owner = np.concatenate([np.full(max(len(p) - 1, 0), i) for i, p in enumerate(polylines)])
+    index = np.concatenate([np.arange(max(len(p) - 1, 0)) for p in polylines])
+    if len(p0) < 2:
+        return np.empty((0, 6))
+
+    length = np.hypot(*(p1 - p0).T)
+    if cell is None:
+        # 下限为平均长度的 1/4，保证切分后的小段总数不超过线段数的 5 倍
+        cell = max(4 * np.median(length), length.sum() / (4 * len(p0)), 1e-9)
+    # 长线段（如退刀直线、补偿后的拐角弦）切成不长于一个网格的小段，每小段最多落在 2x2 个网格中，
+    # 不再把整个包围盒内的网格都登记一遍
+    n_pieces = np.maximum(np.ceil(length / cell), 1).astype(np.int64)
+    piece_seg = np.repeat(np.arange(len(p0)), n_pieces)
+    if len(piece_seg) == len(p0):
+        q0, q1 = p0, p1
+    else:
+        j = np.arange(len(piece_seg)) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+        d = (p1 - p0)[piece_seg]
+        q0 = p0[piece_seg] + (j / n_pieces[piece_seg])[:, None] * d
+        q1 = p0[piece_seg] + ((j + 1) / n_pieces[piece_seg])[:, None] * d
+        del j, d
+    lo = np.minimum(q0, q1)
+    hi = np.maximum(q0, q1)
+    origin = lo.min(axis=0)
+    i0 = np.floor((lo - origin) / cell).astype(np.int64)
+    i1 = np.floor((hi - origin) / cell).astype(np.int64)
+    nx = i1[:, 0] - i0[:, 0] + 1
+    nz = i1[:, 1] - i0[:, 1] + 1
+    n_cells = nx * nz
+    piece = np.repeat(np.arange(len(q0)), n_cells)
+    k = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+    cx = i0[piece, 0] + k % nx[piece]
+    cz = i0[piece, 1] + k // nx[piece]
+    seg = piece_seg[piece]
+    a, b = _cell_pairs(cx * (i1[:, 1].max() + 1) + cz, seg)
+    del q0, q1, lo, hi, i0, i1, cx, cz, piece, k, seg
+
+    # 同一条线上的相邻线段共享端点，不算相交；X 严格单调的线不可能自交
+    monotonic = np.array([len(p) > 1 and (np.all(np.diff(p[:, 0]) > 0) or np.all(np.diff(p[:, 0]) < 0))
+                          for p in polylines])
+    # 候选对分块测试，临时数组的内存与块大小而不是候选对总数成正比
+    hit_a, hit_b = [], []
+    for start in range(0, len(a), PAIR_CHUNK):
+        ca, cb = a[start:start + PAIR_CHUNK], b[start:start + PAIR_CHUNK]
+        same = owner[ca] == owner[cb]
+        keep = ~same | ((np.abs(index[ca] - index[cb]) > 1) & ~monotonic[owner[ca]])
+        ca, cb = ca[keep], cb[keep]
+        d1 = _orient(*p0[ca].T, *p1[ca].T, *p0[cb].T)
+        d2 = _orient(*p0[ca].T, *p1[ca].T, *p1[cb].T)
+        d3 = _orient(*p0[cb].T, *p1[cb].T, *p0[ca].T)
+        d4 = _orient(*p0[cb].T, *p1[cb].T, *p1[ca].T)
+        hit = (d1 * d2 < 0) & (d3 * d4 < 0)
+        hit_a.append(ca[hit])
+        hit_b.append(cb[hit])
+    a, b = np.concatenate(hit_a or [a[:0]]), np.concatenate(hit_b or [b[:0]])
+    # 跨越多个网格的线段对会重复出现，只对命中的线段对去重
+    a, b = np.minimum(a, b), np.maximum(a, b)
+    _, first = np.unique(a * len(p0) + b, return_index=True)
+    a, b = a[first], b[first]
+    d3 = _orient(*p0[b].T, *p1[b].T, *p0[a].T)
+    d4 = _orient(*p0[b].T, *p1[b].T, *p1[a].T)
+    u = d3 / (d3 - d4)
+    point = p0[a] + u[:, None] * (p1[a] - p0[a])
+    return np.column_stack([owner[a], index[a], owner[b], index[b], point])
+
+
+def _point_segment_distance(p, s0, s1):
+    d = s1 - s0
+    length2 = (d**2).sum(axis=1)
+    u = np.clip(((p - s0) * d).sum(axis=1) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+    foot = s0 + u[:, None] * d
+    return np.hypot(*(p - foot).T), foot
+
+
+def _bbox_pyramid(P, levels):
+    '''Bounding boxes of the segments of P grouped in blocks of 1, 2, 4, ... 2**levels segments.'''
+    n = 2**levels
+    index = np.minimum(np.arange(n), len(P) - 2)
+    s0, s1 = P[index], P[index + 1]
+    lo = [np.minimum(s0, s1)]
+    hi = [np.maximum(s0, s1)]
+    for _ in range(levels):
+        lo.append(np.minimum(lo[-1][0::2], lo[-1][1::2]))
+        hi.append(np.maximum(hi[-1][0::2], hi[-1][1::2]))
+    return lo, hi, index
+
+
+def _bbox_distance(lo_a, hi_a, lo_b, hi_b):
+    gap = np.maximum(0.0, np.maximum(lo_a - hi_b, lo_b - hi_a))
+    return np.hypot(gap[:, 0], gap[:, 1])
+
+
+def min_clearance(A, B):
+    '''
+    Minimum distance between two polylines and the closest pair of points.
+
+    Both polylines are organised as bounding-box pyramids over blocks of
+    consecutive segments and descended together; block pairs farther apart
+    than the best distance found so far are pruned at every level, so only
+    segment pairs near the closest approach are measured exactly.
+
+    Returns (distance, point on A, point on B).
+    '''
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float)
+    if len(A) < 2 or len(B) < 2:
+        return np.inf, None, None
+    levels = int(np.ceil(np.log2(max(len(A), len(B)) - 1))) if max(len(A), len(B)) > 2 else 0
+    lo_a, hi_a, seg_a = _bbox_pyramid(A, levels)
+    lo_b, hi_b, seg_b = _bbox_pyramid(B, levels)
+
+    # 抽样点之间的最小距离是真实最小距离的上界
+    a = A[::max(1, len(A) // 512)]
+    b = B[::max(1, len(B) // 512)]
+    upper = np.sqrt(((a[:, None, :] - b[None, :, :])**2).sum(axis=-1).min())
+
+    ia = np.zeros(1, dtype=np.int64)
+    ib = np.zeros(1, dtype=np.int64)
+    # 两条线都只有一段时没有金字塔层级，直接比较这一对线段
+    pair = np.zeros(1, dtype=np.int64)
+    for level in range(levels - 1, -1, -1):
+        ia = (2 * ia[:, None] + np.array([0, 0, 1, 1])).ravel()
+        ib = (2 * ib[:, None] + np.array([0, 1, 0, 1])).ravel()
+        keep = _bbox_distance(lo_a[level][ia], hi_a[level][ia], lo_b[level][ib], hi_b[level][ib]) <= upper
+        ia, ib = ia[keep], ib[keep]
+        pair = np.unique(seg_a[ia << level] * len(B) + seg_b[ib << level]) if level == 0 else None
+        if level > 0:
+            start_a = A[seg_a[ia << level]]
+            start_b = B[seg_b[ib << level]]
+            upper = min(upper, np.hypot(*(start_a - start_b).T).min())
+    sa, sb = pair // len(B), pair % len(B)
+
+    candidates = [
+        _point_segment_distance(A[sa], B[sb], B[sb + 1]) + (A[sa], 0),
+        _point_segment_distance(A[sa + 1], B[sb], B[sb + 1]) + (A[sa + 1], 0),
+        _point_segment_distance(B[sb], A[sa], A[sa + 1]) + (B[sb], 1),
+        _point_segment_distance(B[sb + 1], A[sa], A[sa + 1]) + (B[sb + 1], 1),
+    ]
+    best = None
+    for distance, foot, point, reverse in candidates:
+        i = np.argmin(distance)
+        if best is None or distance[i] < best[0]:
+            best = (float(distance[i]), foot[i], point[i]) if reverse else (float(distance[i]), point[i], foot[i])
+    return best
+
+
+def check_geometry(segments, min_clearance_limit=None):
+    '''
+    Validate the F/B/E profiles of a segment dict before cutting.
+
+    Reports self-intersections of each profile, crossings between profiles
+    and the minimum clearance between each pair of profiles.
+
+    Args:
+    segments (dict): Segment dict with F_XZ, B_XZ and E_XZ (missing ones are skipped).
+    min_clearance_limit (float): If given, clearances below it also fail the check.
+    '''
+    names = [name for name in PROFILE_NAMES if name in segments and len(segments[name]) > 1]
+    polylines = [np.asarray(segments[name], dtype=float)[:, :2] for name in names]
+    hits = segment_intersections(polylines)
+
+    report = {'self_intersections': {}, 'crossings': {}, 'clearance': {}}
+    for i, name in enumerate(names):
+        rows = hits[(hits[:, 0] == i) & (hits[:, 2] == i)]
+        report['self_intersections'][name[0]] = rows[:, 4:].tolist()
+    for i in range(len(names)):
+        for j in range(i + 1, len(names)):
+            pair_name = f'{names[i][0]}-{names[j][0]}'
+            rows = hits[((hits[:, 0] == i) & (hits[:, 2] == j)) | ((hits[:, 0] == j) & (hits[:, 2] == i))]
+            report['crossings'][pair_name] = rows[:, 4:].tolist()
+            if len(rows):
+                report['clearance'][pair_name] = {'distance': 0.0, 'point_a': rows[0, 4:].tolist(),
+                                                  'point_b': rows[0, 4:].tolist()}
+                continue
+            distance, point_a, point_b = min_clearance(polylines[i], polylines[j])
+            report['clearance'][pair_name] = {
+                'distance': distance,
+                'point_a': None if point_a is None else point_a.tolist(),
+                'point_b': None if point_b is None else point_b.tolist(),
+            }
+
+    ok = len(hits) == 0
+    if min_clearance_limit is not None:
+        ok = ok and all(c['distance'] >= min_clearance_limit for c in report['clearance'].values())
+    report['ok'] = ok
+    return report
+
+
+def check_jfl_file(file_path, min_clearance_limit=None):
+    return check_geometry(parse_jfl_file(file_path), min_clearance_limit)
+
+
+def _check_file_task(args):
+    file_path, min_clearance_limit = args
+    return file_path, check_jfl_file(file_path, min_clearance_limit)
+
+
+def check_jfl_files(file_paths, min_clearance_limit=None, max_workers=None):
+    '''Validate many JFL files in worker processes. Returns a list of (path, report).'''
+    tasks = [(file_path, min_clearance_limit) for file_path in file_paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_check_file_task, tasks, chunksize=8))
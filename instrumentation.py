@@ -0,0 +1,176 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# 设置 JFL_PROFILE=1 即在导入时开启统计；JFL_PROFILE_OUTPUT / JFL_PROFILE_TRACE 指定退出时导出的文件
+ENV_VAR = 'JFL_PROFILE'
+OUTPUT_ENV_VAR = 'JFL_PROFILE_OUTPUT'
+TRACE_ENV_VAR = 'JFL_PROFILE_TRACE'
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+_stats = {}
+_events = []
+_folded = {}
+_hot = []       # (module name, attribute, original, wrapped)
+_tables = []    # (table, key, original, wrapped)
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable():
+    '''Start recording and swap the wrapped versions of hot functions in.'''
+    global _enabled
+    _enabled = True
+    for module_name, name, original, wrapped in _hot:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            setattr(module, name, wrapped)
+    for table, key, original, wrapped in _tables:
+        table[key] = wrapped
+
+
+def disable():
+    '''Stop recording and restore the original hot functions.'''
+    global _enabled
+    _enabled = False
+    for module_name, name, original, wrapped in _hot:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            setattr(module, name, original)
+    for table, key, original, wrapped in _tables:
+        table[key] = original
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _events.clear()
+        _folded.clear()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _wrap(func, stage, measure, aggregate):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        stack = _stack()
+        frame = [stage, 0.0]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            path = ';'.join([f[0] for f in stack] + [stage])
+        points, nbytes = measure(args, kwargs, result) if measure else (0, 0)
+        with _lock:
+            entry = _stats.get(stage)
+            if entry is None:
+                entry = _stats[stage] = {'calls': 0, 'time': 0.0, 'points': 0, 'bytes': 0}
+            entry['calls'] += 1
+            entry['time'] += elapsed
+            entry['points'] += points
+            entry['bytes'] += nbytes
+            _folded[path] = _folded.get(path, 0.0) + elapsed - frame[1]
+            if not aggregate:
+                _events.append({'name': stage, 'ph': 'X', 'ts': (start - _origin) * 1e6,
+                                'dur': elapsed * 1e6, 'pid': os.getpid(), 'tid': threading.get_ident(),
+                                'args': {'points': points, 'bytes': nbytes}})
+        return result
+    return wrapper
+
+
+def instrumented(stage, measure=None, hot=False, aggregate=False):
+    '''
+    Decorator recording wall time, calls, points and bytes of a stage.
+
+    Args:
+    stage (str): Stage name used in the statistics and traces.
+    measure (callable): measure(args, kwargs, result) -> (points, bytes).
+    hot (bool): For functions called per line/point. The module attribute
+        is only swapped for the wrapper while recording is enabled, so there
+        is no overhead at all when disabled. Only calls that look the name
+        up in its module (not `from module import name` copies) are counted.
+    aggregate (bool): Only accumulate totals, without one trace event per call.
+    '''
+    def decorator(func):
+        wrapped = _wrap(func, stage, measure, aggregate)
+        if not hot:
+            return wrapped
+        _hot.append((func.__module__, func.__name__, func, wrapped))
+        return wrapped if _enabled else func
+    return decorator
+
+
+def instrument_table(table, prefix, measure=None):
+    '''Instrument every function of a dispatch table such as TYPE_TO_FUNCTION, in place.'''
+    for key, func in list(table.items()):
+        wrapped = _wrap(func, prefix + key, measure, aggregate=False)
+        _tables.append((table, key, func, wrapped))
+        if _enabled:
+            table[key] = wrapped
+
+
+def segment_points(segments):
+    return sum(len(coords) for coords in segments.values())
+
+
+def stats():
+    '''Per-stage totals: calls, time (s), points and bytes.'''
+    with _lock:
+        return {stage: dict(entry) for stage, entry in _stats.items()}
+
+
+def export_json(file_path=None):
+    result = {'stages': stats()}
+    if file_path is not None:
+        with open(file_path, 'w') as file:
+            json.dump(result, file, indent=2)
+    return result
+
+
+def export_trace(file_path):
+    '''Write a Chrome trace-event file (chrome://tracing, Perfetto, speedscope).'''
+    with _lock:
+        trace = {'traceEvents': list(_events), 'otherData': {'stages': {k: dict(v) for k, v in _stats.items()}}}
+    with open(file_path, 'w') as file:
+        json.dump(trace, file)
+
+
+def export_folded(file_path):
+    '''Write folded stacks (self time in microseconds) for flamegraph.pl / speedscope.'''
+    with _lock:
+        lines = [f'{path} {int(round(seconds * 1e6))}' for path, seconds in _folded.items()]
+    with open(file_path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def _export_at_exit():
+    if os.environ.get(OUTPUT_ENV_VAR):
+        export_json(os.environ[OUTPUT_ENV_VAR])
+    if os.environ.get(TRACE_ENV_VAR):
+        export_trace(os.environ[TRACE_ENV_VAR])
+
+
+if os.environ.get(ENV_VAR, '') not in ('', '0'):
+    enable()
+    atexit.register(_export_at_exit)
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from parse_jfl import parse_jfl_file, open_jfl, is_jfl_path
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    header TEXT NOT NULL,
+    job_number TEXT,
+    header_date TEXT,
+    n_segments INTEGER NOT NULL,
+    n_points INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    n_points INTEGER NOT NULL,
+    x_min REAL, x_max REAL, z_min REAL, z_max REAL,
+    max_sag REAL,
+    PRIMARY KEY (file_id, name)
+);
+CREATE INDEX IF NOT EXISTS segments_sag ON segments(segment, max_sag);
+CREATE INDEX IF NOT EXISTS segments_points ON segments(segment, n_points);
+CREATE INDEX IF NOT EXISTS files_sha ON files(sha256);
+'''
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    '''Hash of the decompressed JFL content, so a .JFL and its .JFL.gz copy hash the same.'''
+    digest = hashlib.sha256()
+    with open_jfl(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_jfl_header(file_path):
+    '''Lines before the first segment, i.e. before the first coordinate line and its segment name.'''
+    lines = []
+    with open_jfl(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            # 以 X 开头即为坐标行，不论 Z 的正负
+            if line.startswith(('*', 'X')):
+                break
+            lines.append(line)
+    # 坐标行之前的段名不属于文件头
+    if lines and lines[-1].isalpha():
+        lines.pop()
+    return lines
+
+
+def summarize_segments(segments):
+    '''Per-segment point count, X/Z bounding box and max sag (|z - z at the smallest x|).'''
+    rows = []
+    for name, coords in segments.items():
+        coords = np.asarray(coords, dtype=float)
+        segment, _, kind = name.rpartition('_')
+        x, z = coords[:, 0], coords[:, 1]
+        vertex_z = z[np.argmin(x)]
+        rows.append({'name': name, 'segment': segment, 'kind': kind, 'n_points': len(coords),
+                     'x_min': float(x.min()), 'x_max': float(x.max()),
+                     'z_min': float(z.min()), 'z_max': float(z.max()),
+                     'max_sag': float(np.abs(z - vertex_z).max())})
+    return rows
+
+
+def index_jfl_file(file_path):
+    '''Parse one file and return its catalog record (runs in worker processes).'''
+    stat = os.stat(file_path)
+    header = read_jfl_header(file_path)
+    rows = summarize_segments(parse_jfl_file(file_path))
+    return {
+        'path': os.path.abspath(file_path),
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'sha256': file_sha256(file_path),
+        'header': header,
+        'segments': rows,
+    }
+
+
+def _index_task(file_path):
+    try:
+        return index_jfl_file(file_path), None
+    except Exception as e:
+        return None, f'{file_path}: {e!r}'
+
+
+class JFLCatalog:
+    '''
+    SQLite index of JFL archives with per-file and per-segment summaries.
+
+    Args:
+    db_path (str): SQLite database file, created if missing.
+    '''
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _stale_paths(self, paths):
+        '''Paths whose mtime/size differ from the catalog, plus the files whose hash is unchanged.'''
+        known = {row['path']: row for row in self.connection.execute('SELECT path, mtime, size, sha256 FROM files')}
+        stale = []
+        touched = []
+        for path in paths:
+            stat = os.stat(path)
+            row = known.get(path)
+            if row is not None and row['mtime'] == stat.st_mtime and row['size'] == stat.st_size:
+                continue
+            # 修改时间变化但内容未变，只更新 mtime
+            if row is not None and row['size'] == stat.st_size and row['sha256'] == file_sha256(path):
+                touched.append((stat.st_mtime, path))
+                continue
+            stale.append(path)
+        return stale, touched
+
+    def update(self, paths, max_workers=None, prune=False):
+        '''
+        Index new or changed JFL files; unchanged files are skipped.
+
+        Args:
+        paths (list or str): Files and/or directories (scanned recursively for .JFL/.JFL.gz/.JFL.xz).
+        prune (bool): Remove catalog entries under the given directories whose files no longer exist.
+
+        Returns a dict with the number of indexed, touched and pruned files and the errors.
+        '''
+        if isinstance(paths, str):
+            paths = [paths]
+        files = []
+        directories = []
+        for path in paths:
+            if os.path.isdir(path):
+                directories.append(os.path.abspath(path))
+                for root, _, names in os.walk(path):
+                    files.extend(os.path.abspath(os.path.join(root, name)) for name in names if is_jfl_path(name))
+            else:
+                files.append(os.path.abspath(path))
+
+        stale, touched = self._stale_paths(sorted(set(files)))
+        errors = []
+        with self.connection:
+            self.connection.executemany('UPDATE files SET mtime = ? WHERE path = ?', touched)
+        if stale:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                for record, error in executor.map(_index_task, stale, chunksize=8):
+                    if error:
+                        errors.append(error)
+                    else:
+                        self._store(record)
+
+        pruned = 0
+        if prune:
+            present = set(files)
+            with self.connection:
+                for directory in directories:
+                    # 精确、区分大小写的前缀比较；LIKE 会把 _ 和 % 当作通配符且忽略 ASCII 大小写
+                    prefix = directory.rstrip(os.sep) + os.sep
+                    rows = self.connection.execute('SELECT id, path FROM files WHERE substr(path, 1, ?) = ?',
+                                                   (len(prefix), prefix)).fetchall()
+                    gone = [(row['id'],) for row in rows if row['path'] not in present]
+                    self.connection.executemany('DELETE FROM files WHERE id = ?', gone)
+                    pruned += len(gone)
+        return {'indexed': len(stale) - len(errors), 'touched': len(touched), 'pruned': pruned, 'errors': errors}
+
+    def _store(self, record):
+        header = record['header']
+        with self.connection:
+            self.connection.execute('DELETE FROM files WHERE path = ?', (record['path'],))
+            cursor = self.connection.execute(
+                'INSERT INTO files (path, mtime, size, sha256, header, job_number, header_date, n_segments, '
+                'n_points, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (record['path'], record['mtime'], record['size'], record['sha256'], json.dumps(header),
+                 header[2] if len(header) > 2 else None, header[3] if len(header) > 3 else None,
+                 len(record['segments']), sum(row['n_points'] for row in record['segments']), time.time()))
+            file_id = cursor.lastrowid
+            self.connection.executemany(
+                'INSERT INTO segments (file_id, name, segment, kind, n_points, x_min, x_max, z_min, z_max, max_sag) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(file_id, row['name'], row['segment'], row['kind'], row['n_points'], row['x_min'], row['x_max'],
+                  row['z_min'], row['z_max'], row['max_sag']) for row in record['segments']])
+
+    def find(self, segment=None, kind=None, min_points=None, max_points=None, min_sag=None, max_sag=None,
+             min_x=None, max_x=None):
+        '''
+        Paths of files having at least one segment matching all given conditions.
+
+        Example: find(segment='B', min_sag=1.4), find(segment='E', min_points=5000).
+        '''
+        conditions = []
+        params = []
+        for column, operator, value in [('s.segment', '=', segment), ('s.kind', '=', kind),
+                                        ('s.n_points', '>=', min_points), ('s.n_points', '<=', max_points),
+                                        ('s.max_sag', '>=', min_sag), ('s.max_sag', '<=', max_sag),
+                                        ('s.x_min', '>=', min_x), ('s.x_max', '<=', max_x)]:
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                params.append(value)
+        where = ' AND '.join(conditions) or '1'
+        query = f'SELECT DISTINCT f.path FROM segments s JOIN files f ON f.id = s.file_id WHERE {where} ORDER BY f.path'
+        return [row['path'] for row in self.connection.execute(query, params)]
+
+    def file_info(self, path):
+        row = self.connection.execute('SELECT * FROM files WHERE path = ?', (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return None
+        info = dict(row)
+        info['header'] = json.loads(info['header'])
+        info['segments'] = [dict(s) for s in self.connection.execute(
+            'SELECT name, segment, kind, n_points, x_min, x_max, z_min, z_max, max_sag FROM segments '
+            'WHERE file_id = ? ORDER BY rowid', (row['id'],))]
+        return info
+
+    def duplicates(self):
+        '''Groups of paths with identical content hash.'''
+        rows = self.connection.execute(
+            'SELECT sha256, group_concat(path, char(10)) AS paths FROM files GROUP BY sha256 HAVING count(*) > 1')
+        return [row['paths'].split('\n') for row in rows]
+
+    def sql(self, query, params=()):
+        '''Run a read-only SQL query against the files/segments tables.'''
+        return [dict(row) for row in self.connection.execute(query, params)]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Index JFL archives into a SQLite catalog")
+    parser.add_argument('database')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--prune', action='store_true')
+    args = parser.parse_args()
+    with JFLCatalog(args.database) as catalog:
+        result = catalog.update(args.paths, max_workers=args.workers, prune=args.prune)
+    print(f"indexed {result['indexed']}, touched {result['touched']}, pruned {result['pruned']}")
+    for error in result['errors']:
+        print(error)
@@ -0,0 +1,113 @@
+'''
+Decimated chart data and Vega-Lite specs for interactive JFL profile plots.
+
+The browser only needs a few thousand points per segment to draw a profile;
+decimate() keeps, for every bucket of consecutive points, the extreme X and
+Z points in their original order, so the envelope, the end points and any
+spikes survive. chart_columns() can also cut out an X/Z window at full
+resolution for inspecting junctions.
+'''
+import numpy as np
+
+MAX_POINTS = 2000
+PROFILE_NAMES = ['F_XZ', 'B_XZ', 'E_XZ']
+
+
+def decimate(coords, max_points=MAX_POINTS):
+    '''Indices of at most about max_points points of a polyline, keeping per-bucket X/Z extremes.'''
+    n = len(coords)
+    if n <= max_points:
+        return np.arange(n)
+    bucket = int(np.ceil(4 * n / max_points))
+    k = n // bucket
+    blocks = np.asarray(coords, dtype=float)[:k * bucket, :2].reshape(k, bucket, 2)
+    offset = (np.arange(k) * bucket)[:, None]
+    keep = np.concatenate([
+        (blocks[:, :, 0].argmin(axis=1)[:, None] + offset).ravel(),
+        (blocks[:, :, 0].argmax(axis=1)[:, None] + offset).ravel(),
+        (blocks[:, :, 1].argmin(axis=1)[:, None] + offset).ravel(),
+        (blocks[:, :, 1].argmax(axis=1)[:, None] + offset).ravel(),
+        np.arange(k * bucket, n), [0, n - 1],
+    ])
+    return np.unique(keep)
+
+
+def _window(coords, x_range, z_range):
+    '''Indices inside the window, plus one neighbour on each side of every run so lines leave the frame.'''
+    inside = np.ones(len(coords), dtype=bool)
+    if x_range is not None:
+        inside &= (coords[:, 0] >= x_range[0]) & (coords[:, 0] <= x_range[1])
+    if z_range is not None:
+        inside &= (coords[:, 1] >= z_range[0]) & (coords[:, 1] <= z_range[1])
+    grown = inside.copy()
+    grown[1:] |= inside[:-1]
+    grown[:-1] |= inside[1:]
+    return np.flatnonzero(grown)
+
+
+def chart_columns(segments, max_points=MAX_POINTS, x_range=None, z_range=None, names=PROFILE_NAMES):
+    '''
+    Long-form columns (segment, x, z, order) for a Vega-Lite line chart.
+
+    Args:
+    segments (dict): Segments as returned by generate_segments or parse_jfl_file.
+    max_points (int): Point budget per segment after cutting the window.
+    x_range, z_range (tuple): Optional (min, max) window; points inside it are
+        sent at full resolution as long as they fit the budget.
+    '''
+    columns = {'segment': [], 'x': [], 'z': [], 'order': []}
+    for name in names:
+        if name not in segments:
+            continue
+        coords = np.asarray(segments[name], dtype=float)
+        index = _window(coords, x_range, z_range) if (x_range or z_range) else np.arange(len(coords))
+        index = index[decimate(coords[index], max_points)]
+        columns['segment'].append(np.full(len(index), name[0]))
+        columns['x'].append(coords[index, 0])
+        columns['z'].append(coords[index, 1])
+        columns['order'].append(index)
+    return {key: np.concatenate(value) if value else np.empty(0) for key, value in columns.items()}
+
+
+def _equal_domains(columns, x_range=None, z_range=None, margin=0.05):
+    '''X and Z domains with the same span, so the profile keeps its aspect ratio.'''
+    x = columns['x']
+    z = columns['z']
+    x_lo, x_hi = x_range if x_range else (x.min(), x.max()) if len(x) else (0.0, 1.0)
+    z_lo, z_hi = z_range if z_range else (z.min(), z.max()) if len(z) else (0.0, 1.0)
+    span = max(x_hi - x_lo, z_hi - z_lo, 1e-9) * (1 + 2 * margin)
+    x_mid = (x_lo + x_hi) / 2
+    z_mid = (z_lo + z_hi) / 2
+    return [float(x_mid - span / 2), float(x_mid + span / 2)], [float(z_mid - span / 2), float(z_mid + span / 2)]
+
+
+def vega_lite_spec(columns, x_range=None, z_range=None, brush=True, height=500):
+    '''
+    Vega-Lite spec for chart_columns data.
+
+    With brush=True the chart carries an interval selection named "zoom"
+    whose X/Z extents are reported back to the app; otherwise the scales are
+    bound to mouse wheel zoom and drag panning.
+    '''
+    x_domain, z_domain = _equal_domains(columns, x_range, z_range)
+    spec = {
+        'height': height,
+        'mark': {'type': 'line', 'strokeWidth': 1, 'clip': True},
+        'encoding': {
+            'x': {'field': 'x', 'type': 'quantitative', 'title': 'X (mm)', 'scale': {'domain': x_domain}},
+            # Z 轴向下为正，与 jfl_plot 的 invert_yaxis 一致
+            'y': {'field': 'z', 'type': 'quantitative', 'title': 'Z (mm)',
+                  'scale': {'domain': z_domain, 'reverse': True}},
+            'color': {'field': 'segment', 'type': 'nominal', 'title': '段'},
+            'detail': {'field': 'segment', 'type': 'nominal'},
+            'order': {'field': 'order', 'type': 'quantitative'},
+            'tooltip': [{'field': 'segment', 'type': 'nominal'},
+                        {'field': 'x', 'type': 'quantitative', 'format': '.6f'},
+                        {'field': 'z', 'type': 'quantitative', 'format': '.6f'}],
+        },
+    }
+    if brush:
+        spec['params'] = [{'name': 'zoom', 'select': {'type': 'interval', 'encodings': ['x', 'y']}}]
+    else:
+        spec['params'] = [{'name': 'pan', 'select': 'interval', 'bind': 'scales'}]
+    return spec
@@ -0,0 +1,153 @@
+'''
+Export segment arrays to NPY/NPZ, CSV and DXF without going through JFL text.
+
+    export_segments(segments, 'lens.npz')
+    export_segments(segments, 'lens.csv')
+    export_segments(segments, 'lens.dxf')
+
+segments is the dict returned by generate_segments or parse_jfl_file. NPY
+and NPZ files are written straight from the array buffers; CSV and DXF text
+is produced with parse_jfl.format_coords, the same bulk %-formatting used
+for JFL output, with one line format per file type.
+'''
+import os
+import numpy as np
+from parse_jfl import format_coords, open_jfl, parse_jfl_file, is_jfl_path, jfl_stem
+
+CSV_HEADER = 'segment,x,z,w\n'
+CSV_DIGITS = 9
+DXF_VERSION = 'AC1015'
+EXPORT_FORMATS = ('.npy', '.npz', '.csv', '.dxf')
+
+
+def _contiguous(coords):
+    '''float64 C-contiguous view of coords; only copies when the input is not already one.'''
+    return np.ascontiguousarray(coords, dtype=np.float64)
+
+
+def save_npy(segments, output_dir, stem='lens'):
+    '''
+    One .npy file per segment, <stem>_<segment>.npy, written directly from the array buffer.
+
+    Returns the list of written paths. Load them back with np.load(path, mmap_mode='r')
+    to read without copying either.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name, coords in segments.items():
+        path = os.path.join(output_dir, f'{stem}_{name}.npy')
+        np.save(path, _contiguous(coords))
+        paths.append(path)
+    return paths
+
+
+def save_npz(segments, file_path, compressed=False):
+    '''All segments in one .npz archive, keyed by segment name (F_XZ, B_XZ, ...).'''
+    arrays = {name: _contiguous(coords) for name, coords in segments.items()}
+    if compressed:
+        np.savez_compressed(file_path, **arrays)
+    else:
+        np.savez(file_path, **arrays)
+    return file_path
+
+
+def csv_string(segments, digits=CSV_DIGITS):
+    '''
+    Long-form CSV text: segment,x,z,w with one row per point; w is empty for XZ segments.
+
+    The segment name is baked into the line format, so each segment is one
+    format_coords call.
+    '''
+    content = [CSV_HEADER]
+    for name, coords in segments.items():
+        coords = np.asarray(coords)
+        value = f'%.{digits}f'
+        if coords.ndim == 2 and coords.shape[1] == 3:
+            line = f'{name},{value},{value},{value}\n'
+        else:
+            line = f'{name},{value},{value},\n'
+        content.append(format_coords(coords, line))
+    return ''.join(content)
+
+
+def save_csv(segments, file_path, digits=CSV_DIGITS):
+    with open_jfl(file_path, 'w') as file:
+        file.write(csv_string(segments, digits))
+    return file_path
+
+
+def _dxf_pairs(*pairs):
+    return ''.join(f'{code}\n{value}\n' for code, value in pairs)
+
+
+def dxf_string(segments, digits=CSV_DIGITS):
+    '''
+    DXF (R2000) text with one LWPOLYLINE per segment, on a layer named after the segment.
+
+    X is written as the DXF x coordinate and Z as y. W of XZW segments has no
+    place in a 2D polyline and is dropped.
+    '''
+    value = f'%.{digits}f'
+    vertex = f'10\n{value}\n20\n{value}\n'
+    content = [
+        _dxf_pairs((0, 'SECTION'), (2, 'HEADER'), (9, '$ACADVER'), (1, DXF_VERSION),
+                   (9, '$INSUNITS'), (70, 4), (0, 'ENDSEC')),
+        _dxf_pairs((0, 'SECTION'), (2, 'ENTITIES')),
+    ]
+    for handle, (name, coords) in enumerate(segments.items(), start=0x100):
+        coords = np.asarray(coords)
+        content.append(_dxf_pairs((0, 'LWPOLYLINE'), (5, f'{handle:X}'), (100, 'AcDbEntity'), (8, name),
+                                  (100, 'AcDbPolyline'), (90, len(coords)), (70, 0)))
+        content.append(format_coords(coords[:, :2], vertex))
+    content.append(_dxf_pairs((0, 'ENDSEC'), (0, 'EOF')))
+    return ''.join(content)
+
+
+def save_dxf(segments, file_path, digits=CSV_DIGITS):
+    with open_jfl(file_path, 'w') as file:
+        file.write(dxf_string(segments, digits))
+    return file_path
+
+
+def export_segments(segments, file_path, **kwargs):
+    '''
+    Write segments in the format given by the file suffix.
+
+    Args:
+    segments (dict): Segments as returned by generate_segments or parse_jfl_file.
+    file_path (str): .npz, .csv or .dxf file (.csv/.dxf may add .gz/.xz), or a
+        .npy path whose directory and stem are used for one file per segment.
+    '''
+    path = str(file_path)
+    lower = path.lower()
+    for suffix in ('.gz', '.xz'):
+        if lower.endswith(suffix):
+            lower = lower[:-len(suffix)]
+    if lower.endswith('.npy'):
+        return save_npy(segments, os.path.dirname(path) or '.', os.path.basename(path)[:-4], **kwargs)
+    if lower.endswith('.npz'):
+        return save_npz(segments, path, **kwargs)
+    if lower.endswith('.csv'):
+        return save_csv(segments, path, **kwargs)
+    if lower.endswith('.dxf'):
+        return save_dxf(segments, path, **kwargs)
+    raise ValueError(f"unsupported export format: {path} (expected one of {', '.join(EXPORT_FORMATS)})")
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    from lens_generator import STEP, generate_segments
+    parser = argparse.ArgumentParser(description="Export a JFL file or lens JSON to NPY/NPZ, CSV or DXF")
+    parser.add_argument('input', help="a .JFL(.gz/.xz) file or a lens parameter JSON")
+    parser.add_argument('output', nargs='+', help="output files; the suffix picks the format")
+    parser.add_argument('--step', type=float, default=STEP, help="sampling step for lens JSON input")
+    args = parser.parse_args()
+    if is_jfl_path(args.input):
+        segments = parse_jfl_file(args.input)
+    else:
+        with open(args.input, encoding='utf-8') as file:
+            segments = generate_segments(json.load(file), args.step)
+    for output in args.output:
+        result = export_segments(segments, output)
+        print(f"{jfl_stem(os.path.basename(args.input))} -> {result}")
@@ -0,0 +1,402 @@
+import os
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from parse_jfl import parse_jfl_file, is_jfl_path, jfl_stem
+from sag_calculator import standard, offset_circle
+from lens_generator import SURFACE_ID_LIST, SURFACE_TO_SEGMENT, make_design, save_design, generate_segments
+
+# 按复杂度从低到高排列，第一个残差低于容差的面型被采用
+FIT_ORDER = ['Line', 'Standard', 'OffsetCircle', 'EvenAsphere']
+
+C_MIN = 1e-9  # 曲率下限，避免 Radius 为无穷大
+
+
+def profile_from_segment(coords):
+    '''Return the (x, z) columns of a parsed segment, ordered by increasing x.'''
+    x = np.asarray(coords[:, 0], dtype=float)
+    z = np.asarray(coords[:, 1], dtype=float)
+    if len(x) > 1 and x[0] > x[-1]:
+        x, z = x[::-1], z[::-1]
+    return x, z
+
+
+def split_zones(x, z, kappa_tol=0.02, min_points=8):
+    '''
+    Split a monotonic profile into zones at curvature discontinuities.
+
+    Returns a list of (start, stop) index pairs; consecutive zones share no
+    points, and stop is exclusive.
+    '''
+    n = len(x)
+    if n < 2 * min_points:
+        return [(0, n)]
+    dz = np.gradient(z, x)
+    d2z = np.gradient(dz, x)
+    kappa = d2z / (1 + dz**2)**1.5
+    jump = np.abs(np.diff(kappa))
+    threshold = kappa_tol * np.maximum(1.0, np.abs(kappa[:-1]))
+    candidates = np.flatnonzero(jump > threshold)
+    candidates = candidates[(candidates >= min_points) & (candidates < n - min_points)]
+
+    boundaries = [0]
+    if candidates.size:
+        groups = np.split(candidates, np.flatnonzero(np.diff(candidates) > min_points) + 1)
+        for group in groups:
+            end = (group[0] + group[-1] + 1) // 2 + 1
+            if end - boundaries[-1] >= min_points and n - end >= min_points:
+                boundaries.append(end)
+    boundaries.append(n)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _pad_zones(zones, trim):
+    '''Stack ragged zones into (B, N) arrays padded by edge values, with a 0/1 weight mask.'''
+    lengths = []
+    for x, _ in zones:
+        t = trim if len(x) > 4 * trim + 4 else 0
+        lengths.append((t, len(x) - t))
+    n_max = max(stop - start for start, stop in lengths)
+    R = np.empty((len(zones), n_max))
+    Z = np.empty((len(zones), n_max))
+    W = np.zeros((len(zones), n_max))
+    for i, ((x, z), (start, stop)) in enumerate(zip(zones, lengths)):
+        m = stop - start
+        R[i, :m] = x[start:stop]
+        Z[i, :m] = z[start:stop]
+        R[i, m:] = x[stop - 1]
+        Z[i, m:] = z[stop - 1]
+        W[i, :m] = 1.0
+    return R, Z, W
+
+
+def batched_lstsq(A, y, w):
+    '''
+    Solve a stack of weighted linear least squares problems.
+
+    Args:
+    A (ndarray): Design matrices, shape (B, N, P).
+    y (ndarray): Targets, shape (B, N).
+    w (ndarray): Row weights, shape (B, N). Padded rows carry weight 0.
+
+    Returns the coefficients, shape (B, P).
+    '''
+    Aw = A * w[..., None]
+    scale = np.sqrt((Aw**2).sum(axis=1))
+    scale[scale == 0] = 1.0
+    coef = np.linalg.pinv(Aw / scale[:, None, :], rcond=1e-13) @ (y * w)[..., None]
+    return coef[..., 0] / scale
+
+
+def _project(f, R, Z, W, columns):
+    '''Remove the best linear combination of `columns` (offset always included) from Z - f.'''
+    A = np.stack([np.ones_like(R)] + [column(R) for column in columns], axis=-1)
+    target = Z - f
+    coef = batched_lstsq(A, target, W)
+    residual = (target - np.einsum('bnp,bp->bn', A, coef)) * W
+    return residual, coef
+
+
+def _cost(residual):
+    cost = (residual**2).sum(axis=1)
+    return np.where(np.isfinite(cost), cost, np.inf)
+
+
+def gauss_newton(shape, theta0, R, Z, W, columns=(), n_iter=12, steps=None):
+    '''
+    Vectorized damped Gauss-Newton over the nonlinear parameters of a batch of zones.
+
+    The linear parameters (offset and `columns`) are eliminated by projection
+    at every evaluation, so only theta (B, Q) is iterated.
+
+    Returns (theta, linear coefficients, residual sum of squares).
+    '''
+    theta = theta0.copy()
+    B, Q = theta.shape
+    if steps is None:
+        steps = np.full(Q, 1e-7)
+    residual, coef = _project(shape(R, theta), R, Z, W, columns)
+    cost = _cost(residual)
+    lam = np.full(B, 1e-3)
+    for _ in range(n_iter):
+        h = steps * (1 + np.abs(theta))
+        J = np.empty(residual.shape + (Q,))
+        for q in range(Q):
+            theta_h = theta.copy()
+            theta_h[:, q] += h[:, q]
+            residual_h, _ = _project(shape(R, theta_h), R, Z, W, columns)
+            J[..., q] = (residual_h - residual) / h[:, q, None]
+        J = np.nan_to_num(J)
+        JTJ = np.einsum('bnq,bnp->bqp', J, J)
+        JTr = np.einsum('bnq,bn->bq', J, np.nan_to_num(residual))
+        damping = lam[:, None, None] * (np.eye(Q) * (np.diagonal(JTJ, axis1=1, axis2=2)[:, None, :] + 1e-30))
+        delta = -np.linalg.solve(JTJ + damping, JTr[..., None])[..., 0]
+        theta_new = theta + delta
+        residual_new, coef_new = _project(shape(R, theta_new), R, Z, W, columns)
+        cost_new = _cost(residual_new)
+        better = cost_new < cost
+        theta = np.where(better[:, None], theta_new, theta)
+        residual = np.where(better[:, None], residual_new, residual)
+        coef = np.where(better[:, None], coef_new, coef)
+        cost = np.where(better, cost_new, cost)
+        lam = np.where(better, lam / 3, lam * 4)
+    return theta, coef, cost
+
+
+def _standard_shape(R, theta):
+    params = {'Radius': 1 / _safe_c(theta[:, 0:1]), 'Conic': theta[:, 1:2]}
+    return standard(R, params, 0.0)
+
+
+def _offset_circle_shape(R, theta):
+    params = {'Radius': 1 / _safe_c(theta[:, 0:1]), 'Conic': 0.0, 'Center': theta[:, 1:2]}
+    return offset_circle(R, params, 0.0)
+
+
+def _safe_c(c):
+    return np.where(np.abs(c) < C_MIN, np.where(c < 0, -C_MIN, C_MIN), c)
+
+
+def _asphere_columns(asphere_terms):
+    return [lambda R, p=i + 1: R**(2 * p) for i in range(asphere_terms)]
+
+
+def fit_zones(zones, asphere_terms=3, n_iter=12, trim=2):
+    '''
+    Fit every sag_calculator surface type to a batch of zones at once.
+
+    Args:
+    zones (list): List of (x, z) arrays, x increasing.
+    asphere_terms (int): Number of even asphere coefficients to fit.
+    n_iter (int): Gauss-Newton iterations for the nonlinear parameters.
+    trim (int): Points dropped at each zone end so junctions do not bias the fit.
+
+    Returns a dict mapping surface type to a list (one per zone) of
+    (params, rms) where params excludes SemiDiameter.
+    '''
+    R, Z, W = _pad_zones(zones, trim)
+    counts = W.sum(axis=1)
+    fits = {}
+
+    # Line: z = a + b r
+    A = np.stack([np.ones_like(R), R], axis=-1)
+    coef = batched_lstsq(A, Z, W)
+    residual = (Z - np.einsum('bnp,bp->bn', A, coef)) * W
+    fits['Line'] = [({'_a': a, '_b': b}, np.sqrt(cost / n))
+                    for (a, b), cost, n in zip(coef, _cost(residual), counts)]
+
+    # Standard: 从抛物线 z = a + b r^2 估计初始曲率
+    A = np.stack([np.ones_like(R), R**2], axis=-1)
+    c0 = 2 * batched_lstsq(A, Z, W)[:, 1]
+    theta0 = np.stack([_safe_c(c0), np.zeros_like(c0)], axis=-1)
+    theta, _, cost = gauss_newton(_standard_shape, theta0, R, Z, W, n_iter=n_iter,
+                                  steps=np.array([1e-7, 1e-6]))
+    fits['Standard'] = [({'Radius': 1 / _safe_c(c), 'Conic': k}, np.sqrt(e / n))
+                        for (c, k), e, n in zip(theta, cost, counts)]
+    standard_theta = theta
+
+    # OffsetCircle: Kasa 代数圆拟合 x^2 + z^2 = 2 xc x + 2 zc z + C 作为初值
+    A = np.stack([2 * R, 2 * Z, np.ones_like(R)], axis=-1)
+    xc, zc, C = batched_lstsq(A, R**2 + Z**2, W).T
+    radius = np.sqrt(np.maximum(C + xc**2 + zc**2, 0.0))
+    z_mean = (Z * W).sum(axis=1) / counts
+    radius = np.where(zc > z_mean, radius, -radius)
+    theta0 = np.stack([_safe_c(1 / np.where(radius == 0, 1 / C_MIN, radius)), xc], axis=-1)
+    theta, _, cost = gauss_newton(_offset_circle_shape, theta0, R, Z, W, n_iter=n_iter)
+    fits['OffsetCircle'] = [({'Radius': 1 / _safe_c(c), 'Conic': 0.0, 'Center': r0}, np.sqrt(e / n))
+                            for (c, r0), e, n in zip(theta, cost, counts)]
+
+    # EvenAsphere: 变量投影，非球面系数为线性部分
+    columns = _asphere_columns(asphere_terms)
+    theta, coef, cost = gauss_newton(_standard_shape, standard_theta, R, Z, W, columns=columns,
+                                     n_iter=n_iter, steps=np.array([1e-7, 1e-6]))
+    fits['EvenAsphere'] = [({'Radius': 1 / _safe_c(c), 'Conic': k, 'AsphereTerm': asphere_terms,
+                             'AsphereParams': list(a[1:])}, np.sqrt(e / n))
+                           for (c, k), a, e, n in zip(theta, coef, cost, counts)]
+    return fits
+
+
+def _to_float(params):
+    return {key: (int(value) if key == 'AsphereTerm' else
+                  [float(v) for v in value] if isinstance(value, list) else float(value))
+            for key, value in params.items()}
+
+
+def _select_segments(zones, fits, tol, semidiameters=None):
+    '''
+    Pick the simplest acceptable surface type per zone and build the JSON segments.
+
+    semidiameters may override the SemiDiameter of individual zones (None keeps
+    the last X of the zone); a Line's EndZ is evaluated at the final value.
+    '''
+    segments = []
+    rms_list = []
+    for i, (x, z) in enumerate(zones):
+        candidates = [(surface_type, *fits[surface_type][i]) for surface_type in FIT_ORDER]
+        accepted = [c for c in candidates if c[2] <= tol]
+        surface_type, params, rms = accepted[0] if accepted else min(candidates, key=lambda c: c[2])
+        params = dict(params)
+        semidiameter = float(x[-1]) if semidiameters is None or semidiameters[i] is None else semidiameters[i]
+        if surface_type == 'Line':
+            params = {'EndZ': params['_a'] + params['_b'] * semidiameter}
+        params['SemiDiameter'] = semidiameter
+        segments.append({'type': surface_type, 'params': _to_float(params)})
+        rms_list.append(float(rms))
+    return segments, rms_list
+
+
+def regeneration_error(design, segments, step):
+    '''
+    Max and rms |dz| per surface between generate_segments(design, step) and the given segments.
+
+    The regenerated profile is interpolated at the X of the given points; a
+    NaN in the regenerated profile counts as an infinite deviation.
+    '''
+    with np.errstate(invalid='ignore'):
+        regenerated = generate_segments(design, step)
+    errors = {}
+    for surface_id in SURFACE_ID_LIST:
+        name = SURFACE_TO_SEGMENT[surface_id] + '_XZ'
+        if name not in segments or name not in regenerated:
+            continue
+        x, z = profile_from_segment(segments[name])
+        xr, zr = profile_from_segment(regenerated[name])
+        if len(xr) == len(x) and np.array_equal(xr, x):
+            dz = zr - z
+        elif len(xr) > 1 and np.all(np.diff(xr) > 0):
+            dz = np.interp(x, xr, zr) - z
+        else:
+            dz = np.full(len(x), np.inf)
+        dz = np.where(np.isfinite(dz), np.abs(dz), np.inf)
+        errors[surface_id] = (float(dz.max()), float(np.sqrt(np.mean(dz**2))))
+    return errors
+
+
+def fit_jfl_segments(segments, tol=1e-5, asphere_terms=3, kappa_tol=0.02, min_points=8,
+                     n_iter=12, return_report=False):
+    '''
+    Reverse-engineer a lens JSON from parsed JFL segments.
+
+    F_XZ, B_XZ and E_XZ are split into zones and all zones of the file are
+    fitted in one batch. The result follows the schema exported by
+    streamlit_app.py and can be regenerated with lens_generator.generate_segments.
+
+    Args:
+    segments (dict): Output of parse_jfl_file.
+    tol (float): RMS sag error (mm) below which a simpler surface type is preferred.
+    return_report (bool): Also return a dict with the per-zone fit rms ('zone_rms'),
+        the max and rms deviation of the regenerated design from the input
+        ('max_deviation', 'rms_deviation') and 'converged', which is False when a
+        zone or a regenerated surface misses tol. A RuntimeWarning is emitted then.
+    '''
+    profiles = {}
+    for surface_id in SURFACE_ID_LIST:
+        name = SURFACE_TO_SEGMENT[surface_id] + '_XZ'
+        if name in segments:
+            profiles[surface_id] = profile_from_segment(segments[name])
+    if '前表面' not in profiles or '后表面' not in profiles:
+        raise ValueError("F_XZ and B_XZ segments are required")
+
+    all_x = np.concatenate([x for x, _ in profiles.values()])
+    # 生成网格为 np.arange(start, lens_semidiameter, step)，最后一点比半口径小一个步长
+    step = round(float(np.median(np.abs(np.diff(profiles['前表面'][0])))), 9)
+    lens_semidiameter = round(float(all_x.max()) + step, 6)
+
+    zones = []
+    owners = []
+    for surface_id, (x, z) in profiles.items():
+        if np.any(np.diff(x) <= 0):
+            warnings.warn(f"{surface_id} is not monotonic in X, approximated by a single Line")
+            continue
+        for start, stop in split_zones(x, z, kappa_tol=kappa_tol, min_points=min_points):
+            zones.append((x[start:stop], z[start:stop]))
+            owners.append(surface_id)
+    fits = fit_zones(zones, asphere_terms=asphere_terms, n_iter=n_iter)
+    # 每个面最后一个弧段覆盖到加工半口径，保证重新生成时网格点都被赋值；直线的 EndZ 要在该处求值
+    last = {owner: i for i, owner in enumerate(owners)}
+    semidiameters = [lens_semidiameter if last[owner] == i else None for i, owner in enumerate(owners)]
+    fitted, rms_list = _select_segments(zones, fits, tol, semidiameters)
+
+    surfaces = {}
+    rms = {}
+    for surface_id, (x, z) in profiles.items():
+        surface_segments = [s for s, owner in zip(fitted, owners) if owner == surface_id]
+        rms[surface_id] = [e for e, owner in zip(rms_list, owners) if owner == surface_id]
+        if not surface_segments:
+            # 首末点连线外推到加工半口径
+            slope = (z[-1] - z[0]) / (x[-1] - x[0]) if x[-1] != x[0] else 0.0
+            surface_segments = [{'type': 'Line', 'params': {
+                'SemiDiameter': lens_semidiameter, 'EndZ': float(z[0] + slope * (lens_semidiameter - x[0]))}}]
+        surfaces[surface_id] = (float(x[0]), float(z[0]), surface_segments)
+
+    lens_thickness = surfaces['后表面'][1] - surfaces['前表面'][1]
+    design = make_design(lens_thickness, 2 * lens_semidiameter, surfaces)
+
+    # 各区单独拟合的残差不代表重新生成的结果：弧段首尾相接，误差会沿面累积
+    errors = regeneration_error(design, segments, step)
+    converged = (all(e <= tol for values in rms.values() for e in values)
+                 and all(rms_error <= tol for _, rms_error in errors.values()))
+    if not converged:
+        worst = max(errors, key=lambda surface_id: errors[surface_id][0])
+        warnings.warn(f"fit did not reach tol {tol:g} mm: regenerated {worst} deviates by up to "
+                      f"{errors[worst][0]:.3g} mm", RuntimeWarning)
+    if return_report:
+        return design, {'zone_rms': rms, 'converged': converged,
+                        'max_deviation': {surface_id: e[0] for surface_id, e in errors.items()},
+                        'rms_deviation': {surface_id: e[1] for surface_id, e in errors.items()}}
+    return design
+
+
+def fit_jfl_file(file_path, output_path=None, **kwargs):
+    '''Fit one JFL file and optionally save the lens JSON. Returns (design, report).'''
+    design, report = fit_jfl_segments(parse_jfl_file(file_path), return_report=True, **kwargs)
+    if output_path is not None:
+        save_design(design, output_path)
+    return design, report
+
+
+def _fit_file_task(args):
+    file_path, output_path, kwargs = args
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            _, report = fit_jfl_file(file_path, output_path, **kwargs)
+        worst = max(report['max_deviation'].values(), default=0.0)
+        return file_path, output_path, worst, report['converged'], None
+    except Exception as e:
+        return file_path, output_path, None, False, str(e)
+
+
+def fit_jfl_directory(input_dir, output_dir=None, max_workers=None, **kwargs):
+    '''
+    Fit every .JFL (or .JFL.gz/.JFL.xz) file of a directory in parallel worker processes.
+
+    Each lens JSON is written next to its JFL file, or into output_dir.
+    Returns a list of (jfl path, json path, worst regenerated deviation, converged, error message).
+    '''
+    output_dir = input_dir if output_dir is None else output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = []
+    for file_name in sorted(os.listdir(input_dir)):
+        if is_jfl_path(file_name):
+            json_name = jfl_stem(file_name) + '.json'
+            tasks.append((os.path.join(input_dir, file_name), os.path.join(output_dir, json_name), kwargs))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_fit_file_task, tasks, chunksize=4))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Reverse-engineer lens JSON files from legacy JFL files")
+    parser.add_argument('input_dir')
+    parser.add_argument('--output-dir', default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--tol', type=float, default=1e-5)
+    args = parser.parse_args()
+    for file_path, json_path, worst, converged, error in fit_jfl_directory(
+            args.input_dir, args.output_dir, max_workers=args.workers, tol=args.tol):
+        if error:
+            print(f"{file_path}: failed ({error})")
+        else:
+            note = '' if converged else ', NOT CONVERGED'
+            print(f"{file_path} -> {json_path} (max deviation {worst:.2e} mm{note})")
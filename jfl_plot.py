@@ -0,0 +1,80 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from instrumentation import instrumented, segment_points
+
+
+@instrumented('plot_jfl_segments_generic', measure=lambda args, kwargs, result: (segment_points(args[0]), 0))
+def plot_jfl_segments_generic(segments):
+    plt.figure()
+
+    # Colors for different segments, randomly chosen for each segment
+    colors = ['blue', 'green', 'red', 'purple', 'orange', 'pink', 'brown', 'gray', 'olive', 'cyan']
+
+    for i, (segment_label, segment_data) in enumerate(segments.items()):
+        if len(segment_data) > 0:  # Plot only if there is data in the segment
+            color = colors[i % len(colors)]  # Cycle through colors
+            plt.plot(segment_data[:, 0], segment_data[:, 1], c=color, label=f'{segment_label} Segment')
+
+    # Adding labels and title
+    plt.xlabel('X Coordinate')
+    plt.ylabel('Z Coordinate (Inverted)')
+    plt.title('JFL File Segments Visualization')
+    plt.legend()
+    # Inverting the y-axis
+    plt.gca().invert_yaxis()
+    # Showing the plot
+    plt.show()
+
+@instrumented('plot_zoom_jfl_segments', measure=lambda args, kwargs, result: (segment_points(args[0]), 0))
+def plot_zoom_jfl_segments(segments,segment_name,x_min,x_max):
+    fig=plt.figure()
+    segment_data=segments[segment_name]
+    index=np.where(np.logical_and(segment_data[:,0]>=x_min,segment_data[:,0]<=x_max))[0]
+    plt.plot(segment_data[index, 0], segment_data[index, 1], label=f'{segment_name} Segment')
+    plt.xlim(x_min,x_max)
+    # plt.ylim(-0.5,0.5)
+
+    # Adding labels and title
+    plt.xlabel('X Coordinate')
+    plt.ylabel('Z Coordinate (Inverted)')
+    plt.title(f'Segment zoom in {segment_name}')
+    plt.legend()
+    # Inverting the y-axis
+    plt.gca().invert_yaxis()
+    # Showing the plot
+    # plt.show()
+    return fig 
+
+
+@instrumented('plot_jfl_segments_with_arrows', measure=lambda args, kwargs, result: (segment_points(args[0]), 0))
+def plot_jfl_segments_with_arrows(segments, n_arrows=10):
+    fig=plt.figure()
+
+    colors = ['blue', 'green', 'red', 'purple', 'orange', 'pink', 'brown', 'gray', 'olive', 'cyan']
+
+    for i, (segment_label, segment_data) in enumerate(segments.items()):
+        if len(segment_data) > 0:
+            color = colors[i % len(colors)]
+            plt.plot(segment_data[:, 0], segment_data[:, 1], c=color, label=f'{segment_label} Segment')
+
+            # Adding arrows to the plot
+            num_points = len(segment_data)
+            if num_points > 1:
+                for j in range(1, n_arrows + 1):
+                    idx = j * num_points // (n_arrows + 1)  # Calculating the index for the arrow
+                    start_point = segment_data[idx - 1]
+                    end_point = segment_data[idx]
+                    plt.annotate('', xy=(end_point[0], end_point[1]), xytext=(start_point[0], start_point[1]),
+                                 arrowprops=dict(arrowstyle="->", color=color))
+
+    plt.xlabel('X Coordinate')
+    plt.ylabel('Z Coordinate')
+    plt.title('JFL File Segments Visualization with Direction Arrows')
+    plt.legend()
+
+    # Inverting the y-axis
+    plt.gca().invert_yaxis()
+
+    # plt.show()
+
+    return fig
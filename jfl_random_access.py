@@ -0,0 +1,224 @@
+'''
+Random access to the coordinate lines of large uncompressed JFL files.
+
+    with JFLReader('lens.JFL') as reader:
+        print(reader.index)                       # {'F_XZ': (offset, width, n_points, n_columns), ...}
+        points = reader.get_points('F_XZ', 100_000, 102_000)
+        i = reader.index_of_x('F_XZ', 2.5)
+
+build_jfl_string writes every value as %012.9f, so all coordinate lines of
+one block have the same byte length. Opening a file reads the first line of
+each block and finds where the block ends with an exponential and binary
+search over line starts (a probe is valid if it starts with "X " and ends
+in a newline exactly one line width later), so the index costs a few dozen
+small reads per block however large the file is. get_points then reads
+just the requested byte range and decodes the fixed-width digit columns
+with numpy.
+
+Compressed .JFL.gz/.JFL.xz files cannot be seeked by byte offset and are
+rejected; use parse_jfl_file for them.
+'''
+import os
+import threading
+import numpy as np
+from parse_jfl import parse_line_to_coords
+
+_DIGITS = np.array([10**k for k in range(18)], dtype=np.int64)
+
+
+class JFLReader:
+    '''
+    Index of the coordinate blocks of an uncompressed JFL file.
+
+    Args:
+    file_path (str): .JFL file written with fixed-width coordinates.
+    verify (bool): Read every block once and check that each line ends at its
+        fixed width; only needed for files of unknown origin.
+    '''
+    def __init__(self, file_path, verify=False):
+        if str(file_path).lower().endswith(('.gz', '.xz')):
+            raise ValueError(f"random access needs an uncompressed .JFL file: {file_path}")
+        self.file_path = file_path
+        self.file = open(file_path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.lock = threading.Lock()
+        self.index = {}
+        self._layouts = {}
+        try:
+            self._build_index()
+            if verify:
+                self.verify()
+        except Exception:
+            self.file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def _read(self, offset, n_bytes):
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(n_bytes)
+
+    def _is_line(self, offset, width):
+        '''True if a coordinate line of exactly this width starts at offset.'''
+        if offset + width > self.size:
+            return False
+        head = self._read(offset, 2)
+        return head == b'X ' and self._read(offset + width - 1, 1) == b'\n'
+
+    def _block_length(self, offset, width):
+        '''Number of consecutive fixed-width coordinate lines starting at offset.'''
+        good, bad = 1, 2
+        while self._is_line(offset + (bad - 1) * width, width):
+            good, bad = bad, bad * 2
+        # good 行均有效，bad 行起无效，二分找边界
+        while bad - good > 1:
+            middle = (good + bad) // 2
+            if self._is_line(offset + (middle - 1) * width, width):
+                good = middle
+            else:
+                bad = middle
+        return good
+
+    def _build_index(self):
+        offset = 0
+        segment = None
+        kind = '_XZ'
+        while offset < self.size:
+            line = self._read(offset, 256).split(b'\n', 1)[0] + b'\n'
+            text = line.decode('ascii', errors='replace').strip()
+            if text.startswith('X ') and segment is not None:
+                coords = parse_line_to_coords(text)
+                width = len(line)
+                n_points = self._block_length(offset, width)
+                name = segment + kind
+                if name in self.index:
+                    raise ValueError(f"{self.file_path}: block {name} appears twice")
+                self.index[name] = (offset, width, n_points, len(coords))
+                self._layouts[name] = _line_layout(line)
+                offset += n_points * width
+                continue
+            if text.startswith('*'):
+                kind = '_XZW'
+            elif text.isalpha():
+                segment, kind = text, '_XZ'
+            offset += len(line)
+
+    def verify(self):
+        '''Check that every line of every block ends at its fixed width; raises ValueError otherwise.'''
+        for name, (offset, width, n_points, _) in self.index.items():
+            data = np.frombuffer(self._read(offset, n_points * width), dtype=np.uint8).reshape(n_points, width)
+            if not (np.all(data[:, -1] == ord('\n')) and np.all(data[:, 0] == ord('X'))):
+                raise ValueError(f"{self.file_path}: block {name} is not fixed-width")
+
+    def n_points(self, segment):
+        return self.index[segment][2]
+
+    def get_points(self, segment, start=0, stop=None):
+        '''
+        Points start:stop of a block (F_XZ, B_XZW, ...) as an (n, 2) or (n, 3) array.
+
+        Indices follow Python slicing, including negative values. Values are
+        identical to parse_jfl_file.
+        '''
+        offset, width, n_points, n_columns = self.index[segment]
+        start, stop, _ = slice(start, stop).indices(n_points)
+        if stop <= start:
+            return np.empty((0, n_columns))
+        data = self._read(offset + start * width, (stop - start) * width)
+        return _decode_lines(data, width, self._layouts[segment])
+
+    def index_of_x(self, segment, x):
+        '''
+        First index whose X is at or past x, in the order of the block (which may
+        run towards decreasing X, like F_XZ). The block must be monotonic in X.
+        '''
+        n_points = self.n_points(segment)
+        first = self.get_points(segment, 0, 1)[0, 0]
+        last = self.get_points(segment, -1)[0, 0]
+        sign = 1.0 if last >= first else -1.0
+        lo, hi = 0, n_points
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if sign * self.get_points(segment, middle, middle + 1)[0, 0] < sign * x:
+                lo = middle + 1
+            else:
+                hi = middle
+        return lo
+
+    def get_x_range(self, segment, x_min, x_max):
+        '''Points of a monotonic block with x_min <= X <= x_max.'''
+        a, b = self.index_of_x(segment, x_min), self.index_of_x(segment, x_max)
+        start, stop = min(a, b), max(a, b)
+        points = self.get_points(segment, max(start - 1, 0), stop + 1)
+        return points[(points[:, 0] >= x_min) & (points[:, 0] <= x_max)]
+
+
+def _line_layout(line):
+    '''
+    Column layout of one coordinate line: per value (start, stop, decimal point
+    position), or None if the fields are not plain [-]digits.digits.
+    '''
+    text = line.decode('ascii')
+    fields = []
+    position = 0
+    for label in ('X ', 'Z ', 'W '):
+        start = text.find(label, position)
+        if start < 0:
+            break
+        start += 2
+        stop = start
+        while stop < len(text) and text[stop] not in ' \r\n':
+            stop += 1
+        field = text[start:stop]
+        body = field[1:] if field.startswith('-') else field
+        if body.count('.') != 1 or not body.replace('.', '').isdigit() or len(body) > 16:
+            return None
+        fields.append((start, stop, start + field.index('.')))
+        position = stop
+    return fields
+
+
+def _decode_lines(data, width, layout):
+    '''Decode fixed-width coordinate lines; values are exactly float(text).'''
+    n = len(data) // width
+    if layout is None:
+        return np.array([parse_line_to_coords(line) for line in data.decode('ascii').splitlines()])
+    lines = np.frombuffer(data, dtype=np.uint8).reshape(n, width)
+    columns = []
+    for start, stop, dot in layout:
+        digits = np.delete(lines[:, start:stop], dot - start, axis=1).astype(np.int64) - ord('0')
+        negative = digits[:, 0] == ord('-') - ord('0')
+        digits[negative, 0] = 0
+        if digits.min(initial=0) < 0 or digits.max(initial=0) > 9:
+            return np.array([parse_line_to_coords(line) for line in data.decode('ascii').splitlines()])
+        # 整数部分与小数部分合成一个整数，再除以 10**小数位数，与 float(text) 的舍入一致
+        scale = stop - dot - 1
+        value = digits @ _DIGITS[digits.shape[1] - 1::-1] / float(10**scale)
+        columns.append(np.where(negative, -value, value))
+    return np.column_stack(columns)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Index a JFL file and print a slice of one block")
+    parser.add_argument('file_path')
+    parser.add_argument('segment', nargs='?', help="block name, e.g. F_XZ; without it the index is printed")
+    parser.add_argument('start', nargs='?', type=int, default=0)
+    parser.add_argument('stop', nargs='?', type=int, default=None)
+    parser.add_argument('--verify', action='store_true')
+    args = parser.parse_args()
+    with JFLReader(args.file_path, verify=args.verify) as reader:
+        if args.segment is None:
+            for name, (offset, width, n_points, n_columns) in reader.index.items():
+                print(f"{name:8s} offset {offset:12d} width {width:3d} points {n_points:10d} columns {n_columns}")
+        else:
+            for point in reader.get_points(args.segment, args.start, args.stop):
+                print(' '.join(f'{value:.9f}' for value in point))
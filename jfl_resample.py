@@ -0,0 +1,137 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from parse_jfl import parse_jfl_file, build_jfl_string, open_jfl, is_jfl_path
+from jfl_catalog import read_jfl_header
+
+
+def arc_length(points):
+    '''Cumulative arc length of a polyline in the X/Z plane, starting at 0.'''
+    points = np.asarray(points, dtype=float)
+    return np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(points[:, :2], axis=0).T))])
+
+
+def find_corners(points, corner_angle=10.0):
+    '''Indices of interior points where the polyline turns by more than corner_angle degrees.'''
+    d = np.diff(np.asarray(points, dtype=float)[:, :2], axis=0)
+    if len(d) < 2:
+        return np.empty(0, dtype=np.int64)
+    turn = np.degrees(np.abs(np.arctan2(d[:-1, 0] * d[1:, 1] - d[:-1, 1] * d[1:, 0],
+                                        np.einsum('ij,ij->i', d[:-1], d[1:]))))
+    return np.flatnonzero(turn > corner_angle) + 1
+
+
+def _split_counts(lengths, n_intervals):
+    '''Distribute n_intervals over pieces proportionally to their length, at least one each (largest remainder).'''
+    share = lengths / lengths.sum() * n_intervals
+    counts = np.maximum(np.floor(share).astype(np.int64), 1)
+    remainder = n_intervals - counts.sum()
+    if remainder > 0:
+        counts[np.argsort(counts - share)[:remainder]] += 1
+    # 短段被强制取 1 导致超出时，从超配最多的段扣回
+    while remainder < 0:
+        excess = np.where(counts > 1, counts - share, -np.inf)
+        counts[np.argmax(excess)] -= 1
+        remainder += 1
+    return counts
+
+
+def resample_segment(coords, step=None, n_points=None, corner_angle=10.0):
+    '''
+    Resample one segment uniformly in arc length.
+
+    The polyline is parameterised by cumulative arc length, so segments that
+    are not monotonic in X (the edge E) are handled like any other. The end
+    points and corners are kept exactly and every piece between them is
+    resampled on its own; W values of XZW segments are interpolated as well.
+
+    Args:
+    coords (np.ndarray): (N, 2) XZ or (N, 3) XZW points.
+    step (float): Target arc-length step; every piece uses the largest step not above it.
+    n_points (int): Target number of points instead of step.
+    corner_angle (float): Turn in degrees above which a point is kept as a corner.
+    '''
+    if (step is None) == (n_points is None):
+        raise ValueError("give exactly one of step or n_points")
+    coords = np.asarray(coords, dtype=float)
+    # 去掉重复点，保证弧长严格递增
+    distinct = np.concatenate([[True], np.any(np.diff(coords[:, :2], axis=0) != 0, axis=1)])
+    coords = coords[distinct]
+    if len(coords) < 2:
+        return coords.copy()
+    s = arc_length(coords)
+
+    breaks = np.concatenate([[0], find_corners(coords, corner_angle), [len(coords) - 1]])
+    lengths = np.diff(s[breaks])
+    if step is not None:
+        counts = np.maximum(np.ceil(lengths / step - 1e-9).astype(np.int64), 1)
+    else:
+        if n_points < len(breaks):
+            raise ValueError(f"n_points must be at least the {len(breaks)} end and corner points")
+        counts = _split_counts(lengths, n_points - 1)
+
+    piece = np.repeat(np.arange(len(counts)), counts)
+    j = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    targets = np.append(s[breaks[piece]] + lengths[piece] * j / counts[piece], s[-1])
+    result = np.column_stack([np.interp(targets, s, coords[:, k]) for k in range(coords.shape[1])])
+    # 端点和角点直接取原值，避免插值舍入
+    anchors = np.append(np.cumsum(counts) - counts, counts.sum())
+    result[anchors] = coords[breaks]
+    return result
+
+
+def resample_segments(segments, step=None, n_points=None, corner_angle=10.0):
+    '''Resample every segment of a parse_jfl_file dict; n_points applies per segment.'''
+    return {name: resample_segment(coords, step, n_points, corner_angle) for name, coords in segments.items()}
+
+
+def resample_jfl_file(file_path, output_path, step=None, n_points=None, corner_angle=10.0):
+    '''Resample one JFL file, keeping its header. Returns the point count per segment.'''
+    segments = resample_segments(parse_jfl_file(file_path), step, n_points, corner_angle)
+    header = ''.join(line + '\n' for line in read_jfl_header(file_path))
+    with open_jfl(output_path, 'w') as file:
+        file.write(build_jfl_string(segments, header=header))
+    return {name: len(coords) for name, coords in segments.items()}
+
+
+def _resample_file_task(args):
+    file_path, output_path, kwargs = args
+    try:
+        return file_path, output_path, resample_jfl_file(file_path, output_path, **kwargs), None
+    except Exception as e:
+        return file_path, output_path, None, str(e)
+
+
+def resample_jfl_directory(input_dir, output_dir, max_workers=None, **kwargs):
+    '''
+    Resample every .JFL (or .JFL.gz/.JFL.xz) file of a directory into output_dir in parallel.
+
+    Returns a list of (input path, output path, point counts, error message).
+    '''
+    if os.path.abspath(input_dir) == os.path.abspath(output_dir):
+        raise ValueError("output_dir must differ from input_dir")
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(os.path.join(input_dir, file_name), os.path.join(output_dir, file_name), kwargs)
+             for file_name in sorted(os.listdir(input_dir)) if is_jfl_path(file_name)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_resample_file_task, tasks, chunksize=4))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Resample JFL archives to a new point density")
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--step', type=float, help="arc-length step in mm")
+    group.add_argument('--points', type=int, help="number of points per segment")
+    parser.add_argument('--corner-angle', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    for file_path, output_path, counts, error in resample_jfl_directory(
+            args.input_dir, args.output_dir, max_workers=args.workers, step=args.step, n_points=args.points,
+            corner_angle=args.corner_angle):
+        if error:
+            print(f"{file_path}: failed ({error})")
+        else:
+            print(f"{file_path} -> {output_path} {counts}")
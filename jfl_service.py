@@ -0,0 +1,225 @@
+'''
+Local JFL generation service.
+
+    python jfl_service.py --port 8765 --workers 4
+
+POST /jfl with a lens JSON (the schema exported by streamlit_app.py) as the
+body returns the JFL text. Optional query parameter: ?step=0.0025.
+Requests with a non-positive step, a design missing required keys or a grid
+of more than max_points points in total are rejected with 400.
+GET /stats returns cache and coalescing counters, GET /health returns ok.
+
+Identical in-flight requests share one computation, finished results are
+cached by design hash, and generation runs in a process pool.
+'''
+import argparse
+import asyncio
+import json
+import math
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, parse_qs
+
+from lens_generator import STEP, SURFACE_ID_LIST, design_hash, build_jfl_bytes
+
+MAX_BODY_BYTES = 1 << 20
+MAX_POINTS = 20_000_000  # 三个面合计的网格点数上限，约 600 MB 的 JFL 文本
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+def validate_request(design, step, max_points=MAX_POINTS):
+    '''Raise ValueError if the design or step cannot be generated, or the grid would exceed max_points.'''
+    if not math.isfinite(step) or step <= 0:
+        raise ValueError(f"step must be a positive number, got {step}")
+    if not isinstance(design, dict):
+        raise ValueError("design must be a JSON object")
+    try:
+        semidiameter = float(design['lens']['lens_semidiameter'])
+        starts = [float(design[surface_id]['start_point_x']) for surface_id in SURFACE_ID_LIST]
+        for surface_id in SURFACE_ID_LIST:
+            for segment in design[surface_id]['segments']:
+                segment['type'], segment['params']['SemiDiameter']
+    except (KeyError, TypeError, IndexError) as e:
+        raise ValueError(f"design is missing or has an invalid {e}") from None
+    points = sum(max(math.ceil((semidiameter - start) / step), 0) for start in starts)
+    if points > max_points:
+        raise ValueError(f"step {step} gives {points} points, more than the limit of {max_points}")
+
+
+class JFLService:
+    '''
+    Request coalescing and LRU result cache in front of a process pool.
+
+    Args:
+    max_workers (int): Worker processes for generation.
+    cache_bytes (int): Upper bound on the total size of cached JFL outputs.
+    store (JFLStore): Optional on-disk store consulted before generating, and filled afterwards.
+    max_points (int): Largest total grid size accepted per request.
+    '''
+    def __init__(self, max_workers=None, cache_bytes=256 << 20, store=None, max_points=MAX_POINTS):
+        self.max_workers = max_workers
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        self.store = store
+        self.max_points = max_points
+        self.cache = OrderedDict()
+        self.cache_bytes = cache_bytes
+        self.cached_bytes = 0
+        self.inflight = {}
+        self.counters = {'requests': 0, 'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0, 'pool_restarts': 0}
+
+    async def get_jfl(self, design, step=STEP):
+        self.counters['requests'] += 1
+        key = design_hash(design, step)
+        if key in self.cache:
+            self.counters['hits'] += 1
+            self.cache.move_to_end(key)
+            return key, self.cache[key]
+        if key in self.inflight:
+            self.counters['coalesced'] += 1
+            return key, await asyncio.shield(self.inflight[key])
+
+        self.counters['misses'] += 1
+        loop = asyncio.get_running_loop()
+        if self.store is not None:
+            future = loop.run_in_executor(None, self._from_store, design, step)
+        else:
+            future = loop.run_in_executor(self.executor, build_jfl_bytes, design, step)
+        self.inflight[key] = future
+        try:
+            data = await asyncio.shield(future)
+        finally:
+            del self.inflight[key]
+        self._store(key, data)
+        return key, data
+
+    def _from_store(self, design, step):
+        '''Runs in a thread: read from the disk store, generating in the process pool on a miss.'''
+        build = lambda design, step: self.executor.submit(build_jfl_bytes, design, step).result()
+        return self.store.get_bytes(design, step, build)
+
+    def _store(self, key, data):
+        if len(data) > self.cache_bytes:
+            return
+        self.cache[key] = data
+        self.cached_bytes += len(data)
+        while self.cached_bytes > self.cache_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= len(evicted)
+
+    def stats(self):
+        stats = dict(self.counters, cached_entries=len(self.cache), cached_bytes=self.cached_bytes,
+                     inflight=len(self.inflight))
+        if self.store is not None:
+            stats['store'] = self.store.stats()
+        return stats
+
+    def close(self):
+        self.executor.shutdown()
+
+    def _restart_executor(self, broken):
+        '''Replace a broken process pool (e.g. a worker killed for memory); later requests use the new one.'''
+        if self.executor is broken:
+            broken.shutdown(wait=False)
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self.counters['pool_restarts'] += 1
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, b'request body too large', close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                status, content_type, payload, extra = await self._dispatch(method, target, body)
+                await self._respond(writer, status, payload, content_type, extra, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, 'text/plain', b'ok', {}
+        if url.path == '/stats':
+            return 200, 'application/json', json.dumps(self.stats()).encode(), {}
+        if url.path != '/jfl':
+            return 404, 'text/plain', b'not found', {}
+        if method != 'POST':
+            return 405, 'text/plain', b'use POST', {}
+        try:
+            design = json.loads(body)
+            step = float(parse_qs(url.query).get('step', [STEP])[0])
+            validate_request(design, step, self.max_points)
+        except ValueError as e:
+            return 400, 'text/plain', f'invalid request: {e}'.encode(), {}
+        executor = self.executor
+        try:
+            key, data = await self.get_jfl(design, step)
+        except BrokenProcessPool:
+            self.counters['errors'] += 1
+            self._restart_executor(executor)
+            return 500, 'text/plain', b'generation worker died; the pool was restarted', {}
+        except Exception as e:
+            self.counters['errors'] += 1
+            return 400, 'text/plain', f'cannot generate JFL: {e!r}'.encode(), {}
+        return 200, 'text/plain; charset=ascii', data, {'ETag': f'"{key}"'}
+
+    async def _respond(self, writer, status, payload, content_type='text/plain', extra=None, close=False):
+        headers = [f'HTTP/1.1 {status} {_REASONS[status]}', f'Content-Type: {content_type}',
+                   f'Content-Length: {len(payload)}']
+        headers += [f'{name}: {value}' for name, value in (extra or {}).items()]
+        if close:
+            headers.append('Connection: close')
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + payload)
+        await writer.drain()
+
+
+async def serve(host='127.0.0.1', port=8765, max_workers=None, cache_bytes=256 << 20, store=None,
+                max_points=MAX_POINTS):
+    service = JFLService(max_workers=max_workers, cache_bytes=cache_bytes, store=store, max_points=max_points)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"JFL service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache-mb', type=int, default=256)
+    parser.add_argument('--store', default=None, help="content-addressed output directory shared across restarts")
+    parser.add_argument('--store-mb', type=int, default=4096)
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS, help="largest total grid size per request")
+    args = parser.parse_args()
+    store = None
+    if args.store:
+        from jfl_store import JFLStore
+        store = JFLStore(args.store, max_bytes=args.store_mb << 20)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache_mb << 20, store, args.max_points))
+    except KeyboardInterrupt:
+        pass
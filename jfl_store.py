@@ -0,0 +1,184 @@
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+
+from parse_jfl import JFL_FORMAT_VERSION, open_jfl
+from lens_generator import STEP, design_hash, build_jfl_bytes
+
+
+def store_key(design, step=STEP, version=JFL_FORMAT_VERSION):
+    '''Content address of a generated JFL: canonical design, sampling step and writer format version.'''
+    return design_hash({'design': design, 'format_version': version}, step)
+
+
+class JFLStore:
+    '''
+    Content-addressed on-disk store of generated JFL files.
+
+    Objects live in root/objects/<key[:2]>/<key>.JFL and are read-only, so a
+    hard-linked export cannot modify the stored copy in place. The modification
+    time of an object records its last use and drives garbage collection.
+    The total size is scanned once at startup and then kept up to date by put()
+    and gc(), so an insertion only walks the store when it crosses max_bytes.
+
+    Args:
+    root (str): Store directory, created if missing.
+    max_bytes (int): High-water mark; an insertion that exceeds it runs gc(). None disables it.
+    low_water (float): Fraction of max_bytes that gc() frees down to, so it does not run on every insertion.
+    '''
+    def __init__(self, root, max_bytes=None, low_water=0.9):
+        self.root = os.path.abspath(root)
+        self.objects = os.path.join(self.root, 'objects')
+        os.makedirs(self.objects, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'links': 0, 'copies': 0, 'bytes_written': 0, 'evictions': 0}
+        self.total_bytes = self.size()
+
+    def _count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def object_path(self, key):
+        return os.path.join(self.objects, key[:2], key + '.JFL')
+
+    def lookup(self, design, step=STEP):
+        '''Path of the stored output for a design, or None. A hit refreshes its last-use time.'''
+        path = self.object_path(store_key(design, step))
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data):
+        '''Atomically store JFL bytes under a key and return the object path.'''
+        path = self.object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            # 同名对象内容必然相同，并发写入时后者直接覆盖即可
+            with self.lock:
+                try:
+                    replaced = os.stat(path).st_size
+                except FileNotFoundError:
+                    replaced = 0
+                os.replace(tmp_path, path)
+                self.total_bytes += len(data) - replaced
+                self.counters['bytes_written'] += len(data)
+                over = self.max_bytes is not None and self.total_bytes > self.max_bytes
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if over:
+            self.gc(int(self.max_bytes * self.low_water), keep=path)
+        return path
+
+    def get(self, design, step=STEP, build=build_jfl_bytes):
+        '''
+        Path of the JFL for a design, generating and storing it on a miss.
+
+        Args:
+        build (callable): build(design, step) -> JFL bytes, called only on a miss.
+        '''
+        path = self.lookup(design, step)
+        if path is not None:
+            self._count('hits')
+            return path
+        self._count('misses')
+        return self.put(store_key(design, step), build(design, step))
+
+    def get_bytes(self, design, step=STEP, build=build_jfl_bytes):
+        with open(self.get(design, step, build), 'rb') as file:
+            return file.read()
+
+    def export(self, design, file_path, step=STEP, link=True):
+        '''
+        Place the JFL for a design at file_path.
+
+        Args:
+        link (bool): Hard link the stored object when possible (same file system),
+            otherwise copy it. A .gz or .xz suffix always writes a compressed copy.
+        '''
+        source = self.get(design, step)
+        if os.path.lexists(file_path):
+            os.remove(file_path)
+        if file_path.lower().endswith(('.gz', '.xz')):
+            with open(source, 'rb') as src, open_jfl(file_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            self._count('copies')
+            return file_path
+        if link:
+            try:
+                os.link(source, file_path)
+                self._count('links')
+                return file_path
+            except OSError:
+                pass
+        shutil.copyfile(source, file_path)
+        self._count('copies')
+        return file_path
+
+    def _entries(self):
+        entries = []
+        for root, _, names in os.walk(self.objects):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith('.tmp'):
+                    # 写入中断留下的临时文件，超过一小时即清理
+                    if time.time() - info.st_mtime > 3600:
+                        os.remove(path)
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def gc(self, max_bytes, keep=None):
+        '''
+        Delete least recently used objects until the store is at most max_bytes. Returns bytes freed.
+
+        The scan also resynchronizes the running total with the files on disk.
+        '''
+        with self.lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            for _, size, path in entries:
+                if total <= max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                freed += size
+                self.counters['evictions'] += 1
+            self.total_bytes = total
+        return freed
+
+    def stats(self):
+        objects = len(self._entries())
+        with self.lock:
+            counters = dict(self.counters)
+            stored_bytes = self.total_bytes
+        lookups = counters['hits'] + counters['misses']
+        return dict(counters, objects=objects, stored_bytes=stored_bytes,
+                    hit_rate=counters['hits'] / lookups if lookups else 0.0)
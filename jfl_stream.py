@@ -0,0 +1,71 @@
+import numpy as np
+from parse_jfl import JFL_HEADER, XZ_LINE, format_coords, open_jfl
+from lens_generator import STEP, SURFACE_ID_LIST, SURFACE_TO_SEGMENT, SurfacePlan
+
+CHUNK_POINTS = 4096
+
+
+def iter_surface_chunks(surface, lens_semidiameter, step=STEP, chunk_points=CHUNK_POINTS, reverse=False):
+    '''Yield (r, z) chunks of one surface of at most chunk_points points.'''
+    plan = SurfacePlan(surface, lens_semidiameter, step)
+    if not reverse:
+        for start in range(0, plan.n, chunk_points):
+            yield plan.evaluate(start, min(start + chunk_points, plan.n))
+    else:
+        for stop in range(plan.n, 0, -chunk_points):
+            r, z = plan.evaluate(max(stop - chunk_points, 0), stop)
+            yield r[::-1], z[::-1]
+
+
+def iter_jfl_chunks(design, step=STEP, chunk_points=CHUNK_POINTS, footer='Q'):
+    '''
+    Yield the JFL text of a lens JSON incrementally, as ASCII bytes.
+
+    The header is yielded before anything is evaluated, then the F, B and E
+    blocks chunk by chunk, then the footer. Memory stays proportional to
+    chunk_points, and the concatenated output equals
+    build_jfl_string(generate_segments(design, step)).
+    '''
+    yield JFL_HEADER.encode('ascii')
+    lens_semidiameter = design["lens"]["lens_semidiameter"]
+    for surface_id in SURFACE_ID_LIST:
+        name = SURFACE_TO_SEGMENT[surface_id]
+        yield (name + '\n').encode('ascii')
+        for r, z in iter_surface_chunks(design[surface_id], lens_semidiameter, step, chunk_points,
+                                        reverse=(name != 'E')):
+            yield format_coords(np.column_stack([r, z]), XZ_LINE).encode('ascii')
+    yield footer.encode('ascii')
+
+
+def write_jfl_stream(design, sink, step=STEP, chunk_points=CHUNK_POINTS):
+    '''
+    Write a lens JSON as JFL to a file-like or socket-like sink.
+
+    Sockets are written with sendall and file objects with write; both block
+    until the sink accepts the chunk, so a slow DNC link throttles generation.
+    Returns the number of bytes written.
+    '''
+    send = sink.sendall if hasattr(sink, 'sendall') else sink.write
+    total = 0
+    for chunk in iter_jfl_chunks(design, step, chunk_points):
+        send(chunk)
+        total += len(chunk)
+    if hasattr(sink, 'flush'):
+        sink.flush()
+    return total
+
+
+def save_jfl_stream(design, file_path, step=STEP, chunk_points=CHUNK_POINTS):
+    '''Stream a lens JSON to a JFL file; a .gz or .xz suffix compresses it on the fly.'''
+    with open_jfl(file_path, 'wb') as file:
+        return write_jfl_stream(design, file, step, chunk_points)
+
+
+async def write_jfl_stream_async(design, writer, step=STEP, chunk_points=CHUNK_POINTS):
+    '''Same as write_jfl_stream for an asyncio StreamWriter, awaiting drain() after every chunk.'''
+    total = 0
+    for chunk in iter_jfl_chunks(design, step, chunk_points):
+        writer.write(chunk)
+        await writer.drain()
+        total += len(chunk)
+    return total
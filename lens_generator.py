@@ -0,0 +1,375 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sag_calculator import TYPE_TO_FUNCTION, TYPE_TO_SLOPE, TYPE_TO_CORE, PARAMS, SCRATCH_ARRAYS
+from parse_jfl import build_jfl_string
+
+STEP = 0.0025
+
+# 镜片JSON中三个面的键名，以及对应的JFL段名
+SURFACE_ID_LIST = ['前表面', '后表面', '边缘']
+SURFACE_TO_SEGMENT = {'前表面': 'F', '后表面': 'B', '边缘': 'E'}
+
+
+class ScratchArena:
+    '''
+    Work buffers reused across segments, surfaces and designs.
+
+    get() hands out views of named flat buffers and only allocates when a
+    larger size than ever before is requested, so repeated generation at the
+    same step makes no new large allocations once the arena has warmed up.
+    An arena must only be used by one thread; see scratch_arena().
+    '''
+    def __init__(self):
+        self.buffers = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=np.float64):
+        size = int(np.prod(shape))
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(max(size, 2 * buffer.size if buffer is not None else 0), dtype)
+            self.buffers[name] = buffer
+            self.allocations += 1
+        return buffer[:size].reshape(shape)
+
+    def scratch(self, shape, n=SCRATCH_ARRAYS):
+        '''Scratch arrays for the sag_calculator functions.'''
+        return [self.get(f'scratch{i}', shape) for i in range(n)]
+
+    def index(self, start, stop):
+        '''The integers start..stop-1, sliced from a cached arange.'''
+        index = self.buffers.get('index')
+        if index is None or index.size < stop:
+            index = self.buffers['index'] = np.arange(max(stop, 2 * index.size if index is not None else 0))
+            self.allocations += 1
+        return index[start:stop]
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+
+_local = threading.local()
+
+
+def scratch_arena():
+    '''The ScratchArena of the calling thread.'''
+    arena = getattr(_local, 'arena', None)
+    if arena is None:
+        arena = _local.arena = ScratchArena()
+    return arena
+
+
+def load_design(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_design(design, file_path):
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump(design, file, indent=4, ensure_ascii=False)
+
+
+def make_design(lens_thickness, lens_diameter, surfaces):
+    '''
+    Assemble a lens JSON dict in the schema exported by streamlit_app.py.
+
+    Args:
+    lens_thickness (float): Center thickness of the lens.
+    lens_diameter (float): Machining diameter of the lens.
+    surfaces (dict): Surface id -> (start_point_x, start_point_z, segments),
+        where segments is a list of {"type": ..., "params": {...}}.
+    '''
+    design = {
+        "lens": {
+            "lens_thickness": lens_thickness,
+            "lens_diameter": lens_diameter,
+            "lens_semidiameter": lens_diameter / 2
+        }
+    }
+    for surface_id, (start_point_x, start_point_z, segments) in surfaces.items():
+        design[surface_id] = {
+            "start_point_x": start_point_x,
+            "start_point_z": start_point_z,
+            "num_of_segments": len(segments),
+            "segments": [
+                {
+                    "type": segment["type"],
+                    "params": {param: segment["params"][param] for param in PARAMS[segment["type"]]}
+                }
+                for segment in segments
+            ]
+        }
+    return design
+
+
+def generate_surface_sag(surface, lens_semidiameter, step=STEP, with_slope=False, out=None):
+    '''
+    Evaluate one surface of the lens JSON on the machining grid.
+
+    Returns the (r, z) arrays, r running from the start point towards the
+    semidiameter. Each segment is evaluated on the grid points in
+    (previous SemiDiameter, SemiDiameter] and starts from the last sag of
+    the previous segment, exactly as the Streamlit app does.
+    With with_slope=True the analytic dz/dr is returned as a third array.
+    out may give the (r, z) arrays to fill (any strides, e.g. reversed columns
+    of the final segment array); temporaries come from the thread's ScratchArena.
+    '''
+    if not with_slope:
+        plan = SurfacePlan(surface, lens_semidiameter, step)
+        return plan.evaluate(0, plan.n, out=out, arena=scratch_arena())
+    r0 = surface["start_point_x"]
+    z0 = surface["start_point_z"]
+    r = np.arange(r0, lens_semidiameter, step)
+    z = np.zeros_like(r)
+    z[0] = z0
+    slope = np.zeros_like(r)
+    first = True
+    for segment in surface["segments"][:surface.get("num_of_segments", len(surface["segments"]))]:
+        params = segment["params"]
+        ROI_index = (r > r0) & (r <= params["SemiDiameter"])
+        r_ROI = r[ROI_index]
+        r0 = params["SemiDiameter"]
+        if len(r_ROI) == 0:
+            continue
+        func = TYPE_TO_FUNCTION[segment["type"]]
+        z_ROI = func(r_ROI, params, z0)
+        z[ROI_index] = z_ROI
+        slope_ROI = TYPE_TO_SLOPE[segment["type"]](r_ROI, params, z0)
+        slope[ROI_index] = slope_ROI
+        if first:
+            # 起点属于第一段弧段
+            slope[0] = slope_ROI[0] if segment["type"] == 'Line' else \
+                TYPE_TO_SLOPE[segment["type"]](r[:1], params, z0)[0]
+        first = False
+        z0 = z_ROI[-1]
+    return r, z, slope
+
+
+def generate_surface_sag_batch(surface, lens_semidiameter, step=STEP):
+    '''
+    Evaluate many variants of one surface at once.
+
+    Any numeric value of the surface (start_point_z, segment params, single
+    AsphereParams terms) may be an array of shape (N, 1); start_point_x and
+    the segment types are shared. Returns r (M,) and z (N, M), row i equal
+    to generate_surface_sag of variant i.
+    '''
+    r = np.arange(surface["start_point_x"], lens_semidiameter, step)
+    z0 = np.asarray(surface["start_point_z"], dtype=float).reshape(-1, 1)
+    r0 = surface["start_point_x"]
+    segments = surface["segments"][:surface.get("num_of_segments", len(surface["segments"]))]
+    values = [v for segment in segments for value in segment["params"].values()
+              for v in (value if isinstance(value, (list, tuple)) else [value])]
+    n = max([z0.shape[0]] + [np.shape(v)[0] for v in values if np.ndim(v) == 2])
+    z = np.zeros((n, len(r)))
+    z[:, 0] = z0[:, 0]
+    z0 = np.broadcast_to(z0, (n, 1))
+    rows = np.arange(n)
+    arena = scratch_arena()
+    for segment in segments:
+        params = segment["params"]
+        ROI_index = (r > r0) & (r <= params["SemiDiameter"])
+        r0 = params["SemiDiameter"]
+        if ROI_index.ndim == 1:
+            # 分段边界对所有变体相同：只在本段的网格列上计算
+            columns = np.flatnonzero(ROI_index)
+            if len(columns) == 0:
+                continue
+            a, b = columns[0], columns[-1] + 1
+            TYPE_TO_FUNCTION[segment["type"]](r[a:b], params, z0, out=z[:, a:b],
+                                              scratch=arena.scratch((n, b - a)), r_start=r[a])
+            z0 = z[:, b - 1:b].copy()
+            continue
+        has_ROI = ROI_index.any(axis=-1, keepdims=True)
+        ROI_index = np.broadcast_to(ROI_index, z.shape)
+        first = np.argmax(ROI_index, axis=1)
+        last = len(r) - 1 - np.argmax(ROI_index[:, ::-1], axis=1)
+        # 与 generate_surface_sag 相同：每段以 ROI 第一个点为基准，从上一段末点的矢高开始
+        r_first = r[first].reshape(-1, 1)
+        if segment["type"] == 'Line':
+            z_seg = (params['EndZ'] - z0) * (r - r_first) / (params['SemiDiameter'] - r_first) + z0
+        else:
+            core = TYPE_TO_CORE[segment["type"]]
+            # 整个网格都会计算，ROI 以外超出定义域的 NaN 随后被丢弃
+            with np.errstate(invalid='ignore'):
+                z_seg = core(r, params) - core(r_first, params) + z0
+        z = np.where(ROI_index, z_seg, z)
+        z0 = np.where(has_ROI, z[rows, last].reshape(-1, 1), z0)
+    return r, z
+
+
+class SurfacePlan:
+    '''
+    Segment layout of one surface on the machining grid, without evaluating it.
+
+    The grid is r_i = r0 + i * delta, identical to np.arange(r0, semidiameter, step).
+    Every segment keeps its index range, its first grid radius and its start
+    sag, so any chunk of the surface can be evaluated independently and
+    matches generate_surface_sag bit for bit.
+    '''
+    def __init__(self, surface, lens_semidiameter, step=STEP):
+        self.r0 = surface["start_point_x"]
+        self.z0 = surface["start_point_z"]
+        self.delta = (self.r0 + step) - self.r0
+        self.n = max(int(np.ceil((lens_semidiameter - self.r0) / step)), 0)
+        self.segments = []
+
+        r_start = self.r0
+        z0 = self.z0
+        for segment in surface["segments"][:surface.get("num_of_segments", len(surface["segments"]))]:
+            params = segment["params"]
+            # 弧段范围为 (r_start, SemiDiameter]
+            i_lo = self._first_index_above(r_start)
+            i_hi = self._first_index_above(params["SemiDiameter"])
+            r_start = params["SemiDiameter"]
+            if i_hi <= i_lo:
+                continue
+            func = TYPE_TO_FUNCTION[segment["type"]]
+            r_first = np.float64(self.radius(i_lo))
+            # 端点探测不计入 sag.* 统计，用未包装的原函数
+            probe = getattr(func, '__wrapped__', func)
+            z_last = probe(np.array([r_first, self.radius(i_hi - 1)]), params, z0)[-1]
+            self.segments.append((i_lo, i_hi, func, params, r_first, z0))
+            z0 = z_last
+
+    def radius(self, index):
+        return self.r0 + index * self.delta
+
+    def _first_index_above(self, r):
+        '''First grid index whose radius is greater than r.'''
+        i = int(np.clip(np.floor((r - self.r0) / self.delta) + 1, 0, self.n))
+        # 浮点误差修正，与 np.arange 网格上的比较结果保持一致
+        while i > 0 and self.radius(i - 1) > r:
+            i -= 1
+        while i < self.n and self.radius(i) <= r:
+            i += 1
+        return i
+
+    def evaluate(self, start, stop, out=None, arena=None):
+        '''
+        Radius and sag of grid points [start, stop).
+
+        Args:
+        out (tuple): Optional (r, z) arrays of length stop - start to write into,
+            e.g. slices of a preallocated full-surface array.
+        arena (ScratchArena): Source of the index and scratch buffers; defaults
+            to the calling thread's arena.
+        '''
+        arena = arena or scratch_arena()
+        if out is None:
+            r = np.empty(stop - start)
+            z = np.empty(stop - start)
+        elif not (out[0].flags.c_contiguous and out[1].flags.c_contiguous):
+            # 跨步视图（如 F/B 的倒序列）上的 ufunc 走非 SIMD 循环，末位可能不同；先在连续缓冲区中计算再拷贝
+            r, z = self.evaluate(start, stop, out=(arena.get('r', stop - start), arena.get('z', stop - start)),
+                                 arena=arena)
+            out[0][...] = r
+            out[1][...] = z
+            return out
+        else:
+            r, z = out
+        np.multiply(arena.index(start, stop), self.delta, out=r)
+        r += self.r0
+        z[:] = 0
+        if start == 0 and stop > 0:
+            z[0] = self.z0
+        for i_lo, i_hi, func, params, r_first, z0 in self.segments:
+            lo = max(i_lo, start)
+            hi = min(i_hi, stop)
+            if hi <= lo:
+                continue
+            # 以弧段第一个网格点为基准，与整段一次计算时 r.min() 相同
+            func(r[lo - start:hi - start], params, z0, out=z[lo - start:hi - start],
+                 scratch=arena.scratch(hi - lo), r_start=r_first)
+        return r, z
+
+
+def auto_chunk_points(n_points, max_workers):
+    '''
+    Chunk size for threaded evaluation: at least four chunks per thread for load
+    balancing, and between 16k and 64k points so the temporaries of one
+    chunk stay in cache.
+    '''
+    return int(np.clip(np.ceil(n_points / (4 * max_workers)), 1 << 14, 1 << 16))
+
+
+_thread_pools = {}
+_thread_pools_lock = threading.Lock()
+
+
+def _thread_pool(max_workers):
+    '''Shared pool per worker count; its threads keep their ScratchArena between calls.'''
+    with _thread_pools_lock:
+        if max_workers not in _thread_pools:
+            _thread_pools[max_workers] = ThreadPoolExecutor(max_workers=max_workers,
+                                                            thread_name_prefix='sag')
+        return _thread_pools[max_workers]
+
+
+def generate_surface_sag_threaded(surface, lens_semidiameter, step=STEP, max_workers=None, chunk_points=None,
+                                  out=None):
+    '''
+    Same result as generate_surface_sag, evaluated chunk by chunk in a thread pool.
+
+    The NumPy kernels of sag_calculator release the GIL on large arrays, so the
+    chunks run concurrently; each thread writes its slice of one preallocated
+    (r, z) pair, using its own ScratchArena. Worth it for very fine steps
+    (millions of points per surface).
+    '''
+    max_workers = max_workers or os.cpu_count()
+    plan = SurfacePlan(surface, lens_semidiameter, step)
+    r, z = out if out is not None else (np.empty(plan.n), np.empty(plan.n))
+    chunk_points = chunk_points or auto_chunk_points(plan.n, max_workers)
+    bounds = [(start, min(start + chunk_points, plan.n)) for start in range(0, plan.n, chunk_points)]
+
+    def evaluate(bound):
+        start, stop = bound
+        plan.evaluate(start, stop, out=(r[start:stop], z[start:stop]), arena=scratch_arena())
+
+    if max_workers == 1 or len(bounds) == 1:
+        for bound in bounds:
+            evaluate(bound)
+        return r, z
+    list(_thread_pool(max_workers).map(evaluate, bounds))
+    return r, z
+
+
+def generate_segments(design, step=STEP, max_workers=1):
+    '''
+    Generate the F/B/E segment dict accepted by build_jfl_string from a lens JSON.
+
+    The front and back surfaces are written from the edge to the center,
+    the edge from the inside out. With max_workers other than 1 (None for all
+    cores) each surface is evaluated with generate_surface_sag_threaded.
+    '''
+    lens_semidiameter = design["lens"]["lens_semidiameter"]
+    segments = {}
+    for surface_id in SURFACE_ID_LIST:
+        name = SURFACE_TO_SEGMENT[surface_id]
+        # 直接写入最终的 (N, 2) 数组，F/B 写入倒序视图，不再另外拼接拷贝
+        coords = np.empty((SurfacePlan(design[surface_id], lens_semidiameter, step).n, 2))
+        view = coords if name == 'E' else coords[::-1]
+        out = (view[:, 0], view[:, 1])
+        if max_workers == 1:
+            generate_surface_sag(design[surface_id], lens_semidiameter, step, out=out)
+        else:
+            generate_surface_sag_threaded(design[surface_id], lens_semidiameter, step, max_workers, out=out)
+        segments[name + '_XZ'] = coords
+    return segments
+
+
+def design_hash(design, step):
+    '''Hash of the canonical JSON form of a design and sampling step.'''
+    canonical = json.dumps({'design': design, 'step': step}, sort_keys=True, separators=(',', ':'),
+                           ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def build_jfl_bytes(design, step=STEP):
+    '''Generate a lens JSON and return the JFL file content as bytes.'''
+    return build_jfl_string(generate_segments(design, step)).encode('ascii')
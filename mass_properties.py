@@ -0,0 +1,95 @@
+import numpy as np
+from lens_generator import STEP, generate_segments
+
+
+def _ascending(coords):
+    coords = np.asarray(coords, dtype=float)
+    if len(coords) > 1 and coords[0, 0] > coords[-1, 0]:
+        coords = coords[::-1]
+    return coords
+
+
+def lens_outline(segments):
+    '''
+    Closed cross-section of the lens: F from the axis to the rim, then B back to the axis.
+
+    The rim is closed by a straight segment between the outer ends of F and B.
+    The edge profile E is a separate cutting path and is not part of the outline.
+    '''
+    front = _ascending(segments['F_XZ'])
+    back = _ascending(segments['B_XZ'])[::-1]
+    return np.vstack([front, back, front[:1]])
+
+
+def _frustum_volumes(x1, z1, x2, z2):
+    # 多段线绕 Z 轴旋转，每条线段是一个圆台，闭合多边形的代数和即为体积
+    return np.pi / 3 * (x1**2 + x1 * x2 + x2**2) * (z2 - z1)
+
+
+def _frustum_areas(x1, z1, x2, z2):
+    return np.pi * (np.abs(x1) + np.abs(x2)) * np.hypot(x2 - x1, z2 - z1)
+
+
+def revolved_volume(outline):
+    '''Exact volume (mm^3) of a closed polyline (N, 2) revolved about the Z axis.'''
+    x, z = outline[:, 0], outline[:, 1]
+    return float(abs(_frustum_volumes(x[:-1], z[:-1], x[1:], z[1:]).sum()))
+
+
+def revolved_area(profile):
+    '''Exact area (mm^2) of the surface swept by an open polyline (N, 2) about the Z axis.'''
+    x, z = profile[:, 0], profile[:, 1]
+    return float(_frustum_areas(x[:-1], z[:-1], x[1:], z[1:]).sum())
+
+
+def mass_properties(segments, density=None):
+    '''
+    Volume, surface areas and mass of one lens.
+
+    Args:
+    segments (dict): Segment dict with F_XZ, B_XZ and optionally E_XZ.
+    density (float): Material density in g/cm^3. Mass is reported in g.
+    '''
+    return {key: float(value[0]) for key, value in batch_mass_properties([segments], density).items()}
+
+
+def batch_mass_properties(segments_list, density=None):
+    '''
+    Volume, surface areas and mass of a catalog of lenses in one vectorized pass.
+
+    All polylines are concatenated; per-edge frustum contributions are summed
+    per lens with np.bincount.
+
+    Args:
+    segments_list (list): Segment dicts with F_XZ, B_XZ and optionally E_XZ.
+    density (float or array): Material density in g/cm^3, scalar or one per lens.
+
+    Returns a dict of arrays with one entry per lens.
+    '''
+    n_lens = len(segments_list)
+    outlines = [lens_outline(segments) for segments in segments_list]
+    volume = np.abs(_edge_sums(outlines, _frustum_volumes, n_lens))
+
+    result = {'volume': volume}
+    for name in ['F', 'B', 'E']:
+        profiles = [np.asarray(segments.get(name + '_XZ', np.empty((0, 2))), dtype=float)
+                    for segments in segments_list]
+        result[f'area_{name}'] = _edge_sums(profiles, _frustum_areas, n_lens)
+    if density is not None:
+        # mm^3 * g/cm^3 -> g
+        result['mass'] = volume * np.asarray(density, dtype=float) * 1e-3
+    return result
+
+
+def _edge_sums(polylines, edge_function, n_lens):
+    points = np.vstack(polylines)
+    lens_id = np.repeat(np.arange(n_lens), [len(p) for p in polylines])
+    # 只保留同一镜片内相邻点构成的线段
+    same = lens_id[1:] == lens_id[:-1]
+    contribution = edge_function(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+    return np.bincount(lens_id[1:][same], weights=contribution[same], minlength=n_lens).astype(float)
+
+
+def design_mass_properties(designs, step=STEP, density=None):
+    '''Generate each lens JSON and evaluate volume, areas and mass of the whole catalog.'''
+    return batch_mass_properties([generate_segments(design, step) for design in designs], density)
@@ -1,7 +1,63 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import re
 import copy
+import os
+import gzip
+import lzma
+from instrumentation import instrumented, segment_points
+
+__all__ = [
+    'parse_line_to_coords', 'parse_jfl_file', 'build_jfl_string', 'save_jfl_file',
+    'JFL_HEADER', 'JFL_FORMAT_VERSION', 'XZ_LINE', 'XZW_LINE', 'format_coords', 'open_jfl', 'is_jfl_path', 'jfl_stem',
+    'plot_jfl_segments_generic', 'plot_zoom_jfl_segments', 'plot_jfl_segments_with_arrows',
+    'numerical_axial_radius', 'numerical_derivative_1', 'numerical_derivative_2',
+    'curvature_radius', 'numerical_curvature_radius',
+]
+
+# 绘图函数在 jfl_plot 中，首次访问时才导入 matplotlib，纯解析/生成的进程启动更快
+_PLOT_FUNCTIONS = {'plot_jfl_segments_generic', 'plot_zoom_jfl_segments', 'plot_jfl_segments_with_arrows'}
+
+
+def __getattr__(name):
+    if name in _PLOT_FUNCTIONS:
+        import jfl_plot
+        return getattr(jfl_plot, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+GZIP_LEVEL = 6
+XZ_PRESET = 6
+JFL_SUFFIXES = ('.jfl', '.jfl.gz', '.jfl.xz')
+
+
+def is_jfl_path(file_path):
+    return str(file_path).lower().endswith(JFL_SUFFIXES)
+
+
+def jfl_stem(file_name):
+    '''File name without the .JFL / .JFL.gz / .JFL.xz suffix.'''
+    for suffix in JFL_SUFFIXES:
+        if file_name.lower().endswith(suffix):
+            return file_name[:-len(suffix)]
+    return os.path.splitext(file_name)[0]
+
+
+def open_jfl(file_path, mode='r'):
+    '''
+    Open a JFL file, transparently (de)compressing .gz and .xz files.
+
+    Modes are 'r', 'w' (text) and 'rb', 'wb' (bytes). Compressed files are
+    decoded incrementally while iterating, never inflated whole.
+    '''
+    suffix = os.path.splitext(str(file_path))[1].lower()
+    if 'b' not in mode and 't' not in mode:
+        mode += 't'
+    if suffix == '.gz':
+        return gzip.open(file_path, mode, compresslevel=GZIP_LEVEL)
+    if suffix == '.xz':
+        return lzma.open(file_path, mode, preset=XZ_PRESET if 'w' in mode else None)
+    return open(file_path, mode)
+
 
 # def parse_line_to_coords_refactored(line):
 #     # Regular expression to match the format of the coordinates (including the optional W coordinate)
@@ -15,9 +71,11 @@ import copy
 #     else:
 #         return None
     
+@instrumented('parse_line_to_coords', measure=lambda args, kwargs, result: (1 if result else 0, len(args[0])),
+              hot=True, aggregate=True)
 def parse_line_to_coords(line):
     # Regular expression to match the format of the coordinates (including the optional W coordinate)
-    match = re.search(r'X\s*([\d.]+)\s*Z\s*([\d.]+)(?:\s*W\s*([\d.-]+))?', line)
+    match = re.search(r'X\s*(-?[\d.]+)\s*Z\s*(-?[\d.]+)(?:\s*W\s*([\d.-]+))?', line)
     if match:
         x = float(match.group(1))
         z = float(match.group(2))
@@ -27,30 +85,31 @@ def parse_line_to_coords(line):
     else:
         return None
     
+@instrumented('parse_jfl_file', measure=lambda args, kwargs, result: (
+    segment_points(result), os.path.getsize(args[0] if args else kwargs['file_path'])))
 def parse_jfl_file(file_path):
-    with open(file_path, 'r') as file:
-        file_contents = file.readlines()
-
     segments = {}
     current_segment = None
     is_three_coordinate_data = False
 
-    for line in file_contents:
-        line = line.strip()
-        if line.startswith("*"):  # Check for the three-coordinate data marker
-            is_three_coordinate_data = True
-        elif line.isalpha():  # New segment
-            current_segment = line
-            segments[current_segment + "_XZ"] = []  # Initialize two-coordinate data list
-            segments[current_segment + "_XZW"] = []  # Initialize three-coordinate data list
-            is_three_coordinate_data = False
-        else:
-            coords = parse_line_to_coords(line)
-            if coords and current_segment:
-                if is_three_coordinate_data and len(coords) == 3:  # Three-coordinate data
-                    segments[current_segment + "_XZW"].append(coords)
-                elif len(coords) == 2:  # Two-coordinate data
-                    segments[current_segment + "_XZ"].append(coords)
+    # 逐行读取，压缩文件(.gz/.xz)边解压边解析，不会整体载入内存
+    with open_jfl(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith("*"):  # Check for the three-coordinate data marker
+                is_three_coordinate_data = True
+            elif line.isalpha():  # New segment
+                current_segment = line
+                segments[current_segment + "_XZ"] = []  # Initialize two-coordinate data list
+                segments[current_segment + "_XZW"] = []  # Initialize three-coordinate data list
+                is_three_coordinate_data = False
+            else:
+                coords = parse_line_to_coords(line)
+                if coords and current_segment:
+                    if is_three_coordinate_data and len(coords) == 3:  # Three-coordinate data
+                        segments[current_segment + "_XZW"].append(coords)
+                    elif len(coords) == 2:  # Two-coordinate data
+                        segments[current_segment + "_XZ"].append(coords)
 
     # Convert lists to numpy arrays and remove empty segments
     for segment in list(segments.keys()):
@@ -63,81 +122,7 @@ def parse_jfl_file(file_path):
 
 
 
-def plot_jfl_segments_generic(segments):
-    plt.figure()
-
-    # Colors for different segments, randomly chosen for each segment
-    colors = ['blue', 'green', 'red', 'purple', 'orange', 'pink', 'brown', 'gray', 'olive', 'cyan']
-
-    for i, (segment_label, segment_data) in enumerate(segments.items()):
-        if len(segment_data) > 0:  # Plot only if there is data in the segment
-            color = colors[i % len(colors)]  # Cycle through colors
-            plt.plot(segment_data[:, 0], segment_data[:, 1], c=color, label=f'{segment_label} Segment')
-
-    # Adding labels and title
-    plt.xlabel('X Coordinate')
-    plt.ylabel('Z Coordinate (Inverted)')
-    plt.title('JFL File Segments Visualization')
-    plt.legend()
-    # Inverting the y-axis
-    plt.gca().invert_yaxis()
-    # Showing the plot
-    plt.show()
-
-def plot_zoom_jfl_segments(segments,segment_name,x_min,x_max):
-    fig=plt.figure()
-    segment_data=segments[segment_name]
-    index=np.where(np.logical_and(segment_data[:,0]>=x_min,segment_data[:,0]<=x_max))[0]
-    plt.plot(segment_data[index, 0], segment_data[index, 1], label=f'{segment_name} Segment')
-    plt.xlim(x_min,x_max)
-    # plt.ylim(-0.5,0.5)
-
-    # Adding labels and title
-    plt.xlabel('X Coordinate')
-    plt.ylabel('Z Coordinate (Inverted)')
-    plt.title(f'Segment zoom in {segment_name}')
-    plt.legend()
-    # Inverting the y-axis
-    plt.gca().invert_yaxis()
-    # Showing the plot
-    # plt.show()
-    return fig 
-
-
-def plot_jfl_segments_with_arrows(segments, n_arrows=10):
-    fig=plt.figure()
-
-    colors = ['blue', 'green', 'red', 'purple', 'orange', 'pink', 'brown', 'gray', 'olive', 'cyan']
-
-    for i, (segment_label, segment_data) in enumerate(segments.items()):
-        if len(segment_data) > 0:
-            color = colors[i % len(colors)]
-            plt.plot(segment_data[:, 0], segment_data[:, 1], c=color, label=f'{segment_label} Segment')
-
-            # Adding arrows to the plot
-            num_points = len(segment_data)
-            if num_points > 1:
-                for j in range(1, n_arrows + 1):
-                    idx = j * num_points // (n_arrows + 1)  # Calculating the index for the arrow
-                    start_point = segment_data[idx - 1]
-                    end_point = segment_data[idx]
-                    plt.annotate('', xy=(end_point[0], end_point[1]), xytext=(start_point[0], start_point[1]),
-                                 arrowprops=dict(arrowstyle="->", color=color))
-
-    plt.xlabel('X Coordinate')
-    plt.ylabel('Z Coordinate')
-    plt.title('JFL File Segments Visualization with Direction Arrows')
-    plt.legend()
-
-    # Inverting the y-axis
-    plt.gca().invert_yaxis()
-
-    # plt.show()
-
-    return fig 
-
-def build_jfl_string(segments, three_coord_marker="*S015A000",footer = 'Q'):
-    header = """MCG
+JFL_HEADER = """MCG
 GSH003
 Jobnumber
 8/29/2023 2:34:15 PM
@@ -153,38 +138,62 @@ Chuck1
 FC
 AC
 """
-    content = header
+
+# 输出格式版本：修改 JFL_HEADER、行格式或 build_jfl_string 输出时递增
+JFL_FORMAT_VERSION = 1
+XZ_LINE = 'X %012.9f Z %012.9f\n'
+XZW_LINE = 'X %012.9f Z %012.9f W %012.9f\n'
+
+
+def format_coords(coords, line_format=XZ_LINE):
+    '''
+    Format a block of coordinates with one bulk %-formatting call.
+
+    Produces exactly the same text as formatting each point with
+    f'X {x:012.9f} Z {z:012.9f}', several times faster.
+    '''
+    coords = np.asarray(coords, dtype=float)
+    n_columns = line_format.count('%')
+    if coords.size == 0:
+        return ''
+    if coords.ndim != 2 or coords.shape[1] != n_columns:
+        raise ValueError(f"expected {n_columns} coordinate columns, got shape {coords.shape}")
+    return (line_format * len(coords)) % tuple(coords.ravel().tolist())
+
+
+@instrumented('build_jfl_string', measure=lambda args, kwargs, result: (segment_points(args[0]), len(result)))
+def build_jfl_string(segments, three_coord_marker="*S015A000",footer = 'Q', header=JFL_HEADER):
+    content = [header]
     for segment_name, coords in segments.items():
         # Determine if the segment is for two-coordinate or three-coordinate data
         if segment_name.endswith("_XZ"):
             # Two-coordinate data (XZ)
-            content += segment_name[:-3] + '\n'  # Remove '_XZ' from segment name
-            for x, z in coords:
-                content += f'X {x:012.9f} Z {z:012.9f}\n'
+            content.append(segment_name[:-3] + '\n')  # Remove '_XZ' from segment name
+            content.append(format_coords(coords, XZ_LINE))
         elif segment_name.endswith("_XZW"):
             # Three-coordinate data (XZW)
-            content += three_coord_marker + '\n'
+            content.append(three_coord_marker + '\n')
             # content += segment_name[:-4] + '\n'  # Remove '_XZW' from segment name
-            for x, z, w in coords:
-                content += f'X {x:012.9f} Z {z:012.9f} W {w:012.9f}\n'
+            content.append(format_coords(coords, XZW_LINE))
         else: 
-            content += segment_name + '\n' 
-            for x, z in coords:
-                content += f'X {x:012.9f} Z {z:012.9f}\n'
+            content.append(segment_name + '\n')
+            content.append(format_coords(coords, XZ_LINE))
 
-    content += footer
-    return content
+    content.append(footer)
+    return ''.join(content)
 
 
+@instrumented('save_jfl_file', measure=lambda args, kwargs, result: (
+    segment_points(args[0]), os.path.getsize(args[1] if len(args) > 1 else kwargs['file_path'])))
 def save_jfl_file(segments, file_path,three_coord_marker="*S015A000"):
     '''
     Save the modified segments back into a JFL file in the specified format.
     
     Args:
     segments (dict): Dictionary of segments with coordinates.
-    file_path (str): Path to save the modified JFL file.
+    file_path (str): Path to save the modified JFL file. A .gz or .xz suffix compresses it.
     '''
-    with open(file_path, 'w') as file:
+    with open_jfl(file_path, 'w') as file:
         file.write(build_jfl_string(segments,three_coord_marker=three_coord_marker))
     print(f"File saved successfully to {file_path}")
 
@@ -0,0 +1,333 @@
+'''
+2D rigid registration of measured profilometer traces against a lens profile.
+
+    reference = PolylineProfile.from_jfl('lens.JFL', 'F_XZ', mirror=True)
+    # or the analytic surface: AnalyticProfile(design['前表面'], mirror=True)
+    trace = load_trace('measure_001.csv')
+    aligned, residual, info = register_profile(trace, reference)
+    print(info['pv'], info['rms'])
+
+The trace is moved onto the reference with a point-to-line ICP: every
+iteration projects the trace points onto the reference, then solves the
+3x3 normal equations for the rotation and translation that minimize the
+squared normal distances. A polyline reference finds its nearest segments
+through the sorted X column (searchsorted plus a small window); the analytic
+reference evaluates the sag_calculator segments and finds the foot point with
+a few Gauss-Newton steps. Residuals are signed normal distances, positive
+above the reference in +Z.
+
+mirror=True extends the half profile (0..SemiDiameter) to -SemiDiameter, for
+traces that cross the whole lens.
+'''
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from parse_jfl import parse_jfl_file, format_coords, open_jfl, jfl_stem
+from sag_calculator import TYPE_TO_CORE, TYPE_TO_SLOPE
+from fillet_solver import segment_starts
+
+PROJECT_CHUNK = 1 << 18
+
+
+def load_trace(file_path, x_column=0, z_column=1, delimiter=None, scale=1.0):
+    '''
+    Read an (N, 2) X/Z trace from a profilometer CSV/TXT file (.gz/.xz allowed).
+
+    Leading lines that do not start with a number (headers, units) are skipped;
+    the delimiter is taken from the first data line unless given. scale converts
+    the file units to mm, e.g. 1e-3 for um.
+    '''
+    skip = 0
+    with open_jfl(file_path, 'r') as file:
+        for line in file:
+            fields = line.replace(';', ',').replace(',', ' ').split()
+            try:
+                float(fields[0])
+                break
+            except (IndexError, ValueError):
+                skip += 1
+    if delimiter is None:
+        delimiter = ',' if ',' in line else ';' if ';' in line else None
+    with open_jfl(file_path, 'r') as file:
+        trace = np.loadtxt(file, delimiter=delimiter, skiprows=skip, usecols=(x_column, z_column), ndmin=2)
+    return trace * scale if scale != 1.0 else trace
+
+
+class PolylineProfile:
+    '''
+    Reference profile given as points, e.g. the F_XZ / B_XZ segment of a JFL file.
+
+    Args:
+    points (np.ndarray): (N, 2+) X/Z points of a profile that is single-valued in X.
+    mirror (bool): Add the mirror image about X = 0.
+    window (int): Segments searched on each side of the searchsorted position.
+    '''
+    def __init__(self, points, mirror=False, window=2):
+        points = np.asarray(points, dtype=float)
+        x, index = np.unique(points[:, 0], return_index=True)
+        z = points[index, 1]
+        if mirror:
+            keep = x > 0
+            x = np.concatenate([-x[keep][::-1], x])
+            z = np.concatenate([z[keep][::-1], z])
+        self.x, self.z = x, z
+        self.window = window
+        self.x_range = (x[0], x[-1])
+
+    @classmethod
+    def from_jfl(cls, file_path, segment='F_XZ', mirror=False, window=2):
+        return cls(parse_jfl_file(file_path)[segment], mirror, window)
+
+    def sag(self, x):
+        return np.interp(x, self.x, self.z)
+
+    def _project_chunk(self, px, pz):
+        x, z = self.x, self.z
+        last = len(x) - 2
+        start = np.searchsorted(x, px) - 1
+        j = np.clip(start[:, None] + np.arange(-self.window, self.window + 1), 0, last)
+        x0, z0 = x[j], z[j]
+        dx, dz = x[j + 1] - x0, z[j + 1] - z0
+        u = np.clip(((px[:, None] - x0) * dx + (pz[:, None] - z0) * dz) / (dx * dx + dz * dz), 0.0, 1.0)
+        qx, qz = x0 + u * dx, z0 + u * dz
+        best = np.argmin((px[:, None] - qx)**2 + (pz[:, None] - qz)**2, axis=1)[:, None]
+        qx = np.take_along_axis(qx, best, 1)[:, 0]
+        qz = np.take_along_axis(qz, best, 1)[:, 0]
+        dx = np.take_along_axis(dx, best, 1)[:, 0]
+        dz = np.take_along_axis(dz, best, 1)[:, 0]
+        length = np.hypot(dx, dz)
+        return qx, qz, -dz / length, dx / length
+
+    def project(self, px, pz):
+        '''Closest reference points (qx, qz) and unit normals (nx, nz) with nz > 0.'''
+        if len(px) <= PROJECT_CHUNK:
+            return self._project_chunk(px, pz)
+        parts = [self._project_chunk(px[i:i + PROJECT_CHUNK], pz[i:i + PROJECT_CHUNK])
+                 for i in range(0, len(px), PROJECT_CHUNK)]
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+class AnalyticProfile:
+    '''
+    Reference profile evaluated from the segments of a lens JSON surface.
+
+    The segments are chained end to end as in fillet_solver.segment_starts, so
+    this is the continuous profile the generator samples.
+
+    Args:
+    surface (dict): One surface of a lens JSON, e.g. design["前表面"].
+    mirror (bool): Evaluate z(|x|), for traces crossing the whole lens.
+    n_iter (int): Gauss-Newton steps for the foot point.
+    '''
+    def __init__(self, surface, mirror=False, n_iter=4):
+        self.segments = surface["segments"][:surface.get("num_of_segments", len(surface["segments"]))]
+        self.starts = segment_starts(surface)
+        self.edges = np.array([segment["params"]["SemiDiameter"] for segment in self.segments], dtype=float)
+        self.mirror = mirror
+        self.n_iter = n_iter
+        r0 = surface["start_point_x"]
+        self.x_range = (-self.edges[-1], self.edges[-1]) if mirror else (r0, self.edges[-1])
+
+    def sag(self, x, with_slope=False):
+        r = np.abs(x) if self.mirror else np.asarray(x, dtype=float)
+        # 超出最后一段的点按最后一段外推
+        which = np.minimum(np.searchsorted(self.edges, r), len(self.segments) - 1)
+        z = np.empty_like(r)
+        slope = np.empty_like(r)
+        for j, (segment, (r0, z0)) in enumerate(zip(self.segments, self.starts)):
+            mask = which == j
+            if not mask.any():
+                continue
+            r_j, params = r[mask], segment["params"]
+            if segment["type"] == 'Line':
+                k = (params["EndZ"] - z0) / (params["SemiDiameter"] - r0)
+                z[mask] = z0 + k * (r_j - r0)
+                slope[mask] = k
+            else:
+                core = TYPE_TO_CORE[segment["type"]]
+                z[mask] = z0 + core(r_j, params) - core(r0, params)
+                slope[mask] = TYPE_TO_SLOPE[segment["type"]](r_j, params, z0)
+        if self.mirror:
+            slope = np.where(x < 0, -slope, slope)
+        return (z, slope) if with_slope else z
+
+    def project(self, px, pz):
+        '''Closest reference points (qx, qz) and unit normals (nx, nz) with nz > 0.'''
+        qx = np.clip(px, *self.x_range)
+        for _ in range(self.n_iter):
+            qz, slope = self.sag(qx, with_slope=True)
+            qx = np.clip(qx - ((qx - px) + (qz - pz) * slope) / (1 + slope**2), *self.x_range)
+        qz, slope = self.sag(qx, with_slope=True)
+        norm = np.sqrt(1 + slope**2)
+        return qx, qz, -slope / norm, 1 / norm
+
+
+def form_error(residual):
+    '''PV, RMS and mean of signed residuals.'''
+    residual = np.asarray(residual)
+    if residual.size == 0:
+        return {'pv': np.nan, 'rms': np.nan, 'mean': np.nan}
+    return {'pv': float(residual.max() - residual.min()), 'rms': float(np.sqrt(np.mean(residual**2))),
+            'mean': float(residual.mean())}
+
+
+def _transform(points, theta, tx, tz):
+    c, s = np.cos(theta), np.sin(theta)
+    x, z = points[:, 0], points[:, 1]
+    return c * x - s * z + tx, s * x + c * z + tz
+
+
+def register_profile(trace, reference, fit_rotation=True, initial=None, n_iter=50, tol=1e-8, cost_tol=1e-9,
+                     reject=None):
+    '''
+    Align a measured trace to a reference profile by point-to-line ICP.
+
+    Args:
+    trace (np.ndarray): (N, 2) measured X/Z points.
+    reference (PolylineProfile | AnalyticProfile): Profile to align to.
+    fit_rotation (bool): Also solve for the tilt; otherwise translation only.
+    initial (tuple): Starting (theta, tx, tz); by default only tz, from the median sag offset.
+    tol (float): Stop when the largest point movement of an update is below tol (mm).
+    cost_tol (float): Also stop when the mean squared residual changes by at most
+        cost_tol times itself between iterations. Against a PolylineProfile the
+        point-to-line steps keep moving the trace by ~1e-9 mm as points switch
+        segments, so the cost criterion is what ends those fits.
+    reject (float): Drop points whose residual is more than reject robust sigmas
+        (1.4826 * MAD) from the median, re-evaluated every iteration.
+
+    Returns (aligned, residual, info): aligned (N, 2) points, residual (N,) signed
+    normal distances (NaN outside the reference or rejected), and info with
+    theta, tx, tz, iterations, converged, n_used, pv, rms and mean.
+    '''
+    trace = np.asarray(trace, dtype=float)[:, :2]
+    if initial is None:
+        inside = (trace[:, 0] >= reference.x_range[0]) & (trace[:, 0] <= reference.x_range[1])
+        sample = trace[inside] if inside.any() else trace
+        initial = (0.0, 0.0, float(np.median(reference.sag(sample[:, 0]) - sample[:, 1])))
+    theta, tx, tz = initial
+    extent = np.ptp(trace[:, 0]) + np.ptp(trace[:, 1])
+    converged = False
+    used = np.ones(len(trace), dtype=bool)
+    previous_cost = None
+
+    for iteration in range(1, n_iter + 1):
+        px, pz = _transform(trace, theta, tx, tz)
+        used = (px >= reference.x_range[0]) & (px <= reference.x_range[1])
+        qx, qz, nx, nz = reference.project(px[used], pz[used])
+        d = (px[used] - qx) * nx + (pz[used] - qz) * nz
+        if reject is not None and len(d):
+            median = np.median(d)
+            sigma = 1.4826 * np.median(np.abs(d - median))
+            keep = np.abs(d - median) <= reject * max(sigma, 1e-15)
+            used[used] = keep
+            px_u, pz_u, nx, nz, d = px[used], pz[used], nx[keep], nz[keep], d[keep]
+        else:
+            px_u, pz_u = px[used], pz[used]
+        if len(d) < 3:
+            raise ValueError("fewer than 3 trace points overlap the reference")
+        cost = float(np.mean(d**2))
+        if previous_cost is not None and abs(previous_cost - cost) <= cost_tol * cost:
+            converged = True
+            break
+        previous_cost = cost
+
+        # 绕重心线性化：d + a*(n·perp(p-c)) + n·t = 0
+        cx, cz = px_u.mean(), pz_u.mean()
+        A = np.column_stack([nx * -(pz_u - cz) + nz * (px_u - cx), nx, nz]) if fit_rotation \
+            else np.column_stack([nx, nz])
+        delta = np.linalg.solve(A.T @ A + 1e-18 * np.eye(A.shape[1]), -A.T @ d)
+        da = delta[0] if fit_rotation else 0.0
+        dtx, dtz = delta[-2], delta[-1]
+        # 先绕重心旋转 da，再平移，合并进总变换
+        c, s = np.cos(da), np.sin(da)
+        tx, tz = c * (tx - cx) - s * (tz - cz) + cx + dtx, s * (tx - cx) + c * (tz - cz) + cz + dtz
+        theta += da
+        if abs(da) * extent + np.hypot(dtx, dtz) < tol:
+            converged = True
+            break
+
+    px, pz = _transform(trace, theta, tx, tz)
+    inside = (px >= reference.x_range[0]) & (px <= reference.x_range[1])
+    residual = np.full(len(trace), np.nan)
+    qx, qz, nx, nz = reference.project(px[inside], pz[inside])
+    residual[inside] = (px[inside] - qx) * nx + (pz[inside] - qz) * nz
+    if reject is not None:
+        residual[~used] = np.nan
+    info = {'theta': float(theta), 'tx': float(tx), 'tz': float(tz), 'iterations': iteration,
+            'converged': converged, 'n_points': len(trace), 'n_used': int(np.count_nonzero(~np.isnan(residual)))}
+    info.update(form_error(residual[~np.isnan(residual)]))
+    return np.column_stack([px, pz]), residual, info
+
+
+def save_residual(file_path, aligned, residual):
+    '''Write aligned x, z and residual columns as CSV; rows without a residual are left out.'''
+    keep = ~np.isnan(residual)
+    with open_jfl(file_path, 'w') as file:
+        file.write('x,z,residual\n')
+        file.write(format_coords(np.column_stack([aligned[keep], residual[keep]]), '%.9f,%.9f,%.9e\n'))
+
+
+def _register_task(args):
+    file_path, reference, output_dir, load_kwargs, kwargs = args
+    try:
+        aligned, residual, info = register_profile(load_trace(file_path, **load_kwargs), reference, **kwargs)
+        if output_dir:
+            save_residual(os.path.join(output_dir, jfl_stem(os.path.basename(file_path)) + '_residual.csv'),
+                          aligned, residual)
+        return file_path, info, None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+def register_traces(file_paths, reference, output_dir=None, max_workers=None, load_kwargs=None, **kwargs):
+    '''
+    Register many trace files against one reference in parallel.
+
+    Args:
+    file_paths (list): Trace files for load_trace.
+    reference (PolylineProfile | AnalyticProfile): Shared reference, sent once per task.
+    output_dir (str): If given, <stem>_residual.csv is written for every trace.
+    load_kwargs (dict): Passed to load_trace (columns, delimiter, scale).
+    kwargs: Passed to register_profile.
+
+    Returns a list of (path, info, error message).
+    '''
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tasks = [(file_path, reference, output_dir, load_kwargs or {}, kwargs) for file_path in file_paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_register_task, tasks))
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    from parse_jfl import is_jfl_path
+    parser = argparse.ArgumentParser(description="Register profilometer traces against a JFL or lens JSON profile")
+    parser.add_argument('reference', help="a .JFL(.gz/.xz) file or a lens parameter JSON")
+    parser.add_argument('traces', nargs='+')
+    parser.add_argument('--segment', default='F_XZ', help="JFL segment to align to")
+    parser.add_argument('--surface', default='前表面', help="lens JSON surface to align to")
+    parser.add_argument('--mirror', action='store_true', help="traces cross the whole lens diameter")
+    parser.add_argument('--no-rotation', action='store_true')
+    parser.add_argument('--reject', type=float, default=None, help="outlier rejection in robust sigmas")
+    parser.add_argument('--columns', type=int, nargs=2, default=[0, 1])
+    parser.add_argument('--scale', type=float, default=1.0, help="trace units to mm, e.g. 0.001 for um")
+    parser.add_argument('--output-dir', default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    if is_jfl_path(args.reference):
+        reference = PolylineProfile.from_jfl(args.reference, args.segment, args.mirror)
+    else:
+        with open(args.reference, encoding='utf-8') as file:
+            reference = AnalyticProfile(json.load(file)[args.surface], args.mirror)
+    for file_path, info, error in register_traces(
+            args.traces, reference, args.output_dir, args.workers,
+            load_kwargs={'x_column': args.columns[0], 'z_column': args.columns[1], 'scale': args.scale},
+            fit_rotation=not args.no_rotation, reject=args.reject):
+        if error:
+            print(f"{file_path}: failed ({error})")
+        else:
+            print(f"{file_path}: PV {info['pv'] * 1e3:.3f} um  RMS {info['rms'] * 1e3:.3f} um  "
+                  f"tilt {np.degrees(info['theta']) * 3600:.1f}\"  shift ({info['tx']:.6f}, {info['tz']:.6f}) mm  "
+                  f"{info['n_used']}/{info['n_points']} points")
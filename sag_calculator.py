@@ -1,53 +1,163 @@
 import numpy as np 
+from instrumentation import instrument_table
 
-def standard(r, params, z0):
-    r_min = r.min()
+SCRATCH_ARRAYS = 2  # 矢高函数最多需要的临时数组个数
+
+
+def _buffers(r, params, keys, out, scratch, n_scratch):
+    '''
+    Output and scratch arrays of the broadcast shape of r and the given params.
+
+    out and the scratch arrays may be given (e.g. views of a reused arena);
+    whatever is missing is allocated.
+    '''
+    shape = np.broadcast_shapes(np.shape(r), *[np.shape(params[key]) for key in keys])
+    if out is None:
+        out = np.empty(shape)
+    scratch = list(scratch or [])[:n_scratch]
+    scratch += [np.empty(shape) for _ in range(n_scratch - len(scratch))]
+    return out, scratch
+
+
+# 各类型弧段的绝对矢高（顶点处为 0），参数可以是数组以便批量计算
+# 传入 out/scratch（r 与参数广播后的形状）时全部原地计算，不再分配临时数组，结果与表达式写法逐位相同
+def standard_core(r, params, out=None, scratch=None):
     c = 1/params['Radius']
     k = params['Conic']
-    def core(r):
+    if out is None and scratch is None:
         delta = 1-(1+k)*c**2*r**2
         delta = np.where(delta < 0, 0, delta)
+        return c*r**2/(1+np.sqrt(delta))
+    z, (t,) = _buffers(r, params, ('Radius', 'Conic'), out, scratch, 1)
+    np.square(r, out=z)
+    np.multiply((1+k)*c**2, z, out=t)
+    np.subtract(1, t, out=t)
+    np.maximum(t, 0, out=t)
+    np.sqrt(t, out=t)
+    t += 1
+    z *= c
+    z /= t
+    return z
 
-        z = c*r**2/(1+np.sqrt(delta))
-        return z 
-    z = core(r)
-    z_min = core(r_min)
-    return z - z_min + z0
-
-def offset_circle(r, params, z0):
-    r_min = r.min()
-    r_max = r.max()
+def offset_circle_core(r, params, out=None, scratch=None):
     c = 1/params['Radius']
     k = params['Conic']
     r0 = params['Center']
-    def core(r):
+    if out is None and scratch is None:
         delta = 1-(1+k)*c**2*(r-r0)**2
         delta = np.where(delta < 0, 0, delta)
-        z = c*(r-r0)**2/(1+np.sqrt(delta))
-        return z
-    z = core(r)
-    z_min = core(r_min)
-    return z - z_min + z0
-
-def even_asphere(r,params,z0): 
-    c = 1/params['Radius'] 
-    k = params['Conic'] 
-    def core(r):
-        z = c*r**2/(1+np.sqrt(1-(1+k)*c**2*r**2)) 
-        asphere = 0 
-        for i in range(params['AsphereTerm']): 
-            asphere += params['AsphereParams'][i]*r**(2*(i+1)) 
+        return c*(r-r0)**2/(1+np.sqrt(delta))
+    z, (t,) = _buffers(r, params, ('Radius', 'Conic', 'Center'), out, scratch, 1)
+    np.subtract(r, r0, out=z)
+    np.square(z, out=z)
+    np.multiply((1+k)*c**2, z, out=t)
+    np.subtract(1, t, out=t)
+    np.maximum(t, 0, out=t)
+    np.sqrt(t, out=t)
+    t += 1
+    z *= c
+    z /= t
+    return z
+
+def even_asphere_core(r, params, out=None, scratch=None):
+    c = 1/params['Radius']
+    k = params['Conic']
+    terms = params['AsphereParams'][:params['AsphereTerm']]
+    if out is None and scratch is None:
+        z = c*r**2/(1+np.sqrt(1-(1+k)*c**2*r**2))
+        asphere = 0
+        for i in range(params['AsphereTerm']):
+            asphere = asphere + params['AsphereParams'][i]*r**(2*(i+1))
         return z + asphere
-    z = core(r)
-    z_min = core(r.min())
-    return z -z_min + z0
+    shapes = dict(enumerate(terms), Radius=params['Radius'], Conic=params['Conic'])
+    z, (t, asphere) = _buffers(r, shapes, list(shapes), out, scratch, 2)
+    np.square(r, out=z)
+    np.multiply((1+k)*c**2, z, out=t)
+    np.subtract(1, t, out=t)
+    np.sqrt(t, out=t)
+    t += 1
+    z *= c
+    z /= t
+    # 高次项先单独累加再加到 z 上，求和顺序与表达式写法相同
+    asphere[...] = 0
+    for i, a in enumerate(terms):
+        if i == 0:
+            np.square(r, out=t)
+        else:
+            np.power(r, 2*(i+1), out=t)
+        t *= a
+        asphere += t
+    z += asphere
+    return z
+
+def _start(r, r_start):
+    return r.min() if r_start is None else r_start
+
+# 弧段矢高：以 r_start（默认 r.min()，即本段第一个网格点）处为基准，从 z0 开始
+def standard(r, params, z0, out=None, scratch=None, r_start=None):
+    z_min = standard_core(_start(r, r_start), params)
+    if out is None and scratch is None:
+        return standard_core(r, params) - z_min + z0
+    z = standard_core(r, params, out, scratch)
+    z -= z_min
+    z += z0
+    return z
+
+def offset_circle(r, params, z0, out=None, scratch=None, r_start=None):
+    z_min = offset_circle_core(_start(r, r_start), params)
+    if out is None and scratch is None:
+        return offset_circle_core(r, params) - z_min + z0
+    z = offset_circle_core(r, params, out, scratch)
+    z -= z_min
+    z += z0
+    return z
+
+def even_asphere(r, params, z0, out=None, scratch=None, r_start=None):
+    z_min = even_asphere_core(_start(r, r_start), params)
+    if out is None and scratch is None:
+        return even_asphere_core(r, params) - z_min + z0
+    z = even_asphere_core(r, params, out, scratch)
+    z -= z_min
+    z += z0
+    return z
 
-def line(r, params, z0):
+def line(r, params, z0, out=None, scratch=None, r_start=None):
     delta_z = params['EndZ'] - z0
-    start_r = r.min()
+    start_r = _start(r, r_start)
     delta_r = params['SemiDiameter'] - start_r
-    z = delta_z * (r - start_r) / delta_r
-    return z + z0
+    if out is None:
+        return delta_z * (r - start_r) / delta_r + z0
+    np.subtract(r, start_r, out=out)
+    out *= delta_z
+    out /= delta_r
+    out += z0
+    return out
+
+# 各类型弧段的解析斜率 dz/dr，参数与矢高函数相同
+def standard_slope(r, params, z0):
+    c = 1/params['Radius']
+    k = params['Conic']
+    delta = np.maximum(1-(1+k)*c**2*r**2, 1e-12)
+    return c*r/np.sqrt(delta)
+
+def offset_circle_slope(r, params, z0):
+    c = 1/params['Radius']
+    k = params['Conic']
+    r0 = params['Center']
+    delta = np.maximum(1-(1+k)*c**2*(r-r0)**2, 1e-12)
+    return c*(r-r0)/np.sqrt(delta)
+
+def even_asphere_slope(r, params, z0):
+    c = 1/params['Radius']
+    k = params['Conic']
+    slope = c*r/np.sqrt(1-(1+k)*c**2*r**2)
+    for i in range(params['AsphereTerm']):
+        slope = slope + 2*(i+1)*params['AsphereParams'][i]*r**(2*i+1)
+    return slope
+
+def line_slope(r, params, z0):
+    slope = (params['EndZ'] - z0) / (params['SemiDiameter'] - r.min())
+    return np.full_like(r, slope, dtype=float)
 
 TYPE_TO_FUNCTION = {
     'Standard': standard,
@@ -55,6 +165,18 @@ TYPE_TO_FUNCTION = {
     'EvenAsphere': even_asphere,
     'Line': line
 }
+TYPE_TO_CORE = {
+    'Standard': standard_core,
+    'OffsetCircle': offset_circle_core,
+    'EvenAsphere': even_asphere_core,
+}
+TYPE_TO_SLOPE = {
+    'Standard': standard_slope,
+    'OffsetCircle': offset_circle_slope,
+    'EvenAsphere': even_asphere_slope,
+    'Line': line_slope
+}
+instrument_table(TYPE_TO_FUNCTION, 'sag.', measure=lambda args, kwargs, result: (np.size(args[0]), 0))
 
 PARAMS = {
     "Standard": ['SemiDiameter', 'Radius', 'Conic', ],
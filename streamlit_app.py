@@ -1,8 +1,9 @@
 import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-from parse_jfl import * 
-from sag_calculator import * 
+from parse_jfl import build_jfl_string
+from sag_calculator import PARAMS, HELP_STRING
+from lens_generator import generate_segments
+from geometry_check import check_geometry
+from jfl_chart import chart_columns, vega_lite_spec
 import json 
 
 
@@ -14,6 +15,28 @@ st.set_page_config(
     layout="wide",menu_items=None)
 
 
+# 以参数JSON字符串为键缓存计算结果，参数不变的重跑直接复用
+@st.cache_data(max_entries=32)
+def cached_segments(design_json, step):
+    return generate_segments(json.loads(design_json), step)
+
+
+@st.cache_data(max_entries=32)
+def cached_jfl_string(design_json, step):
+    return build_jfl_string(cached_segments(design_json, step))
+
+
+@st.cache_data(max_entries=32)
+def cached_geometry(design_json, step):
+    return check_geometry(cached_segments(design_json, step))
+
+
+@st.cache_data(max_entries=128)
+def cached_chart(design_json, step, x_range=None, z_range=None):
+    columns = chart_columns(cached_segments(design_json, step), x_range=x_range, z_range=z_range)
+    return columns, vega_lite_spec(columns, x_range, z_range, brush=x_range is None)
+
+
 
 st.markdown("## 轴对称 JFL 生成器")
 st.markdown("### 输入镜片参数")
@@ -100,60 +123,6 @@ for tab, surface_id in zip(tabs,surface_id_list):
 # st.markdown('---')
 # 绘图部分
 
-surface_sag = [{} for i in range(len(surface_id_list))]
-
-try:
-    for i, surface_id in enumerate(surface_id_list):
-        r0 = st.session_state[f"{surface_id}_start_point_x"]
-        z0 = st.session_state[f"{surface_id}_start_point_z"]
-        r = np.arange(r0, lens_semidiameter, step)
-        z = np.zeros_like(r)
-        z[0] = z0
-        for seg in range(st.session_state[f"{surface_id}_弧段数"]):
-            ROI_index = (r > r0) & (r <= st.session_state[f"{surface_id}_SemiDiameter_{seg}"])
-            r_ROI = r[ROI_index]
-
-            type = st.session_state[f"{surface_id}_type_{seg}"]
-            func = TYPE_TO_FUNCTION[type]
-            params = {
-                param: st.session_state[f"{surface_id}_{param}_{seg}"]
-                for param in PARAMS[type]
-            }
-            z_ROI = func(r_ROI, params, z0)
-            z[ROI_index] = z_ROI
-            z0 = z_ROI[-1]
-            r0 = st.session_state[f"{surface_id}_SemiDiameter_{seg}"]   
-            surface_sag[i]['r'] = r
-            surface_sag[i]['z'] = z
-
-except:
-    pass 
-
-# 结果输出
-st.markdown('---')
-st.markdown("### 输出结果")
-try:
-    segments={
-        'F_XZ':np.vstack([surface_sag[0]['r'][::-1],surface_sag[0]['z'][::-1]]).T,
-        'B_XZ':np.vstack([surface_sag[1]['r'][::-1],surface_sag[1]['z'][::-1]]).T,
-        'E_XZ':np.vstack([surface_sag[2]['r'],surface_sag[2]['z']]).T,
-    }
-
-    fig = plot_jfl_segments_with_arrows(segments)
-    plt.axis('equal')
-    plot_placeholder.pyplot(fig)
-
-    jfl_string=build_jfl_string(segments)
-    download_button1 = st.download_button(
-        label="下载JFL文件",
-        data=jfl_string,
-        file_name="lens.JFL",
-        mime="text/plain",
-    )
-    
-except:
-    st.error("请填写完整参数")
-
 params_dict = {}
 params_dict["lens"] = {
     "lens_thickness": lens_thickness,
@@ -178,6 +147,41 @@ for i, surface_id in enumerate(surface_id_list):
             }
         })
 
+# 结果输出
+st.markdown('---')
+st.markdown("### 输出结果")
+try:
+    design_json = json.dumps(params_dict, sort_keys=True, ensure_ascii=False)
+
+    # 总览图为抽稀数据，框选区域后按原始分辨率重新取数显示局部放大图
+    columns, spec = cached_chart(design_json, step)
+    event = plot_placeholder.vega_lite_chart(columns, spec, use_container_width=True,
+                                             on_select="rerun", key="overview_chart")
+    zoom = event.selection.get("zoom") if event else None
+    if zoom and "x" in zoom and "z" in zoom:
+        column_output.markdown("局部放大（原始分辨率，滚轮缩放、拖动平移）")
+        columns, spec = cached_chart(design_json, step, tuple(zoom["x"]), tuple(zoom["z"]))
+        column_output.vega_lite_chart(columns, spec, use_container_width=True)
+
+    geometry = cached_geometry(design_json, step)
+    for name, points in geometry['self_intersections'].items():
+        if points:
+            column_output.warning(f"{name} 轮廓自相交 {len(points)} 处，首个交点 X={points[0][0]:.4f} Z={points[0][1]:.4f}")
+    for name, points in geometry['crossings'].items():
+        if points:
+            column_output.warning(f"{name} 轮廓相交 {len(points)} 处，首个交点 X={points[0][0]:.4f} Z={points[0][1]:.4f}")
+
+    jfl_string=cached_jfl_string(design_json, step)
+    download_button1 = st.download_button(
+        label="下载JFL文件",
+        data=jfl_string,
+        file_name="lens.JFL",
+        mime="text/plain",
+    )
+    
+except:
+    st.error("请填写完整参数")
+
 # st.json(params_dict)
 json_string = json.dumps(params_dict, indent=4)
 download_button2 = st.download_button(
@@ -0,0 +1,32 @@
+import numpy as np
+
+from design_solver import design_metrics, solve_design
+from lens_generator import make_design
+
+
+def test_solver_meets_thickness_and_sag_constraints():
+    design = make_design(0.5, 10.0, {
+        '前表面': (0.0, 0.0, [
+            {'type': 'Standard', 'params': {'Radius': 20.0, 'Conic': 0.0, 'SemiDiameter': 5.0}},
+        ]),
+        '后表面': (0.0, 0.5, [
+            {'type': 'Standard', 'params': {'Radius': 30.0, 'Conic': 0.0, 'SemiDiameter': 5.0}},
+        ]),
+        '边缘': (4.9, 0.5, [
+            {'type': 'Line', 'params': {'EndZ': 0.8, 'SemiDiameter': 5.0}},
+        ]),
+    })
+    variables = [
+        {'path': ('后表面', 'segments', 0, 'params', 'Radius'), 'bounds': (10.0, 40.0)},
+        {'paths': [('lens', 'lens_thickness'), ('后表面', 'start_point_z')], 'bounds': (0.2, 0.8)},
+    ]
+    constraints = {'center_thickness': {'target': 0.3, 'tol': 1e-3}, 'back_sag': {'min': 0.8, 'max': 0.9}}
+    solved, info = solve_design(design, variables, constraints, step=0.01, population=128)
+    assert info['feasible']
+    metrics = design_metrics(solved, list(constraints), 0.01)
+    assert metrics == info['metrics']
+    assert abs(metrics['center_thickness'] - 0.3) <= 1e-3
+    assert 0.8 <= metrics['back_sag'] <= 0.9
+    assert solved['lens']['lens_thickness'] == solved['后表面']['start_point_z']
+    # 输入设计不被修改
+    assert design['后表面']['segments'][0]['params']['Radius'] == 30.0
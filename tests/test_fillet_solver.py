@@ -0,0 +1,46 @@
+import numpy as np
+
+from fillet_solver import PlacedSegments, fillet_design, segment_starts
+from lens_generator import make_design
+
+
+def _sharp_design():
+    # 球面与陡直线相接处为凹角
+    return make_design(0.5, 10.0, {
+        '前表面': (0.0, 0.0, [
+            {'type': 'Standard', 'params': {'Radius': 20.0, 'Conic': 0.0, 'SemiDiameter': 3.0}},
+            {'type': 'Line', 'params': {'EndZ': 1.3, 'SemiDiameter': 5.0}},
+        ]),
+        '后表面': (0.0, 0.5, [
+            {'type': 'Standard', 'params': {'Radius': 30.0, 'Conic': 0.0, 'SemiDiameter': 5.0}},
+        ]),
+        '边缘': (4.9, 0.5, [
+            {'type': 'Line', 'params': {'EndZ': 0.8, 'SemiDiameter': 5.0}},
+        ]),
+    })
+
+
+def test_fillet_is_tangent_to_both_neighbours():
+    design, report = fillet_design(_sharp_design(), {'前表面': {0: 0.5}})
+    assert len(report) == 1 and report[0]['ok']
+    surface = design['前表面']
+    assert [s['type'] for s in surface['segments']] == ['Standard', 'OffsetCircle', 'Line']
+    assert surface['num_of_segments'] == 3
+    t1, t2 = report[0]['t1'], report[0]['t2']
+    assert t1 < 3.0 < t2
+
+    starts = segment_starts(surface)
+    curve = PlacedSegments(surface['segments'], starts)
+    z1, slope1 = curve(np.array([t1, t1, t1]))
+    z2, slope2 = curve(np.array([t2, t2, t2]))
+    assert np.isclose(z1[0], z1[1], atol=1e-9) and np.isclose(slope1[0], slope1[1], atol=1e-6)
+    assert np.isclose(z2[1], z2[2], atol=1e-9) and np.isclose(slope2[1], slope2[2], atol=1e-6)
+    # 直线终点不变
+    assert surface['segments'][2]['params']['EndZ'] == 1.3
+
+
+def test_fillet_too_large_is_left_sharp():
+    sharp = _sharp_design()
+    design, report = fillet_design(sharp, {'前表面': {0: 50.0}})
+    assert not report[0]['ok']
+    assert design['前表面'] == sharp['前表面']
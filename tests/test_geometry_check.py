@@ -0,0 +1,20 @@
+import numpy as np
+
+from geometry_check import segment_intersections, min_clearance
+
+
+def test_min_clearance_single_segments():
+    distance, point_a, point_b = min_clearance([[0.0, 0.0], [1.0, 0.0]], [[0.0, 1.0], [1.0, 2.0]])
+    assert distance == 1.0
+    assert point_a.tolist() == [0.0, 0.0]
+    assert point_b.tolist() == [0.0, 1.0]
+
+
+def test_long_segment_is_bucketed_along_the_line():
+    x = np.linspace(0.0, 10.0, 20000)
+    profile = np.vstack([np.column_stack([x, 0.01 * np.sin(x)]), [[0.0, -5.0]]])
+    crossing = np.array([[5.0, -3.0], [5.0, 3.0]])
+    hits = segment_intersections([profile, crossing])
+    # 竖线与曲线本身、与闭合长斜线各交一次
+    assert len(hits) == 2
+    assert np.allclose(np.sort(hits[:, 5]), [(0.01 * np.sin(10.0) - 5.0) / 2, 0.01 * np.sin(5.0)], atol=1e-6)
@@ -0,0 +1,45 @@
+import numpy as np
+
+from parse_jfl import JFL_HEADER, build_jfl_string
+from jfl_catalog import JFLCatalog, read_jfl_header
+
+
+def _negative_sag_segments():
+    x = np.linspace(5.0, 0.0, 50)
+    return {'F_XZ': np.column_stack([x, -0.02 * x**2]),
+            'B_XZ': np.column_stack([x, 0.3 - 0.01 * x**2])}
+
+
+def test_header_of_negative_z_file(tmp_path):
+    path = tmp_path / 'negative.JFL'
+    path.write_text(build_jfl_string(_negative_sag_segments()))
+    assert read_jfl_header(str(path)) == JFL_HEADER.splitlines()
+
+
+def test_catalog_negative_z_file(tmp_path):
+    path = tmp_path / 'negative.JFL'
+    path.write_text(build_jfl_string(_negative_sag_segments()))
+    with JFLCatalog(str(tmp_path / 'catalog.db')) as catalog:
+        catalog.update([str(path)])
+        info = catalog.file_info(str(path))
+    assert info['header'] == JFL_HEADER.splitlines()
+    front = next(s for s in info['segments'] if s['name'] == 'F_XZ')
+    assert front['n_points'] == 50
+    assert np.isclose(front['z_min'], -0.5)
+
+
+def test_prune_leaves_sibling_directories_alone(tmp_path):
+    segments = _negative_sag_segments()
+    paths = {}
+    for directory in ('a_b', 'aXb', 'foo', 'Foo'):
+        (tmp_path / directory).mkdir()
+        paths[directory] = tmp_path / directory / 'lens.JFL'
+        paths[directory].write_text(build_jfl_string(segments))
+    with JFLCatalog(str(tmp_path / 'catalog.db')) as catalog:
+        catalog.update([str(tmp_path)])
+        paths['a_b'].unlink()
+        paths['foo'].unlink()
+        result = catalog.update([str(tmp_path / 'a_b'), str(tmp_path / 'foo')], prune=True)
+        remaining = {row['path'] for row in catalog.sql('SELECT path FROM files')}
+    assert result['pruned'] == 2
+    assert remaining == {str(paths['aXb']), str(paths['Foo'])}
@@ -0,0 +1,46 @@
+import numpy as np
+
+from jfl_export import dxf_string, export_segments
+from lens_generator import generate_segments
+from benchmarks.synthetic import synthetic_design
+
+
+def _dxf_entities(text):
+    '''LWPOLYLINE entities of a DXF string as (layer, vertex count, vertices).'''
+    lines = text.split('\n')
+    pairs = list(zip(lines[0::2], lines[1::2]))
+    entities = []
+    for code, value in pairs:
+        if code == '0' and value == 'LWPOLYLINE':
+            entities.append({'layer': None, 'count': None, 'x': [], 'y': []})
+        elif entities and code == '8':
+            entities[-1]['layer'] = value
+        elif entities and code == '90':
+            entities[-1]['count'] = int(value)
+        elif entities and code == '10':
+            entities[-1]['x'].append(float(value))
+        elif entities and code == '20':
+            entities[-1]['y'].append(float(value))
+    return pairs, entities
+
+
+def test_dxf_has_one_polyline_per_segment():
+    segments = generate_segments(synthetic_design(), 0.01)
+    segments['B_XZW'] = np.column_stack([segments['B_XZ'], np.ones(len(segments['B_XZ']))])
+    pairs, entities = _dxf_entities(dxf_string(segments))
+    assert pairs[-1] == ('0', 'EOF')
+    assert [entity['layer'] for entity in entities] == list(segments)
+    for entity, coords in zip(entities, segments.values()):
+        assert entity['count'] == len(coords) == len(entity['x'])
+        assert np.allclose(entity['x'], coords[:, 0], rtol=0, atol=1e-9)
+        assert np.allclose(entity['y'], coords[:, 1], rtol=0, atol=1e-9)
+
+
+def test_npz_round_trip(tmp_path):
+    segments = generate_segments(synthetic_design(), 0.01)
+    path = str(tmp_path / 'lens.npz')
+    export_segments(segments, path)
+    with np.load(path) as data:
+        assert set(data.files) == set(segments)
+        for name, coords in segments.items():
+            assert np.array_equal(data[name], coords)
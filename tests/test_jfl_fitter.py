@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from jfl_fitter import fit_jfl_segments
+from lens_generator import make_design, generate_segments
+
+
+def _design():
+    return make_design(0.5, 10.0, {
+        '前表面': (0.0, 0.0, [
+            {'type': 'Standard', 'params': {'Radius': 20.0, 'Conic': 0.0, 'SemiDiameter': 3.0}},
+            {'type': 'Line', 'params': {'EndZ': 0.5, 'SemiDiameter': 5.0}},
+        ]),
+        '后表面': (0.0, 0.5, [
+            {'type': 'Standard', 'params': {'Radius': 30.0, 'Conic': 0.0, 'SemiDiameter': 5.0}},
+        ]),
+        '边缘': (4.9, 0.5, [
+            {'type': 'Line', 'params': {'EndZ': 0.8, 'SemiDiameter': 5.0}},
+        ]),
+    })
+
+
+def test_round_trip_ending_in_line():
+    step = 0.0025
+    segments = generate_segments(_design(), step)
+    fitted, report = fit_jfl_segments(segments, return_report=True)
+    assert report['converged']
+    assert max(report['max_deviation'].values()) < 1e-5
+
+    front = fitted['前表面']['segments']
+    assert front[-1]['type'] == 'Line'
+    assert abs(front[-1]['params']['EndZ'] - 0.5) < 1e-5
+    for name, coords in generate_segments(fitted, step).items():
+        assert coords.shape == segments[name].shape
+        assert np.abs(coords[:, 1] - segments[name][:, 1]).max() < 1e-5
+
+
+def test_non_representable_profile_is_reported():
+    step = 0.0025
+    segments = generate_segments(_design(), step)
+    # 叠加的波纹无法由任何面型表示
+    B = segments['B_XZ'].copy()
+    B[:, 1] += 0.02 * np.sin(3 * B[:, 0])**3
+    segments['B_XZ'] = B
+    with pytest.warns(RuntimeWarning, match='did not reach tol'):
+        fitted, report = fit_jfl_segments(segments, return_report=True)
+    assert not report['converged']
+    assert report['max_deviation']['后表面'] > 1e-3
+    assert report['max_deviation']['前表面'] < 1e-5
@@ -0,0 +1,38 @@
+import numpy as np
+
+from jfl_random_access import JFLReader
+from lens_generator import generate_segments
+from parse_jfl import save_jfl_file, parse_jfl_file
+from benchmarks.synthetic import synthetic_design
+
+
+def _write(tmp_path):
+    segments = generate_segments(synthetic_design(), 0.01)
+    segments['B_XZW'] = np.column_stack([segments['B_XZ'], np.linspace(0.0, 1.0, len(segments['B_XZ']))])
+    path = str(tmp_path / 'lens.JFL')
+    save_jfl_file(segments, path)
+    return path
+
+
+def test_slices_match_parse_jfl_file(tmp_path):
+    path = _write(tmp_path)
+    parsed = parse_jfl_file(path)
+    with JFLReader(path, verify=True) as reader:
+        assert set(reader.index) == set(parsed)
+        for name, coords in parsed.items():
+            assert reader.n_points(name) == len(coords)
+            assert np.array_equal(reader.get_points(name), coords)
+            for start, stop in ((0, 1), (17, 250), (-5, None), (40, 10)):
+                assert np.array_equal(reader.get_points(name, start, stop), coords[start:stop]), (name, start, stop)
+
+
+def test_x_lookup_on_decreasing_block(tmp_path):
+    path = _write(tmp_path)
+    front = parse_jfl_file(path)['F_XZ']
+    with JFLReader(path) as reader:
+        # F_XZ 按 X 递减排列
+        i = reader.index_of_x('F_XZ', 2.5)
+        assert front[i, 0] <= 2.5 < front[i - 1, 0]
+        points = reader.get_x_range('F_XZ', 1.0, 2.0)
+        expected = front[(front[:, 0] >= 1.0) & (front[:, 0] <= 2.0)]
+        assert np.array_equal(points, expected)
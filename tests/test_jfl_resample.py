@@ -0,0 +1,22 @@
+import numpy as np
+
+from parse_jfl import JFL_HEADER, parse_jfl_file, build_jfl_string
+from jfl_resample import resample_jfl_file
+
+
+def test_resample_negative_z_file_keeps_header(tmp_path):
+    x = np.linspace(5.0, 0.0, 200)
+    segments = {'F_XZ': np.column_stack([x, -0.02 * x**2]),
+                'B_XZ': np.column_stack([x, 0.3 - 0.01 * x**2])}
+    source = tmp_path / 'negative.JFL'
+    target = tmp_path / 'resampled.JFL'
+    source.write_text(build_jfl_string(segments))
+    resample_jfl_file(str(source), str(target), n_points=101)
+
+    text = target.read_text()
+    assert text.startswith(JFL_HEADER + 'F\n')
+    resampled = parse_jfl_file(str(target))
+    assert sorted(resampled) == ['B_XZ', 'F_XZ']
+    assert len(resampled['F_XZ']) == 101
+    assert np.allclose(resampled['F_XZ'][[0, -1]], segments['F_XZ'][[0, -1]])
+    assert resampled['F_XZ'][:, 1].min() < 0
@@ -0,0 +1,39 @@
+import asyncio
+import json
+import os
+import signal
+
+from jfl_service import JFLService
+from benchmarks.synthetic import synthetic_design
+
+
+def _post(service, body, query=''):
+    return asyncio.run(service._dispatch('POST', '/jfl' + query, body))
+
+
+def test_bad_step_and_malformed_design_are_rejected():
+    service = JFLService(max_workers=1, max_points=100_000)
+    try:
+        body = json.dumps(synthetic_design()).encode()
+        for query in ('?step=0', '?step=-0.001', '?step=nan', '?step=inf', '?step=1e-9'):
+            status, _, payload, _ = _post(service, body, query)
+            assert status == 400, (query, payload)
+        design = synthetic_design()
+        del design['lens']['lens_semidiameter']
+        status, _, payload, _ = _post(service, json.dumps(design).encode())
+        assert status == 400 and b'lens_semidiameter' in payload
+        assert _post(service, body, '?step=0.01')[0] == 200
+    finally:
+        service.close()
+
+
+def test_pool_is_restarted_after_a_worker_dies():
+    service = JFLService(max_workers=1)
+    try:
+        os.kill(service.executor.submit(os.getpid).result(), signal.SIGKILL)
+        body = json.dumps(synthetic_design()).encode()
+        assert _post(service, body, '?step=0.01')[0] == 500
+        assert service.counters['pool_restarts'] == 1
+        assert _post(service, body, '?step=0.01')[0] == 200
+    finally:
+        service.close()
@@ -0,0 +1,37 @@
+import os
+
+from jfl_store import JFLStore, store_key
+from lens_generator import build_jfl_bytes
+from benchmarks.synthetic import synthetic_design
+
+
+def test_round_trip_and_lru_eviction(tmp_path):
+    store = JFLStore(str(tmp_path / 'store'))
+    designs = [synthetic_design(seed=seed) for seed in range(4)]
+    data = [build_jfl_bytes(design, 0.01) for design in designs]
+    assert store.get_bytes(designs[0], 0.01) == data[0]
+    assert store.get_bytes(designs[0], 0.01) == data[0]
+    assert store.counters['hits'] == 1 and store.counters['misses'] == 1
+
+    # 上限只够放两个对象：写入第三个时淘汰最久未用的
+    size = max(len(d) for d in data)
+    store = JFLStore(str(tmp_path / 'lru'), max_bytes=2 * size + size // 2, low_water=1.0)
+    for i, design in enumerate(designs[:2]):
+        path = store.get(design, 0.01)
+        os.utime(path, (i, i))
+    store.get(designs[2], 0.01)
+    assert store.lookup(designs[0], 0.01) is None
+    assert store.lookup(designs[1], 0.01) is not None
+    assert store.lookup(designs[2], 0.01) is not None
+    assert store.counters['evictions'] == 1
+    assert store.total_bytes == store.size() == len(data[1]) + len(data[2])
+
+
+def test_running_total_survives_restart_and_overwrite(tmp_path):
+    root = str(tmp_path / 'store')
+    design = synthetic_design()
+    store = JFLStore(root)
+    store.get(design, 0.01)
+    store.put(store_key(design, 0.01), build_jfl_bytes(design, 0.01))
+    assert store.total_bytes == store.size()
+    assert JFLStore(root).total_bytes == store.total_bytes
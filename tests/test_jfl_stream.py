@@ -0,0 +1,19 @@
+from jfl_stream import iter_jfl_chunks, save_jfl_stream
+from lens_generator import generate_segments
+from parse_jfl import build_jfl_string, open_jfl
+from benchmarks.synthetic import synthetic_design
+
+
+def test_stream_equals_build_jfl_string():
+    for seed, chunk_points in enumerate((1, 7, 4096)):
+        design = synthetic_design(n_segments=2 + seed, seed=seed)
+        expected = build_jfl_string(generate_segments(design, 0.01))
+        assert b''.join(iter_jfl_chunks(design, 0.01, chunk_points)).decode('ascii') == expected
+
+
+def test_compressed_stream_file(tmp_path):
+    design = synthetic_design()
+    path = str(tmp_path / 'lens.JFL.gz')
+    save_jfl_stream(design, path, 0.01, chunk_points=100)
+    with open_jfl(path, 'r') as file:
+        assert file.read() == build_jfl_string(generate_segments(design, 0.01))
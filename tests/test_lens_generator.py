@@ -0,0 +1,37 @@
+import numpy as np
+
+from lens_generator import SURFACE_ID_LIST, SURFACE_TO_SEGMENT, generate_segments, generate_surface_sag
+from benchmarks.synthetic import synthetic_design
+
+
+def test_segments_match_per_segment_evaluation_bit_for_bit():
+    # with_slope=True 仍按弧段掩码逐段计算，是原地计算路径的参照
+    for seed in range(40):
+        design = synthetic_design(n_segments=1 + seed % 6, seed=seed)
+        segments = generate_segments(design, 0.001)
+        for surface_id in SURFACE_ID_LIST:
+            r, z, _ = generate_surface_sag(design[surface_id], design['lens']['lens_semidiameter'], 0.001,
+                                           with_slope=True)
+            name = SURFACE_TO_SEGMENT[surface_id]
+            expected = np.column_stack([r, z]) if name == 'E' else np.column_stack([r[::-1], z[::-1]])
+            assert np.array_equal(segments[name + '_XZ'], expected, equal_nan=True), (seed, name)
+
+
+def test_plan_probes_are_not_counted_as_sag_calls():
+    import instrumentation
+    from lens_generator import SurfacePlan
+    design = synthetic_design(n_segments=4)
+    surface = design['前表面']
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        plan = SurfacePlan(surface, design['lens']['lens_semidiameter'], 0.001)
+        assert not any(stage.startswith('sag.') for stage in instrumentation.stats())
+        plan.evaluate(0, plan.n)
+        sag = {stage: entry for stage, entry in instrumentation.stats().items() if stage.startswith('sag.')}
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+    # 起点 r0 不属于任何弧段
+    assert sum(entry['points'] for entry in sag.values()) == sum(hi - lo for lo, hi, *_ in plan.segments)
+    assert sum(entry['calls'] for entry in sag.values()) == len(plan.segments)
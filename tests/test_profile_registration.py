@@ -0,0 +1,22 @@
+import numpy as np
+
+from profile_registration import PolylineProfile, register_profile
+
+
+def test_polyline_registration_converges():
+    # 非球面：球面绕球心旋转不变，无法唯一确定倾角
+    def sag(r):
+        return r**2 / 40 + 1e-3 * r**4
+
+    x = np.linspace(0.0, 5.0, 20001)
+    reference = PolylineProfile(np.column_stack([x, sag(x)]), mirror=True)
+    rng = np.random.default_rng(0)
+    u = np.linspace(-4.5, 4.5, 5000)
+    z = sag(u) + rng.normal(0, 1e-4, len(u))
+    c, s = np.cos(1e-3), np.sin(1e-3)
+    trace = np.column_stack([c * u - s * z + 0.01, s * u + c * z - 0.02])
+    _, _, info = register_profile(trace, reference)
+    assert info['converged']
+    assert info['iterations'] < 20
+    assert abs(info['theta'] + 1e-3) < 1e-5
+    assert info['rms'] < 2e-4
@@ -0,0 +1,14 @@
+import numpy as np
+
+from thickness import batch_thickness_report, thickness_report
+
+
+def test_batch_matches_single_lens_for_profiles_away_from_axis():
+    x = np.linspace(2.0, 8.0, 601)
+    F_list = [np.column_stack([x, 0.01 * (x - 2) ** 2]), np.column_stack([x, 0.02 * (x - 2) ** 2])]
+    B_list = [np.column_stack([x, 1.0 - 0.005 * (x - 2) ** 2]), np.column_stack([x, 1.2 - 0.004 * (x - 2) ** 2])]
+    batch = batch_thickness_report(F_list, B_list)
+    for i, (F, B) in enumerate(zip(F_list, B_list)):
+        single = thickness_report(F, B)
+        for key, value in single.items():
+            assert np.isclose(batch[key][i], value), key
@@ -0,0 +1,33 @@
+import numpy as np
+
+from tolerance_analysis import sensitivity
+
+
+def test_constant_metric_has_no_variance_share():
+    rng = np.random.default_rng(0)
+    deltas = rng.normal(0.0, 1e-3, (2000, 3))
+    # 与扰动无关、只有舍入噪声的指标
+    values = 1.2345 + (deltas[:, 0] * 1e-3 - deltas[:, 0] * 1e-3) + np.where(deltas[:, 1] > 0, 2e-16, 0.0)
+    rows = sensitivity(deltas, values, ['a', 'b', 'c'])
+    assert len(rows) == 3
+    assert all(row['variance_share'] == 0.0 for row in rows)
+
+
+def test_variance_share_of_linear_metric():
+    rng = np.random.default_rng(1)
+    deltas = rng.normal(0.0, 1e-3, (5000, 2))
+    values = 1.0 + 3.0 * deltas[:, 0] + 1.0 * deltas[:, 1]
+    rows = sensitivity(deltas, values, ['a', 'b'])
+    assert rows[0]['parameter'] == 'a'
+    assert np.isclose(sum(row['variance_share'] for row in rows), 1.0, atol=0.05)
+    assert np.isclose(rows[0]['slope'], 3.0)
+
+
+def test_small_but_real_effect_keeps_its_share():
+    rng = np.random.default_rng(2)
+    deltas = rng.normal(0.0, 1e-3, (2000, 2))
+    # 标准差约 1e-10，远小于 sqrt(eps) * 均值，但远大于舍入噪声
+    values = 1.0 + 1e-7 * deltas[:, 0]
+    rows = sensitivity(deltas, values, ['a', 'b'])
+    assert rows[0]['parameter'] == 'a'
+    assert rows[0]['variance_share'] > 0.9
@@ -0,0 +1,51 @@
+import numpy as np
+
+from lens_generator import make_design, generate_segments
+from tool_compensation import compensate_design, compensate_segments, compensate_profile
+from benchmarks.synthetic import synthetic_pocket_profile
+
+TOOL_RADIUS = 0.5
+
+
+def _meniscus():
+    # 两面同为 R=10、中心厚 0.2 的等厚弯月镜片
+    return make_design(0.2, 6.0, {
+        '前表面': (0.0, 0.0, [{'type': 'Standard', 'params': {'Radius': 10.0, 'Conic': 0.0, 'SemiDiameter': 3.0}}]),
+        '后表面': (0.0, 0.2, [{'type': 'Standard', 'params': {'Radius': 10.0, 'Conic': 0.0, 'SemiDiameter': 3.0}}]),
+        '边缘': (2.9, 0.65, [{'type': 'Line', 'params': {'EndZ': 0.66, 'SemiDiameter': 3.0}}]),
+    })
+
+
+def _assert_outside_band(segments):
+    front = segments['F_XZ'][::-1]
+    back = segments['B_XZ'][::-1]
+    f_path = segments['F_XZW']
+    b_path = segments['B_XZW']
+    inside = (f_path[:, 0] <= front[-1, 0])
+    assert np.all(f_path[inside, 1] < np.interp(f_path[inside, 0], front[:, 0], front[:, 1]))
+    inside = (b_path[:, 0] <= back[-1, 0])
+    assert np.all(b_path[inside, 1] > np.interp(b_path[inside, 0], back[:, 0], back[:, 1]))
+    # 刀心到两面的距离都不小于刀具半径
+    for path in (f_path, b_path):
+        for surface in (front, back):
+            distance = np.hypot(path[:, None, 0] - surface[None, ::5, 0], path[:, None, 1] - surface[None, ::5, 1])
+            assert distance.min() > TOOL_RADIUS * (1 - 1e-3)
+
+
+def test_design_compensation_stays_outside_material():
+    segments, _ = compensate_design(_meniscus(), TOOL_RADIUS, step=0.01)
+    _assert_outside_band(segments)
+    assert np.all(segments['E_XZW'][:, 0] >= segments['E_XZ'][:, 0].min())
+
+
+def test_segment_compensation_stays_outside_material():
+    segments, _ = compensate_segments(generate_segments(_meniscus(), 0.01), TOOL_RADIUS)
+    _assert_outside_band(segments)
+
+
+def test_pocket_tighter_than_tool_is_not_gouged():
+    profile = synthetic_pocket_profile(20000)
+    xzw, info = compensate_profile(profile, 0.8)
+    assert info['loops'] >= 1
+    distance = np.hypot(xzw[::20, None, 0] - profile[None, ::4, 0], xzw[::20, None, 1] - profile[None, ::4, 1])
+    assert distance.min() > 0.8 * (1 - 1e-3)
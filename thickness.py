@@ -0,0 +1,120 @@
+import numpy as np
+from lens_generator import STEP, generate_segments
+
+
+def _ascending(coords):
+    coords = np.asarray(coords, dtype=float)
+    if len(coords) > 1 and coords[0, 0] > coords[-1, 0]:
+        coords = coords[::-1]
+    return coords[:, 0], coords[:, 1]
+
+
+def _merge_grids(xf, xb):
+    '''Merge two sorted X grids, keeping only the range covered by both surfaces.'''
+    lo = max(xf[0], xb[0])
+    hi = min(xf[-1], xb[-1])
+    # 两段已排序，stable 排序(timsort)按两个有序段合并，为 O(N + M)
+    x = np.sort(np.concatenate([xf, xb]), kind='stable')
+    x = x[(x >= lo) & (x <= hi)]
+    return x[np.concatenate([[True], np.diff(x) > 0])]
+
+
+def thickness_profile(F_XZ, B_XZ):
+    '''
+    Thickness of the lens along the radius, Z(B) - Z(F).
+
+    Args:
+    F_XZ (ndarray): Front surface points (N, 2), in any X order.
+    B_XZ (ndarray): Back surface points (M, 2), in any X order.
+
+    Returns (x, thickness) on the merged X grid of both surfaces.
+    '''
+    xf, zf = _ascending(F_XZ)
+    xb, zb = _ascending(B_XZ)
+    x = _merge_grids(xf, xb)
+    return x, np.interp(x, xb, zb) - np.interp(x, xf, zf)
+
+
+def thickness_report(F_XZ, B_XZ, min_thickness=None):
+    '''
+    Summarize the thickness profile of one lens.
+
+    Returns a dict with the center thickness, the minimum and maximum
+    thickness with their radius, and, if min_thickness is given, whether
+    the lens never drops below it.
+    '''
+    x, t = thickness_profile(F_XZ, B_XZ)
+    i_min = np.argmin(t)
+    i_max = np.argmax(t)
+    report = {
+        'center_thickness': float(t[0]),
+        'min_thickness': float(t[i_min]),
+        'min_thickness_x': float(x[i_min]),
+        'max_thickness': float(t[i_max]),
+        'max_thickness_x': float(x[i_max]),
+    }
+    if min_thickness is not None:
+        report['ok'] = bool(t[i_min] >= min_thickness)
+    return report
+
+
+def batch_thickness_report(F_list, B_list, min_thickness=None):
+    '''
+    Thickness summary for a family of lenses in one vectorized pass.
+
+    Every lens is shifted to its own X band so that all profiles can be
+    merged, interpolated and reduced as a single flat array.
+
+    Returns a dict of arrays with one entry per lens, keys as thickness_report.
+    '''
+    xf_list, zf_list = zip(*[_ascending(F) for F in F_list])
+    xb_list, zb_list = zip(*[_ascending(B) for B in B_list])
+    n_lens = len(xf_list)
+    lo = np.maximum([x[0] for x in xf_list], [x[0] for x in xb_list])
+    hi = np.minimum([x[-1] for x in xf_list], [x[-1] for x in xb_list])
+    if np.any(hi < lo):
+        raise ValueError("front and back surfaces do not overlap in X")
+    # 先减去全局最小 X，每片镜片落在 [i*span, (i+1)*span) 内，与 X 的起点无关
+    x_min = min(x[0] for x in xf_list + xb_list)
+    span = max(x[-1] for x in xf_list + xb_list) - x_min + 1.0
+    offset = span * np.arange(n_lens) - x_min
+
+    xf = np.concatenate([x + o for x, o in zip(xf_list, offset)])
+    xb = np.concatenate([x + o for x, o in zip(xb_list, offset)])
+    zf = np.concatenate(zf_list)
+    zb = np.concatenate(zb_list)
+
+    x = np.sort(np.concatenate([xf, xb]), kind='stable')
+    x = x[np.concatenate([[True], np.diff(x) > 0])]
+    lens_id = np.clip((x // span).astype(int), 0, n_lens - 1)
+    local_x = x - offset[lens_id]
+    keep = (local_x >= lo[lens_id]) & (local_x <= hi[lens_id])
+    x, local_x, lens_id = x[keep], local_x[keep], lens_id[keep]
+    t = np.interp(x, xb, zb) - np.interp(x, xf, zf)
+
+    starts = np.flatnonzero(np.concatenate([[True], np.diff(lens_id) > 0]))
+    counts = np.diff(np.append(starts, len(t)))
+    t_min = np.minimum.reduceat(t, starts)
+    t_max = np.maximum.reduceat(t, starts)
+    hits_min = np.flatnonzero(t == np.repeat(t_min, counts))
+    hits_max = np.flatnonzero(t == np.repeat(t_max, counts))
+    i_min = hits_min[np.unique(lens_id[hits_min], return_index=True)[1]]
+    i_max = hits_max[np.unique(lens_id[hits_max], return_index=True)[1]]
+
+    report = {
+        'center_thickness': t[starts],
+        'min_thickness': t_min,
+        'min_thickness_x': local_x[i_min],
+        'max_thickness': t_max,
+        'max_thickness_x': local_x[i_max],
+    }
+    if min_thickness is not None:
+        report['ok'] = t_min >= min_thickness
+    return report
+
+
+def design_thickness_report(designs, step=STEP, min_thickness=None):
+    '''Generate each lens JSON and evaluate the thickness of the whole family.'''
+    segments = [generate_segments(design, step) for design in designs]
+    return batch_thickness_report([s['F_XZ'] for s in segments], [s['B_XZ'] for s in segments],
+                                  min_thickness=min_thickness)
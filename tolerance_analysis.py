@@ -0,0 +1,274 @@
+'''
+Monte Carlo tolerance analysis of lens JSON designs.
+
+    tolerances = [
+        {'path': ('前表面', 'segments', 0, 'params', 'Radius'), 'tol': 0.002, 'relative': True},
+        {'path': ('前表面', 'segments', 0, 'params', 'AsphereParams', 1), 'tol': 1e-5},
+        # 中心厚：后表面整体沿 Z 平移，Line 段的 EndZ 是绝对坐标，需要一起写入
+        {'name': 'thickness', 'paths': [('lens', 'lens_thickness'), ('后表面', 'start_point_z'),
+                                        ('后表面', 'segments', 1, 'params', 'EndZ')], 'tol': 0.01},
+    ]
+    result = tolerance_analysis(design, tolerances, n_samples=20000)
+    print(format_report(result))
+
+Every tolerance draws one perturbation per sample, normal with sigma =
+tol / 3 (or uniform in +-tol), added to the nominal value of each of its
+paths. The perturbed designs are evaluated with generate_surface_sag_batch,
+which broadcasts the sag_calculator functions over (samples, grid) arrays,
+in chunks sized so that the working arrays fit in memory_mb. Surfaces that
+no tolerance touches are evaluated once.
+
+Metrics are the design_solver METRICS plus the largest form deviation of
+each surface from the nominal design (sag relative to the surface start
+point, so a pure Z shift does not count). The report gives percentiles per metric,
+the yield against optional limits, and a sensitivity ranking from a linear
+regression of each metric on the perturbations.
+'''
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from lens_generator import STEP, SURFACE_ID_LIST, SURFACE_TO_SEGMENT, generate_surface_sag_batch
+from design_solver import FIXED_KEYS, METRICS, get_path, set_path, constraint_loss
+
+DEVIATION_METRICS = {'front_sag_deviation': 'F', 'back_sag_deviation': 'B', 'edge_sag_deviation': 'E'}
+DEFAULT_METRICS = ('center_thickness', 'edge_height', 'front_sag_deviation', 'back_sag_deviation')
+PERCENTILES = (0.135, 2.275, 50, 97.725, 99.865)
+# 每个候选、每个网格点同时存在的 float64 工作数组个数（z、分段矢高、core 中间量等）的估计
+WORK_ARRAYS = 10
+# 标准差不超过 ROUNDING_ULPS * eps * |均值| 的指标视为常数
+ROUNDING_ULPS = 64
+
+
+def _paths(tolerance):
+    paths = [tuple(path) for path in tolerance['paths']] if 'paths' in tolerance else [tuple(tolerance['path'])]
+    for path in paths:
+        if FIXED_KEYS & set(path):
+            raise ValueError(f"{path} defines the sampling grid and cannot be toleranced")
+    return paths
+
+
+def tolerance_name(tolerance):
+    return tolerance.get('name') or '/'.join(str(key) for key in _paths(tolerance)[0])
+
+
+def sample_perturbations(design, tolerances, n_samples, seed=0):
+    '''
+    (n_samples, n_tolerances) array of perturbations.
+
+    A tolerance is {'path' or 'paths', 'tol', optional 'distribution' ('normal',
+    the default, with sigma = tol / 3, or 'uniform' in +-tol), 'sigma' to override,
+    and 'relative': True to scale tol by the nominal value of its first path}.
+    '''
+    rng = np.random.default_rng(seed)
+    deltas = np.empty((n_samples, len(tolerances)))
+    for j, tolerance in enumerate(tolerances):
+        scale = abs(get_path(design, _paths(tolerance)[0])) if tolerance.get('relative') else 1.0
+        tol = tolerance['tol'] * scale
+        if tolerance.get('distribution', 'normal') == 'uniform':
+            deltas[:, j] = rng.uniform(-tol, tol, n_samples)
+        else:
+            deltas[:, j] = rng.normal(0.0, tolerance.get('sigma', tolerance['tol'] / 3) * scale, n_samples)
+    return deltas
+
+
+def perturb_design(design, tolerances, deltas):
+    '''Copy of design where every toleranced value is an (N, 1) array nominal + delta.'''
+    batch = _copy_structure(design)
+    for tolerance, delta in zip(tolerances, np.asarray(deltas, dtype=float).T):
+        for path in _paths(tolerance):
+            set_path(batch, path, get_path(design, path) + delta.reshape(-1, 1))
+    return batch
+
+
+def _copy_structure(design):
+    '''Deep copy of the dict/list skeleton; numbers are shared.'''
+    if isinstance(design, dict):
+        return {key: _copy_structure(value) for key, value in design.items()}
+    if isinstance(design, list):
+        return [_copy_structure(value) for value in design]
+    return design
+
+
+def _touched_surfaces(tolerances):
+    return {path[0] for tolerance in tolerances for path in _paths(tolerance)}
+
+
+def evaluate_surfaces(design, step=STEP, surface_ids=SURFACE_ID_LIST):
+    '''{segment letter: (r, z)} of a (possibly batched) design; z is (N, M).'''
+    semidiameter = design["lens"]["lens_semidiameter"]
+    return {SURFACE_TO_SEGMENT[surface_id]: generate_surface_sag_batch(design[surface_id], semidiameter, step)
+            for surface_id in surface_ids}
+
+
+def evaluate_metrics(design, tolerances, deltas, metric_names, nominal, step=STEP):
+    '''
+    Metrics of one chunk of perturbations as a dict of (N,) arrays.
+
+    nominal is evaluate_surfaces of the unperturbed design; surfaces without a
+    tolerance reuse it.
+    '''
+    n = len(deltas)
+    touched = _touched_surfaces(tolerances)
+    batch = perturb_design(design, tolerances, deltas)
+    surfaces = dict(nominal)
+    surfaces.update(evaluate_surfaces(batch, step, [s for s in SURFACE_ID_LIST if s in touched]))
+    surfaces = {name: (r, np.broadcast_to(z, (n, z.shape[1]))) for name, (r, z) in surfaces.items()}
+    metrics = {}
+    for name in metric_names:
+        if name in DEVIATION_METRICS:
+            segment = DEVIATION_METRICS[name]
+            z, z_nominal = surfaces[segment][1], nominal[segment][1]
+            # 面形偏差：各自以起点为基准，不计整体 Z 平移
+            metrics[name] = np.abs((z - z[:, :1]) - (z_nominal - z_nominal[:, :1])).max(axis=1)
+        else:
+            metrics[name] = METRICS[name](surfaces)
+    return metrics
+
+
+def _evaluate_task(args):
+    return evaluate_metrics(*args)
+
+
+def chunk_size(nominal, memory_mb):
+    '''Samples per chunk so that about WORK_ARRAYS float64 arrays of (chunk, grid) fit in memory_mb.'''
+    grid = max(len(r) for r, _ in nominal.values())
+    return max(1, int(memory_mb * 2**20 // (WORK_ARRAYS * 8 * grid)))
+
+
+def sensitivity(deltas, values, names):
+    '''
+    Sensitivity of one metric to every perturbation, largest contribution first.
+
+    The metric is regressed on the perturbations and their squares, so
+    metrics like a maximum deviation that grow with |delta| are ranked too.
+    Rows hold the slope d(metric)/d(parameter) at the nominal, the curvature,
+    the contribution (std of the fitted part of that parameter, signed by the
+    slope) and its share of the metric variance (0 for a metric whose std is
+    within a few dozen ulps of its mean, i.e. rounding noise).
+    '''
+    ok = np.isfinite(values)
+    X = deltas[ok]
+    y = values[ok]
+    if len(y) <= 2 * X.shape[1] + 1:
+        return []
+    X2 = X**2 - (X**2).mean(axis=0)
+    A = np.column_stack([np.ones(len(X)), X, X2])
+    coef = np.linalg.lstsq(A, y, rcond=None)[0]
+    linear, quadratic = coef[1:X.shape[1] + 1], coef[X.shape[1] + 1:]
+    part_std = (X * linear + X2 * quadratic).std(axis=0)
+    variance = y.var()
+    # 指标不随扰动变化时方差只是舍入噪声（标准差在 64 ulp 以内），占比一律记为 0
+    constant = variance <= (ROUNDING_ULPS * np.finfo(float).eps * abs(y.mean()))**2
+    rows = [{'parameter': name, 'slope': float(b1), 'curvature': float(2 * b2),
+             'contribution': float(np.copysign(sd, b1)),
+             'variance_share': 0.0 if constant else float(sd**2 / variance)}
+            for name, b1, b2, sd in zip(names, linear, quadratic, part_std)]
+    return sorted(rows, key=lambda row: -abs(row['contribution']))
+
+
+def tolerance_analysis(design, tolerances, metric_names=DEFAULT_METRICS, n_samples=10000, step=STEP,
+                       limits=None, memory_mb=256, max_workers=1, percentiles=PERCENTILES, seed=0):
+    '''
+    Monte Carlo distribution of lens metrics under manufacturing tolerances.
+
+    Args:
+    design (dict): Nominal lens JSON.
+    tolerances (list): See sample_perturbations.
+    metric_names (list): design_solver METRICS names and/or DEVIATION_METRICS names.
+    limits (dict): Optional metric limits in the design_solver constraint form
+        ({'min'}, {'max'}, {'target', 'tol'}); used for the yield.
+    memory_mb (float): Working memory budget per chunk.
+    max_workers (int): Worker processes sharing the chunks; 1 evaluates in-process.
+
+    Returns a dict with the per-sample values and deltas, a summary per metric
+    (nominal, mean, std, min, max, percentiles), sensitivity rankings, the
+    yield (if limits are given), the chunk size and the run time.
+    '''
+    start_time = time.perf_counter()
+    metric_names = list(metric_names)
+    unknown = [name for name in metric_names if name not in METRICS and name not in DEVIATION_METRICS]
+    if unknown:
+        raise ValueError(f"unknown metrics: {unknown}")
+    names = [tolerance_name(tolerance) for tolerance in tolerances]
+    nominal = evaluate_surfaces(design, step)
+    nominal_metrics = evaluate_metrics(design, [], np.zeros((1, 0)), metric_names, nominal, step)
+    deltas = sample_perturbations(design, tolerances, n_samples, seed)
+    size = chunk_size(nominal, memory_mb)
+    chunks = [deltas[i:i + size] for i in range(0, n_samples, size)]
+
+    if max_workers and max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parts = list(executor.map(_evaluate_task, [(design, tolerances, chunk, metric_names, nominal, step)
+                                                       for chunk in chunks]))
+    else:
+        parts = [evaluate_metrics(design, tolerances, chunk, metric_names, nominal, step) for chunk in chunks]
+    values = {name: np.concatenate([part[name] for part in parts]) for name in metric_names}
+
+    summary = {}
+    for name, v in values.items():
+        finite = v[np.isfinite(v)]
+        summary[name] = {
+            'nominal': float(nominal_metrics[name][0]),
+            'mean': float(finite.mean()) if len(finite) else np.nan,
+            'std': float(finite.std()) if len(finite) else np.nan,
+            'min': float(finite.min()) if len(finite) else np.nan,
+            'max': float(finite.max()) if len(finite) else np.nan,
+            'percentiles': dict(zip(percentiles, np.percentile(finite, percentiles).tolist()))
+            if len(finite) else {},
+            'invalid': int(len(v) - len(finite)),
+        }
+    result = {
+        'parameters': names,
+        'deltas': deltas,
+        'values': values,
+        'summary': summary,
+        'sensitivity': {name: sensitivity(deltas, v, names) for name, v in values.items()},
+        'chunk_size': size,
+        'n_samples': n_samples,
+    }
+    if limits:
+        result['yield'] = float(np.mean(constraint_loss(values, limits) == 0))
+    result['seconds'] = time.perf_counter() - start_time
+    return result
+
+
+def format_report(result, top=5):
+    '''Plain-text summary of a tolerance_analysis result.'''
+    lines = [f"{result['n_samples']} samples, chunk {result['chunk_size']}, {result['seconds']:.2f} s"]
+    if 'yield' in result:
+        lines.append(f"yield {result['yield'] * 100:.2f} %")
+    for name, stats in result['summary'].items():
+        lines.append('')
+        lines.append(f"{name}: nominal {stats['nominal']:.6f}  mean {stats['mean']:.6f}  std {stats['std']:.6f}"
+                     + (f"  invalid {stats['invalid']}" if stats['invalid'] else ''))
+        lines.append('  ' + '  '.join(f"P{p:g} {v:.6f}" for p, v in stats['percentiles'].items()))
+        for row in result['sensitivity'][name][:top]:
+            lines.append(f"  {row['parameter']:45s} {row['contribution']:+.3e}  {row['variance_share'] * 100:6.2f} %")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Monte Carlo tolerance analysis of a lens JSON")
+    parser.add_argument('design', help="lens parameter JSON")
+    parser.add_argument('tolerances', help="JSON list of tolerances ({'path': [...], 'tol': ...})")
+    parser.add_argument('-n', '--samples', type=int, default=10000)
+    parser.add_argument('--metrics', nargs='+', default=list(DEFAULT_METRICS))
+    parser.add_argument('--limits', default=None, help="JSON file of metric limits")
+    parser.add_argument('--step', type=float, default=STEP)
+    parser.add_argument('--memory-mb', type=float, default=256)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    with open(args.design, encoding='utf-8') as file:
+        design = json.load(file)
+    with open(args.tolerances, encoding='utf-8') as file:
+        tolerances = json.load(file)
+    limits = None
+    if args.limits:
+        with open(args.limits, encoding='utf-8') as file:
+            limits = json.load(file)
+    result = tolerance_analysis(design, tolerances, args.metrics, args.samples, args.step, limits,
+                                args.memory_mb, args.workers, seed=args.seed)
+    print(format_report(result))
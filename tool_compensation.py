@@ -0,0 +1,256 @@
+'''
+Tool nose radius compensation.
+
+The machining profile (XZ) is the surface itself; the tool centre has to
+follow the surface offset by the nose radius along the surface normal. The
+compensated path is written as an _XZW segment, X/Z being the tool centre
+and W the contact angle in degrees: the angle between the contact normal and
+the +Z axis, positive when the surface rises with X.
+
+Where the surface is concave with a radius of curvature smaller than the
+tool radius, the raw offset curve forms a swallowtail loop; the loop is cut
+at its self-intersection so the tool centre never gouges the neighbouring
+surface. Clearance is exact up to the sampling step of the profile.
+
+The tool sits outside the material, which lies between F and B: the front
+surface is offset towards -Z, the back surface towards +Z and the edge
+outwards in +X (SEGMENT_SIDES).
+'''
+import numpy as np
+from geometry_check import segment_intersections
+from lens_generator import STEP, SURFACE_ID_LIST, SURFACE_TO_SEGMENT, generate_surface_sag
+
+# 各段的外法向：(符号, 轴)，轴 1 为 Z、0 为 X；材料在 F 与 B 之间
+SEGMENT_SIDES = {'F': (-1, 1), 'B': (1, 1), 'E': (1, 0)}
+
+
+def normals_from_slope(slope, side=1):
+    '''Unit normals of a z(r) profile from its slope dz/dr; side=1 points towards +Z.'''
+    slope = np.asarray(slope, dtype=float)
+    norm = np.sqrt(1 + slope**2)
+    return side * np.column_stack([-slope / norm, 1 / norm])
+
+
+def orient_normals(normals, side=1, axis=1):
+    '''Flip the normals as a whole so that they lean towards side * axis (axis 1 is Z, 0 is X) on average.'''
+    normals = np.asarray(normals, dtype=float)
+    return -normals if side * normals[:, axis].sum() < 0 else normals
+
+
+def polyline_normals(points, side=1, axis=1):
+    '''
+    Unit normals of an arbitrary polyline from central differences.
+
+    The normal is the left-hand normal of the travel direction, flipped as a
+    whole so that it leans towards +Z (side=1) or -Z (side=-1) on average,
+    or towards +/-X with axis=0.
+    Works for profiles that are not monotonic in X, such as the edge.
+    '''
+    points = np.asarray(points, dtype=float)
+    tangent = np.gradient(points, axis=0)
+    tangent /= np.maximum(np.hypot(tangent[:, 0], tangent[:, 1]), 1e-300)[:, None]
+    return orient_normals(np.column_stack([-tangent[:, 1], tangent[:, 0]]), side, axis)
+
+
+def contact_angle(normals):
+    '''W value in degrees for each unit normal.'''
+    return np.degrees(np.arctan2(-normals[:, 0], normals[:, 1]))
+
+
+def _refine_normals(points, normals, max_angle):
+    '''
+    Insert interpolated points wherever consecutive normals turn by more than
+    max_angle degrees, so the offset of a convex corner or a steep, coarsely
+    sampled region follows an arc instead of a chord that cuts into the surface.
+    '''
+    turn = np.degrees(np.arccos(np.clip(np.einsum('ij,ij->i', normals[:-1], normals[1:]), -1, 1)))
+    extra = np.ceil(turn / max_angle).astype(np.int64) - 1
+    extra[extra < 0] = 0
+    if not extra.any():
+        return points, normals, np.arange(len(points))
+    count = np.append(extra + 1, 1)
+    base = np.repeat(np.arange(len(points)), count)
+    t = (np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)) / np.repeat(count, count)
+    nxt = np.minimum(base + 1, len(points) - 1)
+    points = points[base] + t[:, None] * (points[nxt] - points[base])
+    normals = normals[base] + t[:, None] * (normals[nxt] - normals[base])
+    normals /= np.maximum(np.hypot(normals[:, 0], normals[:, 1]), 1e-300)[:, None]
+    return points, normals, base
+
+
+def _cut_loops(path, w, source):
+    '''Cut the outermost self-intersection loops once. Returns the new arrays and the number of loops cut.'''
+    hits = segment_intersections([path])
+    if len(hits) == 0:
+        return path, w, source, 0
+    ia = hits[:, 1].astype(np.int64)
+    ib = hits[:, 3].astype(np.int64)
+    order = np.lexsort((-ib, ia))
+    ia, ib, point = ia[order], ib[order], hits[order, 4:6]
+    # 只取互不重叠的最外层环，部分重叠的留到下一轮
+    reach = np.concatenate([[-1], np.maximum.accumulate(ib)[:-1]])
+    accept = ia > reach
+    ia, ib, point = ia[accept], ib[accept], point[accept]
+
+    n = len(path)
+    depth = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(depth, ia + 1, 1)
+    np.add.at(depth, ib + 1, -1)
+    keep = np.cumsum(depth)[:n] == 0
+    # 交点插在环的起点之后，W 沿 a 段线性插值
+    seg = path[ia + 1] - path[ia]
+    t = np.clip(np.einsum('ij,ij->i', point - path[ia], seg) / np.maximum(np.einsum('ij,ij->i', seg, seg), 1e-300),
+                0, 1)
+    position = np.cumsum(keep)[ia]
+    path = np.insert(path[keep], position, point, axis=0)
+    w = np.insert(w[keep], position, w[ia] + t * (w[ia + 1] - w[ia]))
+    source = np.insert(source[keep], position, source[ia])
+    return path, w, source, len(ia)
+
+
+def _drop_reversals(path, w, source, points):
+    '''
+    Drop centre points that move against the profile direction.
+
+    A reversed run at the start of the path belongs to a swallowtail that is
+    open at the start, so the points before it are dropped as well; likewise
+    at the end.
+    '''
+    tangent = np.gradient(points, axis=0)
+    step = np.diff(path, axis=0)
+    reverse = np.einsum('ij,ij->i', step, tangent[source[1:]]) < 0
+    keep = np.concatenate([[True], ~reverse])
+    if reverse.any():
+        forward = np.flatnonzero(~reverse)
+        if len(forward) == 0:
+            keep[:] = False
+        else:
+            keep[:forward[0]] = False
+            keep[forward[-1] + 2:] = False
+    return path[keep], w[keep], source[keep], int((~keep).sum())
+
+
+def _trim_gouging_ends(path, w, source, points, tool_radius):
+    '''Drop leading and trailing centre points closer than the tool radius to any profile point.'''
+    order = np.argsort(points[:, 0], kind='stable')
+    x_sorted = points[order, 0]
+    limit = tool_radius * (1 - 1e-6)
+
+    def gouges(candidates):
+        result = np.zeros(len(candidates), dtype=bool)
+        lo = np.searchsorted(x_sorted, candidates[:, 0] - tool_radius)
+        hi = np.searchsorted(x_sorted, candidates[:, 0] + tool_radius, side='right')
+        for i, (a, b) in enumerate(zip(lo, hi)):
+            near = points[order[a:b]]
+            result[i] = b > a and np.hypot(*(near - candidates[i]).T).min() < limit
+        return result
+
+    # 通常端点本身就不过切，检查块从 1 个点开始逐次加倍
+    start, chunk = 0, 1
+    while start < len(path):
+        bad = gouges(path[start:start + chunk])
+        if not bad.all():
+            start += int(np.argmin(bad))
+            break
+        start += len(bad)
+        chunk *= 2
+    stop, chunk = len(path), 1
+    while stop > start:
+        bad = gouges(path[max(stop - chunk, start):stop])[::-1]
+        if not bad.all():
+            stop -= int(np.argmin(bad))
+            break
+        stop -= len(bad)
+        chunk *= 2
+    return path[start:stop], w[start:stop], source[start:stop], start + len(path) - stop
+
+
+def compensate_profile(points, tool_radius, side=1, normals=None, max_angle=1.0, max_iterations=20, axis=1):
+    '''
+    Offset an XZ profile by the tool nose radius and remove the resulting loops.
+
+    Args:
+    points (np.ndarray): (N, 2) profile in machining order.
+    tool_radius (float): Tool nose radius.
+    side (int): 1 offsets towards +Z, -1 towards -Z (ignored when normals are given).
+    axis (int): 0 to apply side along X instead of Z, e.g. for the edge.
+    normals (np.ndarray): Optional (N, 2) unit normals, e.g. from normals_from_slope;
+        computed numerically from the polyline otherwise.
+    max_angle (float): Largest turn of the normal, in degrees, between consecutive
+        output points before intermediate points are inserted.
+
+    Returns (xzw, info): the (M, 3) compensated XZW array and a dict with the
+    number of points inserted at corners, loops cut, points removed and
+    points dropped for X < 0.
+    '''
+    profile = np.asarray(points, dtype=float)
+    if normals is None:
+        normals = polyline_normals(profile, side, axis)
+    points, normals, source = _refine_normals(profile, np.asarray(normals, dtype=float), max_angle)
+    inserted = len(points) - len(profile)
+    path = points + tool_radius * normals
+    w = contact_angle(normals)
+    source = np.arange(len(points))
+
+    loops = 0
+    for _ in range(max_iterations):
+        path, w, source, cut = _cut_loops(path, w, source)
+        path, w, source, dropped = _drop_reversals(path, w, source, points)
+        loops += cut
+        if cut == 0 and dropped == 0:
+            break
+    path, w, source, _ = _trim_gouging_ends(path, w, source, profile, tool_radius)
+
+    # JFL 坐标不能为负，刀心越过光轴的点直接丢弃
+    negative = path[:, 0] < 0
+    xzw = np.column_stack([path[~negative], w[~negative]])
+    info = {'inserted': inserted, 'loops': loops, 'removed': len(points) - len(source) + loops,
+            'negative_x': int(negative.sum()), 'negative_z': int((xzw[:, 1] < 0).sum())}
+    return xzw, info
+
+
+def compensate_segments(segments, tool_radius, sides=None, names=('F_XZ', 'B_XZ', 'E_XZ')):
+    '''
+    Add a compensated _XZW segment after each named _XZ segment, using numerical normals.
+
+    sides maps a segment letter to (side, axis) and defaults to SEGMENT_SIDES,
+    so every surface is offset away from the material.
+
+    Returns (segments, infos) where segments keeps the original order with the
+    XZW blocks inserted, ready for build_jfl_string.
+    '''
+    sides = {**SEGMENT_SIDES, **(sides or {})}
+    result = {}
+    infos = {}
+    for name, coords in segments.items():
+        result[name] = coords
+        if name in names:
+            xzw_name = name[:-3] + '_XZW'
+            side, axis = sides.get(name[:-3], (1, 1))
+            result[xzw_name], infos[xzw_name] = compensate_profile(coords, tool_radius, side, axis=axis)
+    return result, infos
+
+
+def compensate_design(design, tool_radius, sides=None, step=STEP):
+    '''
+    Generate the XZ segments of a lens JSON together with compensated XZW
+    segments, using the analytic slopes from sag_calculator for the normals.
+    sides is as in compensate_segments.
+
+    Returns (segments, infos) in the layout of generate_segments.
+    '''
+    sides = {**SEGMENT_SIDES, **(sides or {})}
+    lens_semidiameter = design["lens"]["lens_semidiameter"]
+    segments = {}
+    infos = {}
+    for surface_id in SURFACE_ID_LIST:
+        r, z, slope = generate_surface_sag(design[surface_id], lens_semidiameter, step, with_slope=True)
+        name = SURFACE_TO_SEGMENT[surface_id]
+        side, axis = sides[name]
+        points = np.column_stack([r, z])
+        normals = orient_normals(normals_from_slope(slope), side, axis)
+        if name != 'E':
+            points, normals = points[::-1], normals[::-1]
+        segments[name + '_XZ'] = points
+        segments[name + '_XZW'], infos[name + '_XZW'] = compensate_profile(points, tool_radius, normals=normals)
+    return segments, infos